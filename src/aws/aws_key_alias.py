@@ -0,0 +1,163 @@
+import os
+import threading
+
+import boto3
+from botocore.exceptions import ClientError
+
+from aws.aws_kms_multi_region import is_multi_region_key
+from common.state_file import load_json, save_json
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'multi-cloud-kms-lab', 'aws-key-aliases.json'
+)
+ORPHAN_DELETION_WINDOW_DAYS = 7
+
+_arns = {}
+_accounts = {}
+_lock = threading.Lock()
+
+
+def _error_code(error):
+    return error.response.get('Error', {}).get('Code')
+
+
+def _region(kms_client):
+    kms_client = getattr(kms_client, 'primary_client', kms_client)
+    meta = getattr(kms_client, 'meta', None)
+    return getattr(meta, 'region_name', None) or getattr(kms_client, 'region', None) or 'unknown'
+
+
+def _account(kms_client):
+    """AWS account id of the credentials behind kms_client, looked up once per access key"""
+    kms_client = getattr(kms_client, 'primary_client', kms_client)
+    account = getattr(kms_client, 'account_id', None)
+    if account:
+        return account
+    credentials = kms_client._get_credentials().get_frozen_credentials()
+    with _lock:
+        account = _accounts.get(credentials.access_key)
+    if account is None:
+        sts = boto3.client(
+            'sts', region_name=_region(kms_client), aws_access_key_id=credentials.access_key,
+            aws_secret_access_key=credentials.secret_key, aws_session_token=credentials.token
+        )
+        account = sts.get_caller_identity()['Account']
+        with _lock:
+            _accounts[credentials.access_key] = account
+    return account
+
+
+def _describe_usable(kms_client, key_ref):
+    """Return the key ARN behind key_ref, or None if it is missing or being deleted"""
+    try:
+        metadata = kms_client.describe_key(KeyId=key_ref)['KeyMetadata']
+    except ClientError as e:
+        if _error_code(e) == 'NotFoundException':
+            return None
+        raise
+    if metadata.get('KeyState') in ('PendingDeletion', 'PendingReplicaDeletion'):
+        return None
+    return metadata['Arn']
+
+
+def resolve_or_create_key(kms_client, alias, description='Multi-Cloud KMS Lab Key',
+                          key_usage='ENCRYPT_DECRYPT', cache_path=DEFAULT_CACHE_PATH, replica_regions=(),
+                          key_spec='SYMMETRIC_DEFAULT'):
+    """Return the key ARN for alias, creating the key and alias only if missing
+
+    Lookups are cached in process and, when cache_path is set, in a JSON
+    file shared by every process on the host, keyed by account, region and
+    alias, so a warm start makes no KMS call at all (only one STS
+    GetCallerIdentity per set of credentials to learn the account). If two
+    processes race to create the alias, the loser schedules its own key for
+    deletion and uses the winner's. With
+    replica_regions, a missing key is created as a multi-region key and
+    replicated to each of those regions; an existing single-region key then
+    raises ValueError, since it cannot be served from the replicas.
+    key_usage and key_spec only apply when the key is created. A
+    MultiRegionKMSClient is accepted; its primary_client makes the calls.
+    """
+    # Aliases and key creation are control-plane calls the failover client does not forward
+    kms_client = getattr(kms_client, 'primary_client', kms_client)
+    if not alias.startswith('alias/'):
+        alias = f"alias/{alias}"
+    cache_key = f"{_account(kms_client)}|{_region(kms_client)}|{alias}"
+
+    with _lock:
+        arn = _arns.get(cache_key)
+        if arn is None and cache_path:
+            arn = load_json(cache_path).get(cache_key)
+            if arn is not None:
+                _arns[cache_key] = arn
+    if arn is not None:
+        return _check_multi_region(alias, arn, replica_regions)
+
+    arn = _describe_usable(kms_client, alias)
+    if arn is None:
+        arn = _create_with_alias(kms_client, alias, description, key_usage, replica_regions, key_spec)
+    _check_multi_region(alias, arn, replica_regions)
+
+    with _lock:
+        _arns[cache_key] = arn
+        if cache_path:
+            state = load_json(cache_path)
+            state[cache_key] = arn
+            save_json(cache_path, state)
+    return arn
+
+
+def _check_multi_region(alias, arn, replica_regions):
+    """Return arn, or raise if replicas were asked for but alias names a single-region key"""
+    if replica_regions and not is_multi_region_key(arn):
+        raise ValueError(f"{alias} points at single-region key {arn}; it cannot be replicated to "
+                         f"{', '.join(replica_regions)}. Use another alias for a multi-region key.")
+    return arn
+
+
+def _create_with_alias(kms_client, alias, description, key_usage, replica_regions=(), key_spec='SYMMETRIC_DEFAULT'):
+    """Create a key and point alias at it, deferring to a concurrent creator"""
+    if replica_regions:
+        arn = kms_client.create_key(Description=description, KeyUsage=key_usage, KeySpec=key_spec,
+                                    MultiRegion=True)['KeyMetadata']['Arn']
+        for region in replica_regions:
+            kms_client.replicate_key(KeyId=arn, ReplicaRegion=region, Description=description)
+    else:
+        arn = kms_client.create_key(Description=description, KeyUsage=key_usage,
+                                    KeySpec=key_spec)['KeyMetadata']['Arn']
+    try:
+        kms_client.create_alias(AliasName=alias, TargetKeyId=arn)
+    except ClientError as e:
+        if _error_code(e) != 'AlreadyExistsException':
+            raise
+        existing = _describe_usable(kms_client, alias)
+        if existing is None:
+            # The alias points at a key scheduled for deletion; take it over
+            kms_client.update_alias(AliasName=alias, TargetKeyId=arn)
+            return arn
+        kms_client.schedule_key_deletion(KeyId=arn, PendingWindowInDays=ORPHAN_DELETION_WINDOW_DAYS)
+        return existing
+    return arn
+
+
+def invalidate(alias=None, kms_client=None, cache_path=DEFAULT_CACHE_PATH):
+    """Drop cached alias lookups (all of them when alias is None)
+
+    Call this after a KMS call fails with NotFoundException for a cached ARN.
+    """
+    with _lock:
+        if alias is None:
+            _arns.clear()
+            if cache_path:
+                save_json(cache_path, {})
+            return
+        if not alias.startswith('alias/'):
+            alias = f"alias/{alias}"
+        suffix = f"|{alias}"
+        prefix = f"{_account(kms_client)}|{_region(kms_client)}|" if kms_client is not None else ''
+        for cache_key in [k for k in _arns if k.endswith(suffix) and k.startswith(prefix)]:
+            del _arns[cache_key]
+        if cache_path:
+            state = load_json(cache_path)
+            for cache_key in [k for k in state if k.endswith(suffix) and k.startswith(prefix)]:
+                del state[cache_key]
+            save_json(cache_path, state)
@@ -0,0 +1,75 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_REGION = 'us-east-1'
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_CONNECT_TIMEOUT = 2.0
+DEFAULT_READ_TIMEOUT = 10.0
+DEFAULT_RETRY_MODE = 'standard'
+DEFAULT_TOTAL_MAX_ATTEMPTS = 3
+
+_clients = {}
+_clients_pid = os.getpid()
+_session = None
+_lock = threading.Lock()
+
+
+def build_config(max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retry_mode=DEFAULT_RETRY_MODE,
+                 total_max_attempts=DEFAULT_TOTAL_MAX_ATTEMPTS):
+    """Build the botocore config used for KMS clients
+
+    botocore pools only 10 connections by default, so threads beyond that
+    queue for a socket; size max_pool_connections to the worker count.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={'mode': retry_mode, 'total_max_attempts': total_max_attempts},
+        tcp_keepalive=True
+    )
+
+
+def get_kms_client(region=None, **config):
+    """Return the process-wide KMS client for a region, creating it on first use
+
+    region defaults to AWS_REGION / AWS_DEFAULT_REGION and then us-east-1.
+    Keyword arguments are passed to build_config and are part of the cache
+    key. boto3 clients are thread-safe once built, but building them is not,
+    so construction happens under a lock on a private session.
+    """
+    global _clients_pid, _session
+
+    region = region or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or DEFAULT_REGION
+    cache_key = (region, tuple(sorted(config.items())))
+
+    client = _clients.get(cache_key)
+    if client is not None and _clients_pid == os.getpid():
+        return client
+
+    with _lock:
+        if _clients_pid != os.getpid():
+            # Never share pooled sockets with a parent process
+            _clients.clear()
+            _session = None
+            _clients_pid = os.getpid()
+
+        client = _clients.get(cache_key)
+        if client is None:
+            if _session is None:
+                _session = boto3.session.Session()
+            client = _session.client('kms', region_name=region, config=build_config(**config))
+            _clients[cache_key] = client
+        return client
+
+
+def reset_clients():
+    """Forget every cached client (for tests and credential changes)"""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
@@ -1,7 +1,18 @@
 #!/usr/bin/env python3
-import boto3
 import base64
+import io
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aws.aws_key_alias import resolve_or_create_key
+from aws.aws_kms_client import get_kms_client
+from aws.aws_kms_multi_region import MultiRegionKMSClient
+from aws.aws_kms_provider import AWSKMSProvider
+from aws.aws_kms_signer import AWSKMSSigner
+from common.crc32c import stats as crc32c_stats
+from common.envelope import EnvelopeEncryptor
+from common.streaming import decrypt_stream, encrypt_stream
 
 print("🔐 AWS KMS INTEGRATION")
 print("=" * 40)
@@ -10,18 +21,20 @@ def setup_aws_kms():
     """Set up and demonstrate AWS KMS"""
     try:
         # Initialize AWS KMS client
-        kms_client = boto3.client('kms', region_name='us-east-1')
+        # AWS_KMS_REGIONS=us-east-1,eu-west-1,... spreads the key over replicas
+        regions = [r.strip() for r in os.environ.get('AWS_KMS_REGIONS', '').split(',') if r.strip()]
+        kms_client = get_kms_client(regions[0] if regions else None)
         print("✅ AWS KMS client initialized")
         
-        # Create a KMS key
-        response = kms_client.create_key(
-            Description='Multi-Cloud KMS Lab Key',
-            KeyUsage='ENCRYPT_DECRYPT',
-            Origin='AWS_KMS'
-        )
+        # Reuse the lab key by alias; it is only created on the very first run
+        key_id = resolve_or_create_key(kms_client, 'alias/multi-cloud-kms-lab', replica_regions=regions[1:])
+        print(f"✅ AWS KMS Key Ready: {key_id}")
         
-        key_id = response['KeyMetadata']['KeyId']
-        print(f"✅ AWS KMS Key Created: {key_id}")
+        if len(regions) > 1:
+            # Send each call to the fastest healthy replica, failing over on errors
+            kms_client = MultiRegionKMSClient(key_id, regions)
+            kms_client.probe()
+            print(f"🌍 Regions by latency: {', '.join(kms_client.ranked_regions())}")
         
         # Encrypt data
         plaintext = "Secret data for AWS KMS"
@@ -29,12 +42,13 @@ def setup_aws_kms():
             KeyId=key_id,
             Plaintext=plaintext.encode()
         )
-        ciphertext = base64.b64encode(encrypt_response['CiphertextBlob']).decode()
-        print(f"🔒 Encrypted with AWS KMS: {ciphertext[:50]}...")
+        ciphertext_blob = encrypt_response['CiphertextBlob']
+        # Base64 is only for display; the blob itself stays binary
+        print(f"🔒 Encrypted with AWS KMS: {base64.b64encode(ciphertext_blob[:37]).decode()}...")
         
         # Decrypt data
         decrypt_response = kms_client.decrypt(
-            CiphertextBlob=base64.b64decode(ciphertext)
+            CiphertextBlob=ciphertext_blob
         )
         decrypted = decrypt_response['Plaintext'].decode()
         print(f"🔓 Decrypted with AWS KMS: {decrypted}")
@@ -44,6 +58,56 @@ def setup_aws_kms():
             print("✅ AWS KMS encryption/decryption successful!")
         else:
             print("❌ AWS KMS failed!")
+        
+        # Envelope encryption: one GenerateDataKey, AES-256-GCM done locally
+        envelope = EnvelopeEncryptor(AWSKMSProvider(kms_client, key_id))
+        large_payload = plaintext * 1000
+        sealed = envelope.encrypt(large_payload)
+        print(f"✉️  Envelope-encrypted {len(large_payload)} bytes (beyond the 4KB direct limit)")
+        
+        if envelope.decrypt(sealed).decode() == large_payload:
+            print("✅ AWS KMS envelope encryption successful!")
+        else:
+            print("❌ AWS KMS envelope encryption failed!")
+        
+        # Per-tenant encryption context: data keys are cached per tenant and
+        # a record only decrypts under the context it was sealed with
+        tenant_sealed = envelope.encrypt(plaintext, context={'tenant': 'acme'})
+        try:
+            envelope.decrypt(tenant_sealed, context={'tenant': 'globex'})
+            print("❌ Encryption context was not enforced!")
+        except Exception:
+            if envelope.decrypt(tenant_sealed, context={'tenant': 'acme'}).decode() == plaintext:
+                print("✅ Encryption context keeps tenants apart")
+        
+        # Streaming encryption: constant memory however large the input is
+        backup = io.BytesIO(os.urandom(8 * 1024 * 1024))
+        encrypted_backup = io.BytesIO()
+        size = encrypt_stream(AWSKMSProvider(kms_client, key_id), backup, encrypted_backup)
+        encrypted_backup.seek(0)
+        restored = io.BytesIO()
+        decrypt_stream(AWSKMSProvider(kms_client, key_id), encrypted_backup, restored)
+        
+        if restored.getvalue() == backup.getvalue():
+            print(f"✅ Streamed {size // (1024 * 1024)} MB through chunked AES-GCM")
+            checksums = crc32c_stats()
+            print(f"   🧮 CRC32C ({checksums['implementation']}): {checksums['bytes'] // (1024 * 1024)} MB "
+                  f"checked in {checksums['seconds'] * 1000:.0f} ms")
+        else:
+            print("❌ AWS KMS streaming encryption failed!")
+        
+        # Signing: KMS holds the private key, verification runs in-process
+        signing_client = get_kms_client(regions[0] if regions else None)
+        signing_key_id = resolve_or_create_key(signing_client, 'alias/multi-cloud-kms-lab-signing',
+                                               key_usage='SIGN_VERIFY', key_spec='ECC_NIST_P256')
+        signer = AWSKMSSigner(signing_client, signing_key_id)
+        token = b'{"sub":"user-7","scope":"read"}'
+        signature = signer.sign(token)
+        if signer.verify(token, signature) and not signer.verify(token + b' ', signature):
+            print(f"✅ ECDSA signature verified locally (public key fetched "
+                  f"{signer.public_keys.stats()['misses']} time)")
+        else:
+            print("❌ AWS KMS signature verification failed!")
             
         return key_id
         
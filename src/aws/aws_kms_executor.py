@@ -0,0 +1,208 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError, ConnectionError, ReadTimeoutError
+
+from aws.aws_kms_client import get_kms_client
+from common.encryption_context import aws_context
+from common.rate_limit import AdaptiveRateLimiter, backoff_delay
+
+DEFAULT_MAX_WORKERS = 32
+# Enough full-jitter backoff (several seconds) for the limiter to halve its
+# way down from the default quota to a much lower real one before giving up
+DEFAULT_MAX_ATTEMPTS = 12
+
+# Requests per second. KMS shares one quota across all symmetric
+# cryptographic operations and has separate ones for RSA and ECC keys;
+# 5,500/s is the smallest regional symmetric default, so raise these to
+# match the account's actual quotas.
+DEFAULT_QUOTAS = {
+    'symmetric': 5500.0,
+    'rsa': 500.0,
+    'ecc': 300.0,
+}
+
+# Cryptographic operations that always count against the symmetric quota
+SYMMETRIC_OPERATIONS = {
+    'generate_data_key', 'generate_data_key_without_plaintext', 'generate_data_key_pair',
+    'generate_data_key_pair_without_plaintext', 'generate_random', 'generate_mac', 'verify_mac',
+}
+# Cryptographic operations whose quota depends on the KeySpec of the key they use
+KEY_SPEC_OPERATIONS = {
+    'encrypt': 'KeyId', 'decrypt': 'KeyId', 're_encrypt': 'DestinationKeyId',
+    'sign': 'KeyId', 'verify': 'KeyId',
+}
+
+THROTTLE_CODES = {'ThrottlingException', 'LimitExceededException', 'RequestLimitExceeded'}
+RETRYABLE_CODES = {'KMSInternalException', 'DependencyTimeoutException', 'InternalFailure',
+                   'ServiceUnavailable'}
+
+
+def quota_class(key_spec):
+    """The DEFAULT_QUOTAS class that requests with a key of key_spec count against"""
+    if key_spec.startswith('RSA_'):
+        return 'rsa'
+    if key_spec.startswith('ECC_'):
+        return 'ecc'
+    return 'symmetric'
+
+
+class KMSBatchError(Exception):
+    """Raised when one or more items of a parallel KMS batch fail"""
+
+    def __init__(self, operation, errors, results):
+        self.operation = operation
+        self.errors = errors
+        self.results = results
+        super().__init__(
+            f"{len(errors)} of {len(results)} {operation} items failed: "
+            + "; ".join(f"[{i}] {e}" for i, e in sorted(errors.items())[:5])
+        )
+
+
+class KMSParallelExecutor:
+    """Runs KMS calls on a thread pool under per-operation-class rate limits
+
+    Each quota class (symmetric, rsa, ecc) gets an AdaptiveRateLimiter
+    starting at its quota. Key-dependent operations (encrypt, decrypt,
+    re_encrypt, sign, verify) are classed by the KeySpec of their key, read
+    once per key with DescribeKey; non-cryptographic operations such as
+    DescribeKey and GetPublicKey have their own KMS quotas and are not
+    limited here. Throttling responses shrink the rate and are
+    retried with jittered exponential backoff, so bulk jobs settle at the
+    highest rate KMS will sustain; throttles on unlimited operations are
+    backed off and retried the same way. The default client is built with a single
+    attempt so that throttles reach the limiter instead of being retried
+    inside botocore.
+    """
+
+    def __init__(self, kms_client=None, region=None, max_workers=DEFAULT_MAX_WORKERS,
+                 quotas=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.kms_client = kms_client or get_kms_client(
+            region, max_pool_connections=max_workers, total_max_attempts=1
+        )
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        quotas = dict(DEFAULT_QUOTAS, **(quotas or {}))
+        self.limiters = {name: AdaptiveRateLimiter(rate) for name, rate in quotas.items()}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kms')
+        self._lock = threading.Lock()
+        self._key_classes = {}
+        self.calls = 0
+        self.retries = 0
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def call(self, operation, **kwargs):
+        """Make one rate-limited KMS call with retries and return the response"""
+        limiter = self._limiter(operation, kwargs)
+        method = getattr(self.kms_client, operation)
+
+        for attempt in range(self.max_attempts):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                response = method(**kwargs)
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code in THROTTLE_CODES:
+                    if limiter is not None:
+                        limiter.on_throttle()
+                elif code not in RETRYABLE_CODES:
+                    raise
+                if attempt == self.max_attempts - 1:
+                    raise
+            except (ConnectionError, ReadTimeoutError):
+                if attempt == self.max_attempts - 1:
+                    raise
+            else:
+                if limiter is not None:
+                    limiter.on_success()
+                with self._lock:
+                    self.calls += 1
+                return response
+
+            with self._lock:
+                self.retries += 1
+            time.sleep(backoff_delay(attempt))
+
+    def map(self, operation, kwargs_list, raise_on_error=True):
+        """Run operation once per kwargs dict in kwargs_list, returning responses in input order
+
+        Failed items are None in the result list and, unless raise_on_error
+        is False, raise a KMSBatchError mapping input index to exception.
+        """
+        futures = [self._pool.submit(self.call, operation, **kwargs) for kwargs in kwargs_list]
+        results = [None] * len(futures)
+        errors = {}
+        for i, future in enumerate(futures):
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                errors[i] = e
+        if errors and raise_on_error:
+            raise KMSBatchError(operation, errors, results)
+        return results
+
+    def encrypt_many(self, key_id, plaintexts, raise_on_error=True, context=None):
+        """Encrypt each plaintext directly with key_id and return the CiphertextBlobs"""
+        kwargs_list = [dict(aws_context(context), KeyId=key_id, Plaintext=p.encode() if isinstance(p, str) else p)
+                       for p in plaintexts]
+        return self._field(self.map('encrypt', kwargs_list, raise_on_error), 'CiphertextBlob')
+
+    def decrypt_many(self, ciphertext_blobs, key_id=None, raise_on_error=True, context=None):
+        """Decrypt each CiphertextBlob and return the plaintext bytes"""
+        base = aws_context(context)
+        if key_id:
+            base['KeyId'] = key_id
+        kwargs_list = [dict(base, CiphertextBlob=blob) for blob in ciphertext_blobs]
+        return self._field(self.map('decrypt', kwargs_list, raise_on_error), 'Plaintext')
+
+    def generate_data_keys(self, key_id, count, key_spec='AES_256', raise_on_error=True, context=None):
+        """Generate count data keys, returning (plaintext_key, wrapped_key) pairs"""
+        kwargs_list = [dict(aws_context(context), KeyId=key_id, KeySpec=key_spec)] * count
+        responses = self.map('generate_data_key', kwargs_list, raise_on_error)
+        return [(r['Plaintext'], r['CiphertextBlob']) if r is not None else None for r in responses]
+
+    def stats(self):
+        """Return call/retry counters and the current rate of each limiter"""
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'rates': {name: limiter.rate for name, limiter in self.limiters.items()},
+            'throttles': {name: limiter.throttles for name, limiter in self.limiters.items()},
+        }
+
+    @staticmethod
+    def _field(responses, field):
+        return [r[field] if r is not None else None for r in responses]
+
+    def _limiter(self, operation, kwargs):
+        """The rate limiter for one call, or None for operations outside the cryptographic quotas"""
+        if operation in SYMMETRIC_OPERATIONS:
+            return self.limiters['symmetric']
+        key_field = KEY_SPEC_OPERATIONS.get(operation)
+        if key_field is None:
+            return None
+        key_id = kwargs.get(key_field)
+        # Decrypt without KeyId only works for symmetric ciphertexts
+        return self.limiters[self._key_class(key_id) if key_id else 'symmetric']
+
+    def _key_class(self, key_id):
+        """Quota class of key_id from its KeySpec, described once per key"""
+        with self._lock:
+            quota = self._key_classes.get(key_id)
+        if quota is None:
+            metadata = self.call('describe_key', KeyId=key_id)['KeyMetadata']
+            quota = quota_class(metadata.get('KeySpec', 'SYMMETRIC_DEFAULT'))
+            with self._lock:
+                self._key_classes[key_id] = quota
+        return quota
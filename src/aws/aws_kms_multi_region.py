@@ -0,0 +1,186 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError, ConnectionError, ReadTimeoutError
+
+from aws.aws_kms_client import get_kms_client
+from aws.aws_kms_executor import RETRYABLE_CODES, THROTTLE_CODES
+
+DEFAULT_READ_TIMEOUT = 2.0
+DEFAULT_COOLDOWN = 30.0
+DEFAULT_PROBE_INTERVAL = 60.0
+EWMA_ALPHA = 0.2
+
+FAILOVER_CODES = THROTTLE_CODES | RETRYABLE_CODES | {'KMSInvalidStateException'}
+
+# KMS operations forwarded with failover; anything else is not an attribute
+OPERATIONS = frozenset({
+    'encrypt', 'decrypt', 're_encrypt', 'generate_data_key', 'generate_data_key_without_plaintext',
+    'generate_data_key_pair', 'generate_random', 'describe_key', 'sign', 'verify', 'get_public_key',
+    'generate_mac', 'verify_mac',
+})
+
+
+def regional_key_id(key_id, region):
+    """Point a key or alias ARN at region; bare ids (mrk-...) and alias names resolve anywhere"""
+    if not key_id.startswith('arn:'):
+        return key_id
+    parts = key_id.split(':', 5)
+    parts[3] = region
+    return ':'.join(parts)
+
+
+def is_multi_region_key(key_id):
+    """True for a multi-region key id or ARN (mrk-...); aliases cannot be told apart and count as False"""
+    return key_id.rsplit('/', 1)[-1].startswith('mrk-')
+
+
+class _RegionState:
+    __slots__ = ('latency', 'down_until', 'failures')
+
+    def __init__(self):
+        self.latency = None
+        self.down_until = 0.0
+        self.failures = 0
+
+
+class MultiRegionKMSClient:
+    """Routes KMS calls for a multi-region key to the fastest healthy replica
+
+    Looks like a boto3 KMS client (encrypt, decrypt, generate_data_key, ...),
+    so it can back an AWSKMSProvider or a KMSParallelExecutor. Each call goes
+    to the region with the lowest moving-average latency; KeyId ARNs are
+    rewritten for that region. Throttling, server errors, connection
+    failures and read timeouts fail the call over to the next region and put
+    the failing one in cooldown. Any other error (bad ciphertext, access
+    denied) is raised straight away since another replica would answer the
+    same. Latencies are re-measured with DescribeKey every probe_interval.
+
+    The key must be a multi-region key (mrk-...) replicated to every region,
+    since only those ciphertexts decrypt in any replica. Only the KMS data
+    and key-lookup operations in OPERATIONS are forwarded; use
+    primary_client for anything else.
+    """
+
+    def __init__(self, key_id, regions, clients=None, read_timeout=DEFAULT_READ_TIMEOUT,
+                 cooldown=DEFAULT_COOLDOWN, probe_interval=DEFAULT_PROBE_INTERVAL):
+        if not regions:
+            raise ValueError("at least one region is required")
+        if len(regions) > 1 and not is_multi_region_key(key_id):
+            raise ValueError(f"{key_id} is a single-region key; it cannot be served from {', '.join(regions)}")
+        self.key_id = key_id
+        self.regions = list(regions)
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        # Single attempt per region: failing over beats retrying a sick region
+        self.clients = dict(clients or {})
+        for region in self.regions:
+            if region not in self.clients:
+                self.clients[region] = get_kms_client(region, read_timeout=read_timeout, total_max_attempts=1)
+        self._states = {region: _RegionState() for region in self.regions}
+        self._lock = threading.Lock()
+        self._last_probe = None
+        self._probing = False
+
+    def __getattr__(self, operation):
+        if operation not in OPERATIONS:
+            raise AttributeError(f"{type(self).__name__} has no attribute {operation!r}")
+        return lambda **kwargs: self.call(operation, **kwargs)
+
+    @property
+    def primary_client(self):
+        """The plain boto3 client of the first configured region"""
+        return self.clients[self.regions[0]]
+
+    def call(self, operation, **kwargs):
+        """Run a KMS operation in the best region, failing over on transient errors"""
+        self._maybe_probe()
+        last_error = None
+        for region in self.ranked_regions():
+            request = dict(kwargs)
+            for field in ('KeyId', 'DestinationKeyId', 'SourceKeyId'):
+                if field in request:
+                    request[field] = regional_key_id(request[field], region)
+            start = time.monotonic()
+            try:
+                response = getattr(self.clients[region], operation)(**request)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in FAILOVER_CODES:
+                    raise
+                self._record_failure(region)
+                last_error = e
+            except (ConnectionError, ReadTimeoutError) as e:
+                self._record_failure(region)
+                last_error = e
+            else:
+                self._record_latency(region, time.monotonic() - start)
+                return response
+        raise last_error
+
+    def ranked_regions(self):
+        """Healthy regions by measured latency (unmeasured in configured order), then cooling ones"""
+        now = time.monotonic()
+        with self._lock:
+            order = {region: i for i, region in enumerate(self.regions)}
+            healthy = [r for r in self.regions if self._states[r].down_until <= now]
+            cooling = [r for r in self.regions if self._states[r].down_until > now]
+            healthy.sort(key=lambda r: (self._states[r].latency is None, self._states[r].latency or 0, order[r]))
+            cooling.sort(key=lambda r: self._states[r].down_until)
+        return healthy + cooling
+
+    def probe(self):
+        """Measure every region's latency with a concurrent DescribeKey"""
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.regions)) as pool:
+                list(pool.map(self._probe_region, self.regions))
+        finally:
+            # Even a failed probe must not leave _probing set, or probing stops for good
+            with self._lock:
+                self._last_probe = time.monotonic()
+                self._probing = False
+
+    def latencies(self):
+        """Return {region: (ewma_latency_seconds or None, healthy)}"""
+        now = time.monotonic()
+        with self._lock:
+            return {r: (s.latency, s.down_until <= now) for r, s in self._states.items()}
+
+    def _probe_region(self, region):
+        start = time.monotonic()
+        try:
+            self.clients[region].describe_key(KeyId=regional_key_id(self.key_id, region))
+        except (ClientError, ConnectionError, ReadTimeoutError):
+            self._record_failure(region)
+        else:
+            self._record_latency(region, time.monotonic() - start)
+
+    def _maybe_probe(self):
+        """Probe synchronously on first use, then in the background every probe_interval"""
+        with self._lock:
+            if self._probing:
+                return
+            first = self._last_probe is None
+            if not first and time.monotonic() - self._last_probe < self.probe_interval:
+                return
+            self._probing = True
+        if first:
+            self.probe()
+        else:
+            threading.Thread(target=self.probe, name='kms-region-probe', daemon=True).start()
+
+    def _record_latency(self, region, latency):
+        with self._lock:
+            state = self._states[region]
+            state.latency = latency if state.latency is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * state.latency
+            )
+            state.failures = 0
+            state.down_until = 0.0
+
+    def _record_failure(self, region):
+        with self._lock:
+            state = self._states[region]
+            state.failures += 1
+            # Back off harder on a region that keeps failing
+            state.down_until = time.monotonic() + self.cooldown * min(state.failures, 8)
@@ -0,0 +1,35 @@
+from common.encryption_context import aws_context
+
+
+class AWSKMSProvider:
+    """AWS KMS operations for one key, usable as an envelope data-key provider"""
+
+    def __init__(self, kms_client, key_id):
+        self.kms_client = kms_client
+        self.key_id = key_id
+        self.cache_id = f"aws-kms:{key_id}"
+
+    def encrypt(self, plaintext, context=None):
+        """Encrypt up to 4 KB directly with the KMS key, bound to an optional encryption context"""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode()
+        response = self.kms_client.encrypt(KeyId=self.key_id, Plaintext=plaintext, **aws_context(context))
+        return response['CiphertextBlob']
+
+    def decrypt(self, ciphertext_blob, context=None):
+        """Decrypt a CiphertextBlob produced by encrypt with the same context"""
+        response = self.kms_client.decrypt(
+            KeyId=self.key_id, CiphertextBlob=ciphertext_blob, **aws_context(context)
+        )
+        return response['Plaintext']
+
+    def generate_data_key(self, context=None):
+        """Return (plaintext_key, wrapped_key) from GenerateDataKey"""
+        response = self.kms_client.generate_data_key(
+            KeyId=self.key_id, KeySpec='AES_256', **aws_context(context)
+        )
+        return response['Plaintext'], response['CiphertextBlob']
+
+    def decrypt_data_key(self, wrapped_key, context=None):
+        """Unwrap a data key produced by generate_data_key"""
+        return self.decrypt(bytes(wrapped_key), context=context)
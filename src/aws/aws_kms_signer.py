@@ -0,0 +1,62 @@
+import hashlib
+
+from common.signatures import PublicKeyCache, load_public_key, verify_signature
+
+MAX_MESSAGE_BYTES = 4096
+
+# KMS SigningAlgorithm -> common.signatures scheme
+SIGNING_SCHEMES = {
+    f"{prefix}_SHA_{bits}": f"{kind}-sha{bits}"
+    for prefix, kind in (('ECDSA', 'ecdsa'), ('RSASSA_PSS', 'rsa-pss'), ('RSASSA_PKCS1_V1_5', 'rsa-pkcs1'))
+    for bits in ('256', '384', '512')
+}
+
+
+class AWSKMSSigner:
+    """Sign with an asymmetric KMS key and verify locally
+
+    sign() calls KMS Sign, hashing messages over 4 KB locally and sending
+    only the digest. verify() checks the signature in-process against the
+    public key from GetPublicKey, fetched once per key; KMS asymmetric keys
+    are never rotated in place, so that key stays valid for the key's life.
+    """
+
+    def __init__(self, kms_client, key_id, signing_algorithm='ECDSA_SHA_256', public_keys=None):
+        if signing_algorithm not in SIGNING_SCHEMES:
+            raise ValueError(f"unsupported signing_algorithm {signing_algorithm}")
+        self.kms_client = kms_client
+        self.key_id = key_id
+        self.signing_algorithm = signing_algorithm
+        self.scheme = SIGNING_SCHEMES[signing_algorithm]
+        self.public_keys = public_keys if public_keys is not None else PublicKeyCache()
+        self.cache_id = f"aws-kms:{key_id}"
+
+    def sign(self, message):
+        """Return the signature bytes over message"""
+        if isinstance(message, str):
+            message = message.encode()
+        message = bytes(message)
+        if len(message) > MAX_MESSAGE_BYTES:
+            message = hashlib.new(self.scheme.rsplit('-', 1)[1], message).digest()
+            message_type = 'DIGEST'
+        else:
+            message_type = 'RAW'
+        response = self.kms_client.sign(KeyId=self.key_id, Message=message, MessageType=message_type,
+                                        SigningAlgorithm=self.signing_algorithm)
+        return response['Signature']
+
+    def verify(self, message, signature):
+        """Check signature over message without calling KMS"""
+        if isinstance(message, str):
+            message = message.encode()
+        return verify_signature(self.public_key(), self.scheme, message, signature)
+
+    def public_key(self):
+        """The cryptography public key of this KMS key, fetched at most once"""
+        return self.public_keys.get(self.cache_id, None, self._fetch_public_key)
+
+    def _fetch_public_key(self):
+        response = self.kms_client.get_public_key(KeyId=self.key_id)
+        if self.signing_algorithm not in response.get('SigningAlgorithms', ()):
+            raise ValueError(f"{response['KeyId']} does not support {self.signing_algorithm}")
+        return load_public_key(response['PublicKey'])
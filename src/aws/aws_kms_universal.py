@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import base64
+import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 print("🔐 AWS KMS UNIVERSAL DEMO")
 print("=" * 40)
 
@@ -44,29 +47,30 @@ def demonstrate_aws_concepts():
     print("   • Compliance certifications (SOC, PCI, HIPAA)")
 
 def simulate_aws_workflow():
-    """Simulate the AWS KMS workflow"""
+    """Simulate the AWS KMS workflow against the offline KMS stand-in"""
     print("\n🔄 SIMULATED AWS KMS WORKFLOW")
     print("=" * 30)
     
+    from aws.fake_kms import FakeKMSClient
+    
+    # Real AES-256-GCM with a typical in-region round trip
+    kms_client = FakeKMSClient(latency=0.005, jitter=0.002)
+    
     # Simulate key creation
-    key_id = "simulated-kms-key-12345"
+    key_id = kms_client.create_key(Description='Multi-Cloud KMS Lab Key')['KeyMetadata']['KeyId']
     print(f"1. ✅ Key Created: {key_id}")
     
     # Simulate encryption
     plaintext = "Sensitive data for AWS KMS"
     print(f"2. 📝 Plaintext: {plaintext}")
     
-    # Simple simulation of encryption
-    simulated_cipher = base64.b64encode(f"AWSKMS:{key_id}:{plaintext}".encode()).decode()
-    print(f"3. 🔒 Encrypted: {simulated_cipher[:50]}...")
+    ciphertext_blob = kms_client.encrypt(KeyId=key_id, Plaintext=plaintext.encode())['CiphertextBlob']
+    print(f"3. 🔒 Encrypted: {base64.b64encode(ciphertext_blob).decode()[:50]}...")
     
     # Simulate decryption
-    decoded = base64.b64decode(simulated_cipher).decode()
-    if decoded.startswith('AWSKMS:'):
-        parts = decoded.split(':')
-        decrypted_key = parts[1]
-        decrypted_text = ':'.join(parts[2:])
-        print(f"4. 🔓 Decrypted with key {decrypted_key}: {decrypted_text}")
+    response = kms_client.decrypt(CiphertextBlob=ciphertext_blob)
+    decrypted_text = response['Plaintext'].decode()
+    print(f"4. 🔓 Decrypted with key {response['KeyId'].split('/')[-1]}: {decrypted_text}")
     
     # Verify
     if plaintext == decrypted_text:
@@ -82,17 +86,15 @@ def real_aws_demo():
         print("\n🚀 ATTEMPTING REAL AWS KMS SETUP")
         print("-" * 30)
         
-        # Initialize AWS KMS client
-        kms_client = boto3.client('kms', region_name='us-east-1')
+        # Initialize AWS KMS client (cached per region, tuned connection pool)
+        from aws.aws_kms_client import get_kms_client
+        kms_client = get_kms_client()
         print("✅ AWS KMS client initialized")
         
-        # Create a KMS key
-        response = kms_client.create_key(
-            Description='Multi-Cloud KMS Lab Key',
-            KeyUsage='ENCRYPT_DECRYPT'
-        )
-        key_id = response['KeyMetadata']['KeyId']
-        print(f"✅ AWS KMS Key Created: {key_id}")
+        # Reuse the lab key by alias; it is only created on the very first run
+        from aws.aws_key_alias import resolve_or_create_key
+        key_id = resolve_or_create_key(kms_client, 'alias/multi-cloud-kms-lab')
+        print(f"✅ AWS KMS Key Ready: {key_id}")
         
         # Encrypt data
         plaintext = "Secret data for real AWS KMS"
@@ -100,12 +102,13 @@ def real_aws_demo():
             KeyId=key_id,
             Plaintext=plaintext.encode()
         )
-        ciphertext = base64.b64encode(encrypt_response['CiphertextBlob']).decode()
-        print(f"🔒 Real encryption: {ciphertext[:50]}...")
+        ciphertext_blob = encrypt_response['CiphertextBlob']
+        # Base64 is only for display; the blob itself stays binary
+        print(f"🔒 Real encryption: {base64.b64encode(ciphertext_blob[:37]).decode()}...")
         
         # Decrypt data
         decrypt_response = kms_client.decrypt(
-            CiphertextBlob=base64.b64decode(ciphertext)
+            CiphertextBlob=ciphertext_blob
         )
         decrypted = decrypt_response['Plaintext'].decode()
         print(f"🔓 Real decryption: {decrypted}")
@@ -0,0 +1,399 @@
+import json
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+ACCOUNT_ID = '111122223333'
+MAX_PLAINTEXT_BYTES = 4096
+NONCE_SIZE = 12
+
+_BLOB_MAGIC = b'FKMS'
+_BLOB_HEADER = struct.Struct('>4sB')
+_DATA_KEY_BYTES = {'AES_256': 32, 'AES_128': 16}
+MAX_MESSAGE_BYTES = 4096
+
+# KeySpec -> (key factory, signing algorithms)
+_SIGNING_KEY_SPECS = {
+    'ECC_NIST_P256': (lambda: ec.generate_private_key(ec.SECP256R1()), ['ECDSA_SHA_256']),
+    'ECC_NIST_P384': (lambda: ec.generate_private_key(ec.SECP384R1()), ['ECDSA_SHA_384']),
+    'RSA_2048': (lambda: rsa.generate_private_key(65537, 2048),
+                 ['RSASSA_PSS_SHA_256', 'RSASSA_PKCS1_V1_5_SHA_256']),
+}
+_SIGNING_HASHES = {'256': hashes.SHA256, '384': hashes.SHA384, '512': hashes.SHA512}
+
+
+def _error(operation, code, message):
+    return ClientError(
+        {'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': 400}},
+        operation
+    )
+
+
+def _signature_args(algorithm):
+    """(padding or None for ECDSA, hash) for a KMS SigningAlgorithm name"""
+    hash_type = _SIGNING_HASHES[algorithm.rsplit('_', 1)[1]]
+    if algorithm.startswith('ECDSA_'):
+        return None, hash_type
+    if algorithm.startswith('RSASSA_PSS_'):
+        return padding.PSS(mgf=padding.MGF1(hash_type()), salt_length=hash_type.digest_size), hash_type
+    return padding.PKCS1v15(), hash_type
+
+
+def _context_aad(context):
+    """Canonical AAD for an EncryptionContext; key order must not matter"""
+    return json.dumps(context or {}, sort_keys=True, separators=(',', ':')).encode()
+
+
+class FakeKMSClient:
+    """In-process stand-in for a boto3 KMS client with real AES-256-GCM
+
+    Implements the subset of the KMS API this lab uses (CreateKey,
+    DescribeKey, Encrypt, Decrypt, GenerateDataKey, ReEncrypt, Sign, Verify,
+    GetPublicKey, ReplicateKey, aliases) with
+    the same request and response shapes and ClientError codes. latency and
+    jitter (seconds) are added to every call; throttle_rate caps cryptographic
+    calls per second and answers ThrottlingException beyond it, like a KMS
+    request quota.
+
+    CreateKey with MultiRegion=True issues an mrk- key that ReplicateKey
+    copies into the fake client of another region, reached with peer(); a
+    replica decrypts whatever any other copy of the key encrypted.
+    """
+
+    def __init__(self, region='us-east-1', latency=0.0, jitter=0.0, throttle_rate=None, seed=None, peers=None):
+        self.region = region
+        # region -> client for every region of this fake partition, shared by peer()
+        self.peers = peers if peers is not None else {}
+        self.peers.setdefault(region, self)
+        self.account_id = ACCOUNT_ID
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._keys = {}
+        self._aliases = {}
+        self._lock = threading.Lock()
+        self._tokens = float(throttle_rate or 0)
+        self._last_refill = time.monotonic()
+        self.call_counts = {}
+
+    # Control plane
+
+    def create_key(self, Description='', KeyUsage='ENCRYPT_DECRYPT', KeySpec='SYMMETRIC_DEFAULT', **kwargs):
+        self._enter('CreateKey', crypto=False)
+        if KeyUsage == 'SIGN_VERIFY' and KeySpec in _SIGNING_KEY_SPECS:
+            factory, algorithms = _SIGNING_KEY_SPECS[KeySpec]
+            material = factory()
+        elif KeyUsage == 'ENCRYPT_DECRYPT' and KeySpec == 'SYMMETRIC_DEFAULT':
+            material = AESGCM.generate_key(256)
+        else:
+            raise _error('CreateKey', 'UnsupportedOperationException',
+                         f"KeyUsage {KeyUsage} with KeySpec {KeySpec} is not supported")
+        multi_region = bool(kwargs.get('MultiRegion'))
+        key_id = f"mrk-{uuid.uuid4().hex}" if multi_region else str(uuid.uuid4())
+        metadata = {
+            'AWSAccountId': ACCOUNT_ID,
+            'KeyId': key_id,
+            'Arn': f"arn:aws:kms:{self.region}:{ACCOUNT_ID}:key/{key_id}",
+            'CreationDate': time.time(),
+            'Enabled': True,
+            'Description': Description,
+            'KeyUsage': KeyUsage,
+            'KeyState': 'Enabled',
+            'Origin': kwargs.get('Origin', 'AWS_KMS'),
+            'KeyManager': 'CUSTOMER',
+            'KeySpec': KeySpec,
+            'MultiRegion': multi_region,
+        }
+        if multi_region:
+            metadata['MultiRegionConfiguration'] = {
+                'MultiRegionKeyType': 'PRIMARY',
+                'PrimaryKey': {'Arn': metadata['Arn'], 'Region': self.region},
+                'ReplicaKeys': [],
+            }
+        if KeyUsage == 'SIGN_VERIFY':
+            metadata['SigningAlgorithms'] = list(algorithms)
+        else:
+            metadata['EncryptionAlgorithms'] = ['SYMMETRIC_DEFAULT']
+        with self._lock:
+            self._keys[key_id] = {'metadata': metadata, 'material': material}
+        return {'KeyMetadata': dict(metadata)}
+
+    def describe_key(self, KeyId, **kwargs):
+        self._enter('DescribeKey', crypto=False)
+        return {'KeyMetadata': dict(self._resolve('DescribeKey', KeyId, require_enabled=False)['metadata'])}
+
+    def replicate_key(self, KeyId, ReplicaRegion, Description=None, **kwargs):
+        self._enter('ReplicateKey', crypto=False)
+        key = self._resolve('ReplicateKey', KeyId, usage=None)
+        metadata = key['metadata']
+        if not metadata['MultiRegion']:
+            raise _error('ReplicateKey', 'UnsupportedOperationException',
+                         f"{metadata['Arn']} is not a multi-region key")
+        if ReplicaRegion == self.region:
+            raise _error('ReplicateKey', 'ValidationException', f"{metadata['Arn']} is already in {ReplicaRegion}")
+        key_id = metadata['KeyId']
+        arn = f"arn:aws:kms:{ReplicaRegion}:{ACCOUNT_ID}:key/{key_id}"
+        configuration = metadata['MultiRegionConfiguration']
+        replica_metadata = dict(
+            metadata, Arn=arn, CreationDate=time.time(),
+            Description=metadata['Description'] if Description is None else Description,
+            MultiRegionConfiguration=dict(configuration, MultiRegionKeyType='REPLICA'),
+        )
+        replica = self.peer(ReplicaRegion)
+        with replica._lock:
+            if key_id in replica._keys:
+                raise _error('ReplicateKey', 'AlreadyExistsException', f"{key_id} already exists in {ReplicaRegion}")
+            replica._keys[key_id] = {'metadata': replica_metadata, 'material': key['material']}
+        with self._lock:
+            configuration['ReplicaKeys'] = configuration['ReplicaKeys'] + [{'Arn': arn, 'Region': ReplicaRegion}]
+        return {'ReplicaKeyMetadata': dict(replica_metadata), 'ReplicaPolicy': '', 'ReplicaTags': []}
+
+    def schedule_key_deletion(self, KeyId, PendingWindowInDays=30):
+        self._enter('ScheduleKeyDeletion', crypto=False)
+        metadata = self._resolve('ScheduleKeyDeletion', KeyId, usage=None)['metadata']
+        with self._lock:
+            metadata['Enabled'] = False
+            metadata['KeyState'] = 'PendingDeletion'
+            metadata['DeletionDate'] = time.time() + PendingWindowInDays * 86400
+        return {'KeyId': metadata['Arn'], 'KeyState': 'PendingDeletion',
+                'PendingWindowInDays': PendingWindowInDays}
+
+    def create_alias(self, AliasName, TargetKeyId):
+        self._enter('CreateAlias', crypto=False)
+        if not AliasName.startswith('alias/') or AliasName.startswith('alias/aws/'):
+            raise _error('CreateAlias', 'ValidationException', f"invalid alias name {AliasName}")
+        key = self._resolve('CreateAlias', TargetKeyId, usage=None)
+        with self._lock:
+            if AliasName in self._aliases:
+                raise _error('CreateAlias', 'AlreadyExistsException', f"{AliasName} already exists")
+            self._aliases[AliasName] = key['metadata']['KeyId']
+        return {}
+
+    def update_alias(self, AliasName, TargetKeyId):
+        self._enter('UpdateAlias', crypto=False)
+        key = self._resolve('UpdateAlias', TargetKeyId, usage=None)
+        with self._lock:
+            if AliasName not in self._aliases:
+                raise _error('UpdateAlias', 'NotFoundException', f"{AliasName} does not exist")
+            self._aliases[AliasName] = key['metadata']['KeyId']
+        return {}
+
+    def delete_alias(self, AliasName):
+        self._enter('DeleteAlias', crypto=False)
+        with self._lock:
+            if self._aliases.pop(AliasName, None) is None:
+                raise _error('DeleteAlias', 'NotFoundException', f"{AliasName} does not exist")
+        return {}
+
+    def list_aliases(self, KeyId=None, **kwargs):
+        self._enter('ListAliases', crypto=False)
+        with self._lock:
+            aliases = [
+                {
+                    'AliasName': name,
+                    'AliasArn': f"arn:aws:kms:{self.region}:{ACCOUNT_ID}:{name}",
+                    'TargetKeyId': key_id,
+                }
+                for name, key_id in sorted(self._aliases.items())
+            ]
+        if KeyId is not None:
+            key_id = self._resolve('ListAliases', KeyId, usage=None)['metadata']['KeyId']
+            aliases = [a for a in aliases if a['TargetKeyId'] == key_id]
+        return {'Aliases': aliases, 'Truncated': False}
+
+    # Data plane
+
+    def encrypt(self, KeyId, Plaintext, EncryptionContext=None, **kwargs):
+        self._enter('Encrypt')
+        if not 1 <= len(Plaintext) <= MAX_PLAINTEXT_BYTES:
+            raise _error('Encrypt', 'ValidationException',
+                         f"Plaintext must be between 1 and {MAX_PLAINTEXT_BYTES} bytes")
+        key = self._resolve('Encrypt', KeyId)
+        return {
+            'CiphertextBlob': self._seal(key, bytes(Plaintext), EncryptionContext),
+            'KeyId': key['metadata']['Arn'],
+            'EncryptionAlgorithm': 'SYMMETRIC_DEFAULT',
+        }
+
+    def decrypt(self, CiphertextBlob, KeyId=None, EncryptionContext=None, **kwargs):
+        self._enter('Decrypt')
+        key, plaintext = self._open('Decrypt', CiphertextBlob, KeyId, EncryptionContext)
+        return {
+            'Plaintext': plaintext,
+            'KeyId': key['metadata']['Arn'],
+            'EncryptionAlgorithm': 'SYMMETRIC_DEFAULT',
+        }
+
+    def generate_data_key(self, KeyId, KeySpec=None, NumberOfBytes=None, EncryptionContext=None, **kwargs):
+        self._enter('GenerateDataKey')
+        if KeySpec is not None:
+            size = _DATA_KEY_BYTES.get(KeySpec)
+            if size is None:
+                raise _error('GenerateDataKey', 'ValidationException', f"invalid KeySpec {KeySpec}")
+        elif NumberOfBytes is not None:
+            size = NumberOfBytes
+        else:
+            raise _error('GenerateDataKey', 'ValidationException', "KeySpec or NumberOfBytes is required")
+        key = self._resolve('GenerateDataKey', KeyId)
+        plaintext = os.urandom(size)
+        return {
+            'Plaintext': plaintext,
+            'CiphertextBlob': self._seal(key, plaintext, EncryptionContext),
+            'KeyId': key['metadata']['Arn'],
+        }
+
+    def re_encrypt(self, CiphertextBlob, DestinationKeyId, SourceKeyId=None,
+                   SourceEncryptionContext=None, DestinationEncryptionContext=None, **kwargs):
+        self._enter('ReEncrypt')
+        source, plaintext = self._open('ReEncrypt', CiphertextBlob, SourceKeyId, SourceEncryptionContext)
+        destination = self._resolve('ReEncrypt', DestinationKeyId)
+        return {
+            'CiphertextBlob': self._seal(destination, plaintext, DestinationEncryptionContext),
+            'SourceKeyId': source['metadata']['Arn'],
+            'KeyId': destination['metadata']['Arn'],
+        }
+
+    def sign(self, KeyId, Message, SigningAlgorithm, MessageType='RAW', **kwargs):
+        self._enter('Sign')
+        key = self._resolve('Sign', KeyId, usage='SIGN_VERIFY')
+        pad, hash_type, digest = self._digest('Sign', key, Message, SigningAlgorithm, MessageType)
+        if pad is None:
+            signature = key['material'].sign(digest, ec.ECDSA(Prehashed(hash_type())))
+        else:
+            signature = key['material'].sign(digest, pad, Prehashed(hash_type()))
+        return {'KeyId': key['metadata']['Arn'], 'Signature': signature, 'SigningAlgorithm': SigningAlgorithm}
+
+    def verify(self, KeyId, Message, Signature, SigningAlgorithm, MessageType='RAW', **kwargs):
+        self._enter('Verify')
+        key = self._resolve('Verify', KeyId, usage='SIGN_VERIFY')
+        pad, hash_type, digest = self._digest('Verify', key, Message, SigningAlgorithm, MessageType)
+        public_key = key['material'].public_key()
+        try:
+            if pad is None:
+                public_key.verify(bytes(Signature), digest, ec.ECDSA(Prehashed(hash_type())))
+            else:
+                public_key.verify(bytes(Signature), digest, pad, Prehashed(hash_type()))
+        except InvalidSignature:
+            raise _error('Verify', 'KMSInvalidSignatureException', "") from None
+        return {'KeyId': key['metadata']['Arn'], 'SignatureValid': True, 'SigningAlgorithm': SigningAlgorithm}
+
+    def get_public_key(self, KeyId, **kwargs):
+        self._enter('GetPublicKey', crypto=False)
+        key = self._resolve('GetPublicKey', KeyId, usage='SIGN_VERIFY')
+        metadata = key['metadata']
+        return {
+            'KeyId': metadata['Arn'],
+            'PublicKey': key['material'].public_key().public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+            ),
+            'KeySpec': metadata['KeySpec'],
+            'KeyUsage': metadata['KeyUsage'],
+            'SigningAlgorithms': list(metadata['SigningAlgorithms']),
+        }
+
+    def peer(self, region):
+        """The fake client for region in this client's partition, created on first use"""
+        client = self.peers.get(region)
+        if client is None:
+            FakeKMSClient(region, self.latency, self.jitter, self.throttle_rate, peers=self.peers)
+            client = self.peers[region]
+        return client
+
+    # Internals
+
+    def _enter(self, operation, crypto=True):
+        """Count the call, apply throttling and simulated latency"""
+        with self._lock:
+            self.call_counts[operation] = self.call_counts.get(operation, 0) + 1
+            if crypto and self.throttle_rate:
+                now = time.monotonic()
+                self._tokens = min(self.throttle_rate,
+                                   self._tokens + (now - self._last_refill) * self.throttle_rate)
+                self._last_refill = now
+                if self._tokens < 1:
+                    raise _error(operation, 'ThrottlingException', "Rate exceeded")
+                self._tokens -= 1
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _digest(self, operation, key, message, algorithm, message_type):
+        """Validate a Sign/Verify request and return (padding, hash, digest)"""
+        if algorithm not in key['metadata']['SigningAlgorithms']:
+            raise _error(operation, 'InvalidKeyUsageException',
+                         f"{algorithm} is not valid for {key['metadata']['Arn']}")
+        pad, hash_type = _signature_args(algorithm)
+        message = bytes(message)
+        if message_type == 'DIGEST':
+            if len(message) != hash_type.digest_size:
+                raise _error(operation, 'ValidationException', f"digest must be {hash_type.digest_size} bytes")
+            return pad, hash_type, message
+        if not 1 <= len(message) <= MAX_MESSAGE_BYTES:
+            raise _error(operation, 'ValidationException', f"Message must be between 1 and {MAX_MESSAGE_BYTES} bytes")
+        digest = hashes.Hash(hash_type())
+        digest.update(message)
+        return pad, hash_type, digest.finalize()
+
+    def _resolve(self, operation, key_ref, require_enabled=True, usage='ENCRYPT_DECRYPT'):
+        """Find a key by id, key ARN, alias name or alias ARN and check it is usable for usage"""
+        with self._lock:
+            ref = key_ref
+            if ':alias/' in ref:
+                ref = 'alias/' + ref.split(':alias/', 1)[1]
+            if ref.startswith('alias/'):
+                ref = self._aliases.get(ref)
+                if ref is None:
+                    raise _error(operation, 'NotFoundException', f"Alias {key_ref} is not found.")
+            elif ':key/' in ref:
+                ref = ref.split(':key/', 1)[1]
+            key = self._keys.get(ref)
+        if key is None:
+            raise _error(operation, 'NotFoundException', f"Key '{key_ref}' does not exist")
+        if require_enabled and key['metadata']['KeyState'] == 'PendingDeletion':
+            raise _error(operation, 'KMSInvalidStateException', f"{key['metadata']['Arn']} is pending deletion.")
+        if require_enabled and not key['metadata']['Enabled']:
+            raise _error(operation, 'DisabledException', f"{key['metadata']['Arn']} is disabled.")
+        if require_enabled and usage and key['metadata']['KeyUsage'] != usage:
+            raise _error(operation, 'InvalidKeyUsageException',
+                         f"{key['metadata']['Arn']} has KeyUsage {key['metadata']['KeyUsage']}")
+        return key
+
+    def _seal(self, key, plaintext, context):
+        key_id = key['metadata']['KeyId'].encode()
+        nonce = os.urandom(NONCE_SIZE)
+        header = _BLOB_HEADER.pack(_BLOB_MAGIC, len(key_id)) + key_id
+        return header + nonce + AESGCM(key['material']).encrypt(nonce, plaintext, header + _context_aad(context))
+
+    def _open(self, operation, blob, key_ref, context):
+        blob = bytes(blob)
+        if len(blob) < _BLOB_HEADER.size:
+            raise _error(operation, 'InvalidCiphertextException', "")
+        magic, id_len = _BLOB_HEADER.unpack_from(blob)
+        header_end = _BLOB_HEADER.size + id_len
+        if magic != _BLOB_MAGIC or len(blob) < header_end + NONCE_SIZE:
+            raise _error(operation, 'InvalidCiphertextException', "")
+        key = self._resolve(operation, blob[_BLOB_HEADER.size:header_end].decode())
+        if key_ref is not None and self._resolve(operation, key_ref) is not key:
+            raise _error(operation, 'IncorrectKeyException',
+                         "The key ID in the request does not identify the key used to encrypt the ciphertext")
+        nonce = blob[header_end:header_end + NONCE_SIZE]
+        try:
+            plaintext = AESGCM(key['material']).decrypt(
+                nonce, blob[header_end + NONCE_SIZE:], blob[:header_end] + _context_aad(context)
+            )
+        except InvalidTag:
+            raise _error(operation, 'InvalidCiphertextException', "") from None
+        return key, plaintext
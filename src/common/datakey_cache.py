@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from common.encryption_context import canonical_context
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_AGE = 300.0
+# NIST SP 800-38D caps random-nonce GCM at 2^32 messages per key; stay well below
+DEFAULT_MAX_MESSAGES = 2 ** 20
+DEFAULT_MAX_BYTES = 2 ** 32
+DATA_KEY_BYTES = 32
+
+
+def _provider_id(provider):
+    """Identify a provider for cache partitioning"""
+    return getattr(provider, 'cache_id', None) or f"{type(provider).__name__}:{id(provider)}"
+
+
+def _check_data_key(plaintext_key):
+    if len(plaintext_key) != DATA_KEY_BYTES:
+        raise ValueError(f"expected a {DATA_KEY_BYTES}-byte data key, got {len(plaintext_key)}")
+
+
+class _Call:
+    """An in-flight provider call that concurrent callers for the same entry wait on"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Entry:
+    """A cached data key: its wrapped form, an AES-GCM cipher and usage counters
+
+    The plaintext key itself is not kept. Python cannot reliably wipe the
+    copies held by the provider's response or inside the cipher, so an
+    evicted key is dropped, not zeroized.
+    """
+
+    __slots__ = ('wrapped_key', 'cipher', 'created', 'messages', 'bytes')
+
+    def __init__(self, cipher, wrapped_key):
+        self.wrapped_key = bytes(wrapped_key)
+        self.cipher = cipher
+        self.created = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+
+
+class DataKeyCache:
+    """Bounded LRU cache of data keys
+
+    Entries are partitioned by (provider, key id, encryption context), so a
+    key generated for one context is never served for another. Keys
+    used for encryption retire after max_age seconds, max_messages records or
+    max_bytes of plaintext; keys unwrapped for decryption only age out. A
+    plaintext larger than max_bytes gets a one-off key that is not cached.
+    Concurrent misses for the same entry share a single provider call.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE,
+                 max_messages=DEFAULT_MAX_MESSAGES, max_bytes=DEFAULT_MAX_BYTES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+
+    def encryption_key(self, provider, context=None, plaintext_length=0):
+        """Return (wrapped_key, cipher) for a key with budget left, generating one on a miss"""
+        if plaintext_length > self.max_bytes:
+            # No cached key could take this; don't evict the current one for it
+            with self._lock:
+                self.misses += 1
+            plaintext_key, wrapped_key = provider.generate_data_key(context=context)
+            _check_data_key(plaintext_key)
+            return bytes(wrapped_key), AESGCM(bytes(plaintext_key))
+
+        cache_key = ('encrypt', _provider_id(provider), canonical_context(context))
+        while True:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                if entry is not None and self._usable(entry, plaintext_length):
+                    self._entries.move_to_end(cache_key)
+                    self._charge(entry, plaintext_length)
+                    self.hits += 1
+                    return entry.wrapped_key, entry.cipher
+                call, leader = self._join(cache_key, entry)
+            if leader:
+                break
+            # Another caller is generating this key; retry against its entry
+            self._wait(call)
+
+        try:
+            plaintext_key, wrapped_key = provider.generate_data_key(context=context)
+            _check_data_key(plaintext_key)
+            cipher = AESGCM(bytes(plaintext_key))
+            entry = _Entry(cipher, wrapped_key)
+            self._charge(entry, plaintext_length)
+            with self._lock:
+                self._insert(cache_key, entry)
+                # Our own envelopes decrypt without another unwrap call
+                decrypt_key = ('decrypt', cache_key[1], cache_key[2], entry.wrapped_key)
+                self._insert(decrypt_key, _Entry(cipher, wrapped_key))
+            return entry.wrapped_key, entry.cipher
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(cache_key, call)
+
+    def decryption_key(self, provider, wrapped_key, context=None):
+        """Return a cipher for wrapped_key, unwrapping it through the provider on a miss"""
+        wrapped_key = bytes(wrapped_key)
+        cache_key = ('decrypt', _provider_id(provider), canonical_context(context), wrapped_key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry.cipher
+            call, leader = self._join(cache_key, entry)
+        if not leader:
+            return self._wait(call)
+
+        try:
+            plaintext_key = provider.decrypt_data_key(wrapped_key, context=context)
+            _check_data_key(plaintext_key)
+            call.result = AESGCM(bytes(plaintext_key))
+            with self._lock:
+                self._insert(cache_key, _Entry(call.result, wrapped_key))
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(cache_key, call)
+
+    def stats(self):
+        """Return hit/miss/merge/eviction counters and the current entry count"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'merged': self.merged,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop every cached key"""
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._remove(cache_key)
+
+    def _join(self, cache_key, stale_entry):
+        """Under the lock: drop a stale entry and return (call, is_leader) for fetching cache_key"""
+        if stale_entry is not None:
+            self._remove(cache_key)
+        call = self._inflight.get(cache_key)
+        if call is not None:
+            self.merged += 1
+            return call, False
+        call = self._inflight[cache_key] = _Call()
+        self.misses += 1
+        return call, True
+
+    def _wait(self, call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _finish(self, cache_key, call):
+        with self._lock:
+            del self._inflight[cache_key]
+        call.done.set()
+
+    def _expired(self, entry):
+        return self.max_age is not None and time.monotonic() - entry.created >= self.max_age
+
+    def _usable(self, entry, plaintext_length):
+        return (not self._expired(entry)
+                and entry.messages < self.max_messages
+                and entry.bytes + plaintext_length <= self.max_bytes)
+
+    def _charge(self, entry, plaintext_length):
+        entry.messages += 1
+        entry.bytes += plaintext_length
+
+    def _insert(self, cache_key, entry):
+        if cache_key in self._entries:
+            self._remove(cache_key)
+        self._entries[cache_key] = entry
+        # Only capacity overflow counts as an eviction, not replacement, expiry or clear()
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, cache_key):
+        del self._entries[cache_key]
@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from common.datakey_cache import _Call, _provider_id
+from common.encryption_context import encode_context
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_TTL = 60.0
+
+
+def _digest(provider_id, ciphertext, context):
+    """SHA-256 over provider id, context and ciphertext, length-prefixed so fields cannot run together"""
+    if isinstance(ciphertext, str):
+        ciphertext = ciphertext.encode()
+    h = hashlib.sha256()
+    for part in (provider_id.encode(), encode_context(context), memoryview(ciphertext).cast('B')):
+        h.update(len(part).to_bytes(8, 'big'))
+        h.update(part)
+    return h.digest()
+
+
+class _Entry:
+    """A cached plaintext held in a mutable buffer so it can be wiped"""
+
+    __slots__ = ('plaintext', 'created')
+
+    def __init__(self, plaintext):
+        self.plaintext = bytearray(plaintext)
+        self.created = time.monotonic()
+
+    def wipe(self):
+        for i in range(len(self.plaintext)):
+            self.plaintext[i] = 0
+
+
+class DecryptCache:
+    """Opt-in, bounded LRU cache of decrypt results
+
+    Entries are keyed by a SHA-256 digest of (provider, encryption context,
+    ciphertext), so the ciphertext itself is never kept as a key and a
+    plaintext is only served back under the context it was decrypted with.
+    Entries expire after ttl seconds and the cache holds at most max_entries
+    plaintexts and max_bytes of plaintext in total; evicted and expired
+    plaintexts are zeroized.
+    Concurrent decrypts of the same ciphertext share a single provider call.
+
+    Callers receive their own bytes copy, which the cache cannot wipe.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+
+    def decrypt(self, provider, ciphertext, context=None):
+        """Return provider.decrypt(ciphertext, context=context), serving repeats from the cache"""
+        return self.get_or_decrypt(_provider_id(provider), ciphertext,
+                                   lambda: provider.decrypt(ciphertext, context=context), context)
+
+    def get_or_decrypt(self, namespace, ciphertext, decrypt, context=None):
+        """Return the cached plaintext for (namespace, context, ciphertext) or call decrypt() once to fill it"""
+        digest = _digest(namespace, ciphertext, context)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return bytes(entry.plaintext)
+            if entry is not None:
+                self._remove(digest)
+            call = self._inflight.get(digest)
+            leader = call is None
+            if leader:
+                call = self._inflight[digest] = _Call()
+                self.misses += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = bytes(decrypt())
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            with self._lock:
+                self._insert(digest, _Entry(call.result))
+            return call.result
+        finally:
+            with self._lock:
+                del self._inflight[digest]
+            call.done.set()
+
+    def invalidate(self, provider, ciphertext, context=None):
+        """Drop and wipe the cached plaintext for one ciphertext, if present"""
+        digest = _digest(_provider_id(provider), ciphertext, context)
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+
+    def stats(self):
+        """Return hit/miss/merge/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.merged
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'merged': self.merged,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_rate': (self.hits + self.merged) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Zeroize and drop every cached plaintext"""
+        with self._lock:
+            for digest in list(self._entries):
+                self._remove(digest)
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.monotonic() - entry.created >= self.ttl
+
+    def _insert(self, digest, entry):
+        size = len(entry.plaintext)
+        if size > self.max_bytes:
+            entry.wipe()
+            return
+        if digest in self._entries:
+            self._remove(digest)
+        self._entries[digest] = entry
+        self._bytes += size
+        # Only capacity overflow counts as an eviction, not replacement, expiry or clear()
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest)
+        self._bytes -= len(entry.plaintext)
+        entry.wipe()
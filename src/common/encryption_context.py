@@ -0,0 +1,26 @@
+import json
+
+
+def canonical_context(context):
+    """Turn an encryption context mapping into a hashable, order-independent tuple"""
+    if not context:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in context.items()))
+
+
+def encode_context(context):
+    """Serialize a context as compact, key-sorted JSON bytes (b'' when empty)
+
+    Equal mappings always encode to the same bytes, so the encoding can be
+    used as a cache partition, a hash input or a Vault derivation context.
+    """
+    pairs = canonical_context(context)
+    if not pairs:
+        return b''
+    return json.dumps(dict(pairs), sort_keys=True, separators=(',', ':')).encode()
+
+
+def aws_context(context):
+    """Return boto3 keyword arguments carrying context as an EncryptionContext"""
+    pairs = canonical_context(context)
+    return {'EncryptionContext': dict(pairs)} if pairs else {}
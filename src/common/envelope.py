@@ -0,0 +1,82 @@
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+
+from common.datakey_cache import DataKeyCache
+
+FORMAT_VERSION = 1
+NONCE_SIZE = 12
+
+_HEADER = struct.Struct('>BH')
+
+
+class EnvelopeError(Exception):
+    """Raised when an envelope cannot be parsed or authenticated"""
+
+
+def pack_envelope(wrapped_key, nonce, ciphertext):
+    """Serialize an envelope as version | wrapped key length | wrapped key | nonce | ciphertext"""
+    return b''.join((_HEADER.pack(FORMAT_VERSION, len(wrapped_key)), wrapped_key, nonce, ciphertext))
+
+
+def unpack_envelope(blob):
+    """Split a serialized envelope into (header, wrapped_key, nonce, ciphertext)
+
+    The ciphertext is returned as a memoryview into blob, so large envelopes
+    are never copied.
+    """
+    blob = memoryview(blob).cast('B')
+    if len(blob) < _HEADER.size:
+        raise EnvelopeError("envelope too short")
+    version, wrapped_len = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise EnvelopeError(f"unsupported envelope version {version}")
+    key_end = _HEADER.size + wrapped_len
+    if len(blob) < key_end + NONCE_SIZE:
+        raise EnvelopeError("envelope truncated")
+    header = bytes(blob[:key_end])
+    wrapped_key = bytes(blob[_HEADER.size:key_end])
+    nonce = bytes(blob[key_end:key_end + NONCE_SIZE])
+    return header, wrapped_key, nonce, blob[key_end + NONCE_SIZE:]
+
+
+class EnvelopeEncryptor:
+    """AES-256-GCM envelope encryption under data keys from a KMS provider
+
+    The provider needs two methods: generate_data_key(context=None) returning
+    (plaintext_key, wrapped_key) and decrypt_data_key(wrapped_key,
+    context=None) returning the plaintext key. Data keys come from a
+    DataKeyCache, so the KMS sees one call per data key instead of one per
+    record.
+
+    An encryption context is bound to the data key by the KMS, so the same
+    context must be passed to decrypt. It is not stored in the envelope.
+    """
+
+    def __init__(self, provider, cache=None):
+        self.provider = provider
+        self.cache = cache if cache is not None else DataKeyCache()
+
+    def encrypt(self, plaintext, associated_data=b'', context=None):
+        """Encrypt a str or any bytes-like plaintext locally and return the serialized envelope bytes"""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode()
+        elif not isinstance(plaintext, bytes):
+            plaintext = memoryview(plaintext).cast('B')
+        wrapped_key, cipher = self.cache.encryption_key(
+            self.provider, context=context, plaintext_length=len(plaintext)
+        )
+        nonce = os.urandom(NONCE_SIZE)
+        header = _HEADER.pack(FORMAT_VERSION, len(wrapped_key)) + wrapped_key
+        ciphertext = cipher.encrypt(nonce, plaintext, header + associated_data)
+        return pack_envelope(wrapped_key, nonce, ciphertext)
+
+    def decrypt(self, envelope, associated_data=b'', context=None):
+        """Unwrap the envelope's data key and return the plaintext bytes"""
+        header, wrapped_key, nonce, ciphertext = unpack_envelope(envelope)
+        cipher = self.cache.decryption_key(self.provider, wrapped_key, context=context)
+        try:
+            return cipher.decrypt(nonce, ciphertext, header + associated_data)
+        except InvalidTag:
+            raise EnvelopeError("envelope authentication failed") from None
@@ -0,0 +1,69 @@
+import random
+import threading
+import time
+
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_DECREASE_INTERVAL = 0.5
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket whose rate adapts to throttling feedback (AIMD)
+
+    Every on_throttle() multiplies the rate by decrease_factor, at most once
+    per decrease_interval so a burst of throttles from requests already in
+    flight counts as one signal. Every on_success() adds increase / rate, which
+    grows the rate by roughly `increase` requests/s per second of clean
+    traffic, up to max_rate.
+    """
+
+    def __init__(self, rate, max_rate=None, min_rate=1.0, burst=None, increase=None,
+                 decrease_factor=DEFAULT_DECREASE_FACTOR, decrease_interval=DEFAULT_DECREASE_INTERVAL):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.increase = increase if increase is not None else max(1.0, self.max_rate / 20)
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self._rate = float(rate)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.throttles = 0
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.increase / self._rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_interval:
+                self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+                self._tokens = min(self._tokens, 0.0)
+                self._last_decrease = now
+
+
+def backoff_delay(attempt, base=0.05, cap=5.0):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
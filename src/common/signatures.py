@@ -0,0 +1,122 @@
+import threading
+
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding
+
+_HASHES = {'sha256': hashes.SHA256(), 'sha384': hashes.SHA384(), 'sha512': hashes.SHA512()}
+
+# PSS.AUTO (cryptography >= 37) reads the salt length from the signature, so
+# one verifier covers both digest-length salts (AWS, Cloud KMS) and Vault's
+# maximum-length ones
+_PSS_SALT = getattr(padding.PSS, 'AUTO', padding.PSS.MAX_LENGTH)
+
+
+def _scheme(kind, hash_name=None):
+    """Pre-build the (algorithm, padding) arguments for one signature scheme"""
+    algorithm = _HASHES.get(hash_name)
+    if kind == 'ecdsa':
+        return ec.ECDSA(algorithm), None
+    if kind == 'rsa-pss':
+        return algorithm, padding.PSS(mgf=padding.MGF1(algorithm), salt_length=_PSS_SALT)
+    if kind == 'rsa-pkcs1':
+        return algorithm, padding.PKCS1v15()
+    return None, None
+
+
+# Scheme name -> prebuilt verify arguments; every adapter maps its own
+# algorithm names onto these
+SCHEMES = {
+    f"{kind}-{hash_name}": _scheme(kind, hash_name)
+    for kind in ('ecdsa', 'rsa-pss', 'rsa-pkcs1') for hash_name in _HASHES
+}
+SCHEMES['ed25519'] = _scheme('ed25519')
+
+
+def load_public_key(data):
+    """Load a PEM or DER SubjectPublicKeyInfo, or a raw 32-byte Ed25519 key"""
+    if isinstance(data, str):
+        data = data.encode()
+    data = bytes(data)
+    if data.lstrip().startswith(b'-----BEGIN'):
+        return serialization.load_pem_public_key(data)
+    if len(data) == 32:
+        return ed25519.Ed25519PublicKey.from_public_bytes(data)
+    return serialization.load_der_public_key(data)
+
+
+def verify_signature(public_key, scheme, data, signature):
+    """Check signature over data locally; return True or False
+
+    Never makes a network call, so its cost is that of the public-key
+    operation alone.
+    """
+    try:
+        algorithm, pad = SCHEMES[scheme]
+    except KeyError:
+        raise UnsupportedAlgorithm(f"unknown signature scheme {scheme}") from None
+    try:
+        if scheme == 'ed25519':
+            public_key.verify(bytes(signature), bytes(data))
+        elif pad is None:
+            public_key.verify(bytes(signature), bytes(data), algorithm)
+        else:
+            public_key.verify(bytes(signature), bytes(data), pad, algorithm)
+    except InvalidSignature:
+        return False
+    return True
+
+
+class PublicKeyCache:
+    """Loaded public keys per (namespace, version), fetched at most once each
+
+    Public keys of a given key version never change, so entries have no TTL;
+    a fetch runs outside the lock and concurrent misses for the same entry
+    wait for the first fetch instead of repeating it.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, version, fetch):
+        """Return the public key for (namespace, version), calling fetch() -> key on a miss"""
+        cache_key = (namespace, version)
+        while True:
+            with self._lock:
+                public_key = self._keys.get(cache_key)
+                if public_key is not None:
+                    self.hits += 1
+                    return public_key
+                pending = self._pending.get(cache_key)
+                if pending is None:
+                    pending = self._pending[cache_key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+        try:
+            public_key = fetch()
+            with self._lock:
+                self._keys[cache_key] = public_key
+            return public_key
+        finally:
+            with self._lock:
+                del self._pending[cache_key]
+            pending.set()
+
+    def put(self, namespace, version, public_key):
+        with self._lock:
+            self._keys[(namespace, version)] = public_key
+
+    def invalidate(self, namespace=None):
+        """Forget one namespace's keys, or everything when namespace is None"""
+        with self._lock:
+            for cache_key in [k for k in self._keys if namespace is None or k[0] == namespace]:
+                del self._keys[cache_key]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._keys)}
@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+
+
+def load_json(path, default=None):
+    """Read a JSON state file, returning default when it is missing or unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def save_json(path, data):
+    """Write a JSON state file atomically so concurrent readers never see half a file
+
+    Failures are swallowed: state files are an optimization and a read-only
+    or full disk must not break the caller.
+    """
+    directory = os.path.dirname(path) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state-')
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return False
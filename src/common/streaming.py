@@ -0,0 +1,172 @@
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from common.crc32c import crc32c
+
+MAGIC = b'MCKS'
+# Version 2 adds a CRC32C of each chunk's ciphertext to its frame; version 1 streams still decrypt
+FORMAT_VERSION = 2
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+
+FLAG_MORE = 0
+FLAG_FINAL = 1
+
+_HEADER = struct.Struct('>4sBIH')
+_FRAME_V1 = struct.Struct('>BI')
+_FRAME = struct.Struct('>BII')
+_NONCE_TAIL = struct.Struct('>IB')
+
+
+class StreamError(Exception):
+    """Raised when a stream is malformed, truncated or fails authentication"""
+
+
+def _nonce(prefix, counter, flag):
+    # STREAM-style nonce: per-stream random prefix | chunk counter | final flag,
+    # so reordering, dropping or truncating chunks breaks authentication
+    return prefix + _NONCE_TAIL.pack(counter, flag)
+
+
+def _read_exact(source, size):
+    data = source.read(size)
+    if data is None or len(data) != size:
+        raise StreamError("stream truncated")
+    return data
+
+
+def encrypt_stream(provider, source, destination, chunk_size=DEFAULT_CHUNK_SIZE, associated_data=b'',
+                   context=None):
+    """Encrypt a binary stream chunk by chunk under one fresh envelope data key
+
+    Memory use is bounded by two chunk buffers regardless of input size.
+    context is the KMS encryption context for the data key and must be given
+    again to decrypt. Returns the number of plaintext bytes encrypted.
+    """
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    plaintext_key, wrapped_key = provider.generate_data_key(context=context)
+    cipher = AESGCM(bytes(plaintext_key))
+    prefix = os.urandom(NONCE_PREFIX_SIZE)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, chunk_size, len(wrapped_key)) + bytes(wrapped_key) + prefix
+    destination.write(header)
+    aad = header + associated_data
+
+    # Read one chunk ahead so the last chunk can be marked final even when
+    # the input length is an exact multiple of chunk_size
+    buffers = [bytearray(chunk_size), bytearray(chunk_size)]
+    current = _fill(source, buffers[0])
+    total = 0
+    counter = 0
+    while True:
+        following = _fill(source, buffers[(counter + 1) % 2]) if current == chunk_size else 0
+        flag = FLAG_FINAL if following == 0 else FLAG_MORE
+        chunk = memoryview(buffers[counter % 2])[:current]
+        ciphertext = cipher.encrypt(_nonce(prefix, counter, flag), chunk, aad)
+        destination.write(_FRAME.pack(flag, len(ciphertext), crc32c(ciphertext)))
+        destination.write(ciphertext)
+        total += current
+        if flag == FLAG_FINAL:
+            return total
+        counter += 1
+        current = following
+
+
+def _fill(source, buffer):
+    """Fill buffer from source, returning the byte count (short only at EOF)"""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(buffer):
+        if hasattr(source, 'readinto'):
+            n = source.readinto(view[filled:])
+        else:
+            data = source.read(len(buffer) - filled)
+            n = len(data) if data else 0
+            view[filled:filled + n] = data or b''
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def decrypt_stream(provider, source, destination, cache=None, associated_data=b'', context=None):
+    """Decrypt a stream written by encrypt_stream, verifying every chunk
+
+    Plaintext is written chunk by chunk as each one authenticates; a stream
+    that ends before its final chunk raises StreamError. The per-chunk CRC32C
+    is checked before decryption, so storage or transport corruption is
+    reported as such rather than as an authentication failure. Pass a DataKeyCache
+    to reuse unwrapped data keys across streams. Returns the plaintext size.
+    """
+    magic, version, chunk_size, wrapped_len = _HEADER.unpack(_read_exact(source, _HEADER.size))
+    if magic != MAGIC:
+        raise StreamError("not an encrypted stream")
+    if version not in (1, FORMAT_VERSION):
+        raise StreamError(f"unsupported stream version {version}")
+    frame_format = _FRAME_V1 if version == 1 else _FRAME
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise StreamError(f"invalid chunk size {chunk_size}")
+    wrapped_key = _read_exact(source, wrapped_len)
+    prefix = _read_exact(source, NONCE_PREFIX_SIZE)
+    aad = _HEADER.pack(magic, version, chunk_size, wrapped_len) + wrapped_key + prefix + associated_data
+
+    if cache is not None:
+        cipher = cache.decryption_key(provider, wrapped_key, context=context)
+    else:
+        cipher = AESGCM(bytes(provider.decrypt_data_key(wrapped_key, context=context)))
+
+    total = 0
+    counter = 0
+    while True:
+        frame = source.read(frame_format.size)
+        if not frame:
+            raise StreamError("stream truncated before the final chunk")
+        if len(frame) != frame_format.size:
+            raise StreamError("stream truncated")
+        flag, length, *checksum = frame_format.unpack(frame)
+        if flag not in (FLAG_MORE, FLAG_FINAL) or length > chunk_size + TAG_SIZE:
+            raise StreamError("invalid chunk frame")
+        ciphertext = _read_exact(source, length)
+        if checksum and crc32c(ciphertext) != checksum[0]:
+            raise StreamError(f"chunk {counter} is corrupted (CRC32C mismatch)")
+        try:
+            plaintext = cipher.decrypt(_nonce(prefix, counter, flag), ciphertext, aad)
+        except InvalidTag:
+            raise StreamError(f"chunk {counter} failed authentication") from None
+        destination.write(plaintext)
+        total += len(plaintext)
+        if flag == FLAG_FINAL:
+            if source.read(1):
+                raise StreamError("trailing data after the final chunk")
+            return total
+        counter += 1
+
+
+def encrypt_file(provider, source_path, destination_path, chunk_size=DEFAULT_CHUNK_SIZE, context=None):
+    """Encrypt a file to destination_path with encrypt_stream"""
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        return encrypt_stream(provider, source, destination, chunk_size, context=context)
+
+
+def decrypt_file(provider, source_path, destination_path, cache=None, context=None):
+    """Decrypt a file written by encrypt_file
+
+    Output goes to a temporary file that only replaces destination_path once
+    the final chunk has authenticated, so a tampered or truncated input never
+    leaves partial plaintext behind.
+    """
+    tmp_path = f"{destination_path}.partial"
+    try:
+        with open(source_path, 'rb') as source, open(tmp_path, 'wb') as destination:
+            total = decrypt_stream(provider, source, destination, cache, context=context)
+        os.replace(tmp_path, destination_path)
+        return total
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from concurrent import futures
+from datetime import datetime, timezone
+
+import grpc
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from google.cloud import kms
+
+from common.crc32c import crc32c
+
+SERVICE = 'google.cloud.kms.v1.KeyManagementService'
+MAX_PLAINTEXT_BYTES = 64 * 1024
+NONCE_SIZE = 12
+
+_BLOB_HEADER = struct.Struct('>4sI')
+_BLOB_MAGIC = b'FGCP'
+
+Algorithm = kms.CryptoKeyVersion.CryptoKeyVersionAlgorithm
+Purpose = kms.CryptoKey.CryptoKeyPurpose
+State = kms.CryptoKeyVersion.CryptoKeyVersionState
+
+# algorithm -> (key factory, digest field, hash, signature padding or None for ECDSA)
+_SIGNING = {
+    Algorithm.EC_SIGN_P256_SHA256: (lambda: ec.generate_private_key(ec.SECP256R1()), 'sha256', hashes.SHA256, None),
+    Algorithm.EC_SIGN_P384_SHA384: (lambda: ec.generate_private_key(ec.SECP384R1()), 'sha384', hashes.SHA384, None),
+    Algorithm.RSA_SIGN_PSS_2048_SHA256: (
+        lambda: rsa.generate_private_key(65537, 2048), 'sha256', hashes.SHA256,
+        lambda: padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=32),
+    ),
+    Algorithm.RSA_SIGN_PKCS1_2048_SHA256: (
+        lambda: rsa.generate_private_key(65537, 2048), 'sha256', hashes.SHA256, padding.PKCS1v15,
+    ),
+}
+
+
+class _Abort(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _check_crc(request, field):
+    """Reject a request whose optional <field>_crc32c does not match <field>"""
+    expected = getattr(request, f"{field}_crc32c")
+    if expected is not None and expected != crc32c(getattr(request, field)):
+        raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, f"{field}_crc32c does not match {field}")
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class FakeKMSServer:
+    """Local gRPC server speaking the Cloud KMS v1 protocol with real cryptography
+
+    Implements CreateKeyRing, CreateCryptoKey, GetCryptoKey,
+    CreateCryptoKeyVersion, GetCryptoKeyVersion, ListCryptoKeyVersions,
+    UpdateCryptoKeyPrimaryVersion, Encrypt, Decrypt, GetPublicKey and
+    AsymmetricSign. Symmetric versions use AES-256-GCM; signing versions use
+    real EC/RSA keys, so signatures verify against the served public key.
+    Request CRC32C fields are checked like Cloud KMS does (INVALID_ARGUMENT
+    on mismatch) and responses carry their own. Every call sleeps latency
+    +/- jitter seconds, and error_rate of them fail with UNAVAILABLE, which
+    the real client library treats as retryable.
+
+    Point get_kms_client() at start()'s return value, or set
+    GCP_KMS_EMULATOR_HOST to it.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, max_workers=32):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_workers = max_workers
+        self._random = random.Random(seed)
+        self._key_rings = set()
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self.call_counts = {}
+
+    def start(self, address='127.0.0.1:0'):
+        """Start serving and return the host:port endpoint"""
+        handlers = {}
+        for method, request_type, handler in self._methods():
+            handlers[method] = grpc.unary_unary_rpc_method_handler(
+                self._wrap(method, handler),
+                request_deserializer=request_type.deserialize,
+                response_serializer=lambda response: type(response).serialize(response),
+            )
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.max_workers))
+        self._server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE, handlers),))
+        port = self._server.add_insecure_port(address)
+        self._server.start()
+        return f"{address.rsplit(':', 1)[0]}:{port}"
+
+    def stop(self, grace=None):
+        if self._server is not None:
+            self._server.stop(grace).wait()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _methods(self):
+        return (
+            ('CreateKeyRing', kms.CreateKeyRingRequest, self._create_key_ring),
+            ('CreateCryptoKey', kms.CreateCryptoKeyRequest, self._create_crypto_key),
+            ('GetCryptoKey', kms.GetCryptoKeyRequest, self._get_crypto_key),
+            ('CreateCryptoKeyVersion', kms.CreateCryptoKeyVersionRequest, self._create_crypto_key_version),
+            ('GetCryptoKeyVersion', kms.GetCryptoKeyVersionRequest, self._get_crypto_key_version),
+            ('ListCryptoKeyVersions', kms.ListCryptoKeyVersionsRequest, self._list_crypto_key_versions),
+            ('UpdateCryptoKeyPrimaryVersion', kms.UpdateCryptoKeyPrimaryVersionRequest, self._update_primary),
+            ('Encrypt', kms.EncryptRequest, self._encrypt),
+            ('Decrypt', kms.DecryptRequest, self._decrypt),
+            ('GetPublicKey', kms.GetPublicKeyRequest, self._get_public_key),
+            ('AsymmetricSign', kms.AsymmetricSignRequest, self._asymmetric_sign),
+        )
+
+    def _wrap(self, method, handler):
+        def call(request, context):
+            with self._lock:
+                self.call_counts[method] = self.call_counts.get(method, 0) + 1
+                delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+                fail = self.error_rate and self._random.random() < self.error_rate
+            if delay > 0:
+                time.sleep(delay)
+            if fail:
+                context.abort(grpc.StatusCode.UNAVAILABLE, "injected failure")
+            try:
+                return handler(request)
+            except _Abort as e:
+                context.abort(e.code, str(e))
+        return call
+
+    # Control plane
+
+    def _create_key_ring(self, request):
+        name = f"{request.parent}/keyRings/{request.key_ring_id}"
+        with self._lock:
+            if name in self._key_rings:
+                raise _Abort(grpc.StatusCode.ALREADY_EXISTS, f"KeyRing {name} already exists.")
+            self._key_rings.add(name)
+        return kms.KeyRing(name=name, create_time=_now())
+
+    def _create_crypto_key(self, request):
+        name = f"{request.parent}/cryptoKeys/{request.crypto_key_id}"
+        purpose = request.crypto_key.purpose
+        algorithm = request.crypto_key.version_template.algorithm
+        if purpose == Purpose.ENCRYPT_DECRYPT:
+            algorithm = Algorithm.GOOGLE_SYMMETRIC_ENCRYPTION
+        elif purpose != Purpose.ASYMMETRIC_SIGN or algorithm not in _SIGNING:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, f"unsupported purpose/algorithm {purpose.name}/{algorithm.name}")
+        with self._lock:
+            if request.parent not in self._key_rings:
+                raise _Abort(grpc.StatusCode.NOT_FOUND, f"KeyRing {request.parent} not found.")
+            if name in self._keys:
+                raise _Abort(grpc.StatusCode.ALREADY_EXISTS, f"CryptoKey {name} already exists.")
+            self._keys[name] = {
+                'purpose': purpose,
+                'algorithm': algorithm,
+                'rotation_period': request.crypto_key.rotation_period,
+                'create_time': _now(),
+                'versions': {},
+                'primary': None,
+            }
+            if not request.skip_initial_version_creation:
+                self._add_version(name)
+            return self._crypto_key_message(name)
+
+    def _get_crypto_key(self, request):
+        with self._lock:
+            self._key(request.name)
+            return self._crypto_key_message(request.name)
+
+    def _create_crypto_key_version(self, request):
+        with self._lock:
+            self._key(request.parent)
+            version_id = self._add_version(request.parent, make_primary=False)
+            return self._version_message(request.parent, version_id)
+
+    def _get_crypto_key_version(self, request):
+        with self._lock:
+            key_name, version_id = self._version(request.name)[:2]
+            return self._version_message(key_name, version_id)
+
+    def _list_crypto_key_versions(self, request):
+        with self._lock:
+            key = self._key(request.parent)
+            versions = [self._version_message(request.parent, v) for v in sorted(key['versions'])]
+        return kms.ListCryptoKeyVersionsResponse(crypto_key_versions=versions, total_size=len(versions))
+
+    def _update_primary(self, request):
+        with self._lock:
+            key = self._key(request.name)
+            version_id = int(request.crypto_key_version_id)
+            version = key['versions'].get(version_id)
+            if key['purpose'] != Purpose.ENCRYPT_DECRYPT:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, "only symmetric keys have a primary version")
+            if version is None:
+                raise _Abort(grpc.StatusCode.NOT_FOUND, f"version {version_id} not found")
+            if version['state'] != State.ENABLED:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"version {version_id} is not enabled")
+            key['primary'] = version_id
+            return self._crypto_key_message(request.name)
+
+    # Data plane
+
+    def _encrypt(self, request):
+        if not 0 < len(request.plaintext) <= MAX_PLAINTEXT_BYTES:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, f"plaintext must be 1..{MAX_PLAINTEXT_BYTES} bytes")
+        _check_crc(request, 'plaintext')
+        _check_crc(request, 'additional_authenticated_data')
+        with self._lock:
+            if '/cryptoKeyVersions/' in request.name:
+                key_name, version_id, version = self._version(request.name)
+                key = self._keys[key_name]
+            else:
+                key_name, key = request.name, self._key(request.name)
+                version_id = key['primary']
+                version = key['versions'][version_id]
+            if key['purpose'] != Purpose.ENCRYPT_DECRYPT:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"{request.name} is not an encryption key")
+            if version['state'] != State.ENABLED:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"version {version_id} is not enabled")
+            material = version['material']
+        header = _BLOB_HEADER.pack(_BLOB_MAGIC, version_id)
+        nonce = os.urandom(NONCE_SIZE)
+        aad = header + key_name.encode() + request.additional_authenticated_data
+        ciphertext = header + nonce + AESGCM(material).encrypt(nonce, request.plaintext, aad)
+        return kms.EncryptResponse(
+            name=f"{key_name}/cryptoKeyVersions/{version_id}",
+            ciphertext=ciphertext,
+            ciphertext_crc32c=crc32c(ciphertext),
+            verified_plaintext_crc32c=request.plaintext_crc32c is not None,
+            verified_additional_authenticated_data_crc32c=request.additional_authenticated_data_crc32c is not None,
+            protection_level=kms.ProtectionLevel.SOFTWARE,
+        )
+
+    def _decrypt(self, request):
+        _check_crc(request, 'ciphertext')
+        _check_crc(request, 'additional_authenticated_data')
+        blob = request.ciphertext
+        if len(blob) < _BLOB_HEADER.size + NONCE_SIZE:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, "Decryption failed: the ciphertext is invalid.")
+        magic, version_id = _BLOB_HEADER.unpack_from(blob)
+        with self._lock:
+            key = self._key(request.name)
+            version = key['versions'].get(version_id)
+            if magic != _BLOB_MAGIC or version is None or key['purpose'] != Purpose.ENCRYPT_DECRYPT:
+                raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, "Decryption failed: the ciphertext is invalid.")
+            if version['state'] != State.ENABLED:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"version {version_id} is not enabled")
+            material = version['material']
+            used_primary = version_id == key['primary']
+        header = blob[:_BLOB_HEADER.size]
+        nonce = blob[_BLOB_HEADER.size:_BLOB_HEADER.size + NONCE_SIZE]
+        aad = header + request.name.encode() + request.additional_authenticated_data
+        try:
+            plaintext = AESGCM(material).decrypt(nonce, blob[_BLOB_HEADER.size + NONCE_SIZE:], aad)
+        except InvalidTag:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, "Decryption failed: the ciphertext is invalid.") from None
+        return kms.DecryptResponse(plaintext=plaintext, plaintext_crc32c=crc32c(plaintext),
+                                   used_primary=used_primary, protection_level=kms.ProtectionLevel.SOFTWARE)
+
+    def _get_public_key(self, request):
+        with self._lock:
+            key_name, version_id, version = self._version(request.name)
+            algorithm = self._keys[key_name]['algorithm']
+            private_key = version['material']
+        if algorithm not in _SIGNING:
+            raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"{request.name} has no public key")
+        pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        return kms.PublicKey(pem=pem, pem_crc32c=crc32c(pem.encode()), algorithm=algorithm, name=request.name,
+                             protection_level=kms.ProtectionLevel.SOFTWARE)
+
+    def _asymmetric_sign(self, request):
+        with self._lock:
+            key_name, version_id, version = self._version(request.name)
+            algorithm = self._keys[key_name]['algorithm']
+            if version['state'] != State.ENABLED:
+                raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"{request.name} is not enabled")
+            private_key = version['material']
+        if algorithm not in _SIGNING:
+            raise _Abort(grpc.StatusCode.FAILED_PRECONDITION, f"{request.name} is not a signing key")
+        _, digest_field, hash_type, pad = _SIGNING[algorithm]
+        digest = getattr(request.digest, digest_field)
+        if len(digest) != hash_type.digest_size:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, f"expected a {digest_field} digest")
+        if request.digest_crc32c is not None and request.digest_crc32c != crc32c(digest):
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, "digest_crc32c does not match digest")
+        prehashed = Prehashed(hash_type())
+        if pad is None:
+            signature = private_key.sign(digest, ec.ECDSA(prehashed))
+        else:
+            signature = private_key.sign(digest, pad(), prehashed)
+        return kms.AsymmetricSignResponse(signature=signature, signature_crc32c=crc32c(signature),
+                                          verified_digest_crc32c=request.digest_crc32c is not None,
+                                          name=request.name, protection_level=kms.ProtectionLevel.SOFTWARE)
+
+    # Internals (called with self._lock held)
+
+    def _key(self, name):
+        key = self._keys.get(name)
+        if key is None:
+            raise _Abort(grpc.StatusCode.NOT_FOUND, f"CryptoKey {name} not found.")
+        return key
+
+    def _version(self, name):
+        key_name, _, version_id = name.rpartition('/cryptoKeyVersions/')
+        version = self._key(key_name)['versions'].get(int(version_id)) if version_id.isdigit() else None
+        if version is None:
+            raise _Abort(grpc.StatusCode.NOT_FOUND, f"CryptoKeyVersion {name} not found.")
+        return key_name, int(version_id), version
+
+    def _add_version(self, key_name, make_primary=True):
+        key = self._keys[key_name]
+        version_id = len(key['versions']) + 1
+        if key['algorithm'] in _SIGNING:
+            material = _SIGNING[key['algorithm']][0]()
+        else:
+            material = AESGCM.generate_key(256)
+        key['versions'][version_id] = {'state': State.ENABLED, 'material': material, 'create_time': _now()}
+        if make_primary and key['purpose'] == Purpose.ENCRYPT_DECRYPT and key['primary'] is None:
+            key['primary'] = version_id
+        return version_id
+
+    def _version_message(self, key_name, version_id):
+        version = self._keys[key_name]['versions'][version_id]
+        return kms.CryptoKeyVersion(
+            name=f"{key_name}/cryptoKeyVersions/{version_id}",
+            state=version['state'],
+            algorithm=self._keys[key_name]['algorithm'],
+            protection_level=kms.ProtectionLevel.SOFTWARE,
+            create_time=version['create_time'],
+            generate_time=version['create_time'],
+        )
+
+    def _crypto_key_message(self, name):
+        key = self._keys[name]
+        message = kms.CryptoKey(
+            name=name,
+            purpose=key['purpose'],
+            create_time=key['create_time'],
+            version_template={'algorithm': key['algorithm'], 'protection_level': kms.ProtectionLevel.SOFTWARE},
+        )
+        if key['rotation_period']:
+            message.rotation_period = key['rotation_period']
+        if key['primary'] is not None:
+            message.primary = self._version_message(name, key['primary'])
+        return message
+
+
+if __name__ == "__main__":
+    port = sys.argv[1] if len(sys.argv) > 1 else '9090'
+    server = FakeKMSServer()
+    endpoint = server.start(f"127.0.0.1:{port}")
+    print(f"Fake Cloud KMS listening on {endpoint}")
+    print(f"export GCP_KMS_EMULATOR_HOST={endpoint}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
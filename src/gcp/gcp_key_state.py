@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from google.cloud import kms
+
+DEFAULT_TTL = 300.0
+DEFAULT_REFRESH_AHEAD = 0.5
+DEFAULT_TIMEOUT = 10.0
+
+ENABLED = kms.CryptoKeyVersion.CryptoKeyVersionState.ENABLED
+
+
+def version_id(version_name):
+    """The numeric id at the end of a cryptoKeyVersions resource name"""
+    return int(version_name.rsplit('/', 1)[1])
+
+
+class CryptoKeyStateCache:
+    """TTL cache of CryptoKey and CryptoKeyVersion state with refresh-ahead
+
+    The first lookup of a key fetches synchronously. After that, a lookup of
+    an entry older than refresh_ahead * ttl returns the cached value at once
+    and refreshes it in the background, so a key in steady use never waits
+    on GetCryptoKey or ListCryptoKeyVersions. Only entries untouched for a
+    whole ttl are fetched inline again. A failed background refresh keeps
+    the old entry until its TTL runs out.
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL, refresh_ahead=DEFAULT_REFRESH_AHEAD, timeout=DEFAULT_TIMEOUT):
+        if not 0 < refresh_ahead <= 1:
+            raise ValueError("refresh_ahead must be in (0, 1]")
+        self.client = client
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gcp-key-state')
+        # Bumped on every invalidation so a fetch that raced with a rotation
+        # cannot store the pre-rotation state afterwards
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def crypto_key(self, key_name):
+        """Return the CryptoKey (purpose, primary version, rotation schedule, ...)"""
+        return self._get(('key', key_name), lambda: self.client.get_crypto_key(
+            request={'name': key_name}, timeout=self.timeout
+        ))
+
+    def versions(self, key_name):
+        """Return {version_id: CryptoKeyVersion} for every version of the key"""
+        def fetch():
+            pager = self.client.list_crypto_key_versions(request={'parent': key_name}, timeout=self.timeout)
+            return {version_id(v.name): v for v in pager}
+        return self._get(('versions', key_name), fetch)
+
+    def primary_version(self, key_name):
+        """Id of the version Encrypt currently uses, or None for keys without a primary"""
+        primary = self.crypto_key(key_name).primary
+        return version_id(primary.name) if primary and primary.name else None
+
+    def enabled_versions(self, key_name):
+        """Ids of the versions that can still encrypt, decrypt or sign"""
+        return sorted(v for v, version in self.versions(key_name).items() if version.state == ENABLED)
+
+    def is_enabled(self, key_name, version):
+        return int(version) in self.enabled_versions(key_name)
+
+    def needs_rotation(self, key_name, now=None):
+        """True when the primary version is older than the key's rotation period"""
+        key = self.crypto_key(key_name)
+        now = now or datetime.now(timezone.utc)
+        if key.next_rotation_time:
+            return now >= key.next_rotation_time
+        if not key.rotation_period or not key.primary or not key.primary.name:
+            return False
+        return now - key.primary.create_time >= key.rotation_period
+
+    def prefetch(self, key_names):
+        """Warm the cache for key_names so even first requests are served from memory"""
+        for key_name in key_names:
+            self.crypto_key(key_name)
+            self.versions(key_name)
+
+    def invalidate(self, key_name=None):
+        """Forget one key's state, or everything when key_name is None"""
+        with self._lock:
+            self._generation += 1
+            if key_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(('key', key_name), None)
+                self._entries.pop(('versions', key_name), None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'refreshes': self.refreshes,
+                    'entries': len(self._entries)}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def _get(self, cache_key, fetch):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                if now - entry[0] >= self.ttl * self.refresh_ahead and cache_key not in self._refreshing:
+                    self._refreshing.add(cache_key)
+                    self._pool.submit(self._refresh, cache_key, fetch, self._generation)
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = fetch()
+        self._store(cache_key, value, generation)
+        return value
+
+    def _refresh(self, cache_key, fetch, generation):
+        try:
+            value = fetch()
+        except Exception:
+            return
+        else:
+            self._store(cache_key, value, generation)
+            with self._lock:
+                self.refreshes += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def _store(self, cache_key, value, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._entries[cache_key] = (time.monotonic(), value)
@@ -0,0 +1,68 @@
+import os
+import threading
+
+import grpc
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import kms
+from google.cloud.kms_v1.services.key_management_service.transports import KeyManagementServiceGrpcTransport
+
+EMULATOR_HOST_ENV = 'GCP_KMS_EMULATOR_HOST'
+DEFAULT_ENDPOINT = 'cloudkms.googleapis.com'
+# Keep the HTTP/2 connection alive between bursts instead of reconnecting
+CHANNEL_OPTIONS = (
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.max_receive_message_length', 64 * 1024 * 1024),
+)
+
+_clients = {}
+_clients_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def _build_client(endpoint):
+    """Build a client with one long-lived gRPC channel for endpoint"""
+    emulator = endpoint or os.environ.get(EMULATOR_HOST_ENV)
+    if emulator:
+        # Local stand-in: plaintext channel, no Google credentials
+        channel = grpc.insecure_channel(emulator, options=CHANNEL_OPTIONS)
+        transport = KeyManagementServiceGrpcTransport(channel=channel, credentials=AnonymousCredentials())
+        return kms.KeyManagementServiceClient(transport=transport)
+    # Application default credentials are resolved once, when the channel is built
+    channel = KeyManagementServiceGrpcTransport.create_channel(DEFAULT_ENDPOINT, options=CHANNEL_OPTIONS)
+    return kms.KeyManagementServiceClient(transport=KeyManagementServiceGrpcTransport(channel=channel))
+
+
+def get_kms_client(endpoint=None):
+    """Return the process-wide Cloud KMS client, creating it and its channel on first use
+
+    endpoint (host:port) or GCP_KMS_EMULATOR_HOST points the client at a
+    local stand-in over an insecure channel; otherwise it talks to Cloud KMS
+    with application default credentials. gRPC channels multiplex every call
+    over one HTTP/2 connection and must not be shared with a forked child,
+    so a new client is built after fork.
+    """
+    global _clients_pid
+
+    cache_key = endpoint or os.environ.get(EMULATOR_HOST_ENV) or DEFAULT_ENDPOINT
+    client = _clients.get(cache_key)
+    if client is not None and _clients_pid == os.getpid():
+        return client
+
+    with _lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _build_client(endpoint)
+            _clients[cache_key] = client
+        return client
+
+
+def reset_clients():
+    """Close and forget every cached client (for tests and credential changes)"""
+    with _lock:
+        for client in _clients.values():
+            client.transport.close()
+        _clients.clear()
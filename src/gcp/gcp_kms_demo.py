@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 import base64
 import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 print("🔐 GOOGLE CLOUD KMS DEMO")
 print("=" * 40)
@@ -41,7 +45,7 @@ def demonstrate_gcp_concepts():
     print("   • Service account integration")
 
 def simulate_gcp_workflow():
-    """Simulate GCP KMS workflow"""
+    """Run the GCP KMS workflow against the local Cloud KMS stand-in"""
     print("\n🔄 SIMULATED GCP KMS WORKFLOW")
     print("=" * 30)
     
@@ -57,25 +61,29 @@ def simulate_gcp_workflow():
     print(f"   Key Ring: {key_ring}")
     print(f"   Crypto Key: {key_name}")
     
-    # Simulate encryption
-    plaintext = "Sensitive data for Google Cloud KMS"
-    print(f"2. 📝 Plaintext: {plaintext}")
-    
-    # Simple simulation
-    simulated_cipher = base64.b64encode(f"GCPKMS:{key_name}:{plaintext}".encode()).decode()
-    print(f"3. 🔒 Encrypted: {simulated_cipher[:50]}...")
-    
-    # Simulate decryption
-    decoded = base64.b64decode(simulated_cipher).decode()
-    if decoded.startswith('GCPKMS:'):
-        parts = decoded.split(':')
-        decrypted_key = parts[1]
-        decrypted_text = ':'.join(parts[2:])
-        print(f"4. 🔓 Decrypted with key {decrypted_key}: {decrypted_text}")
-    
-    # Verify
-    if plaintext == decrypted_text:
-        print("5. ✅ Verification: Encryption/decryption successful!")
+    from gcp.fake_kms_server import FakeKMSServer
+    from gcp.gcp_kms_client import get_kms_client
+    from gcp.gcp_kms_provider import GCPKMSProvider
+    
+    # Local Cloud KMS stand-in: same gRPC API, real AES-256-GCM
+    with FakeKMSServer(latency=0.002) as server:
+        provider = GCPKMSProvider(get_kms_client(server.start()), project_id, location, key_ring, key_name)
+        provider.ensure_key()
+        
+        # Encryption (colons and all)
+        plaintext = "Sensitive data for Google Cloud KMS: account 42:7"
+        print(f"2. 📝 Plaintext: {plaintext}")
+        
+        ciphertext = provider.encrypt(plaintext)
+        print(f"3. 🔒 Encrypted: {base64.b64encode(ciphertext[:37]).decode()}...")
+        
+        # Decryption
+        decrypted_text = provider.decrypt(ciphertext).decode()
+        print(f"4. 🔓 Decrypted with key {key_name}: {decrypted_text}")
+        
+        # Verify
+        if plaintext == decrypted_text:
+            print("5. ✅ Verification: Encryption/decryption successful!")
 
 def real_gcp_demo():
     """Run real GCP KMS demo if available"""
@@ -87,15 +95,42 @@ def real_gcp_demo():
         print("\n🚀 ATTEMPTING REAL GCP KMS SETUP")
         print("-" * 30)
         
-        # This would require actual GCP credentials
-        print("❌ GCP credentials not configured")
-        print("💡 To use real GCP KMS:")
-        print("   1. Create GCP project at https://console.cloud.google.com/")
-        print("   2. Enable KMS API")
-        print("   3. Create service account and download credentials")
-        print("   4. Set GOOGLE_APPLICATION_CREDENTIALS environment variable")
-        print("   5. Run: gcloud auth application-default login")
+        project_id = os.environ.get('GOOGLE_CLOUD_PROJECT')
+        if not project_id:
+            print("❌ GCP credentials not configured")
+            print("💡 To use real GCP KMS:")
+            print("   1. Create GCP project at https://console.cloud.google.com/")
+            print("   2. Enable KMS API")
+            print("   3. Create service account and download credentials")
+            print("   4. Set GOOGLE_APPLICATION_CREDENTIALS environment variable")
+            print("   5. Run: gcloud auth application-default login")
+            print("   6. Set GOOGLE_CLOUD_PROJECT (or GCP_KMS_EMULATOR_HOST for a local stand-in)")
+            return False
+        
+        from gcp.gcp_kms_client import get_kms_client
+        from gcp.gcp_kms_provider import GCPKMSProvider
+        
+        # One client and gRPC channel for the whole process
+        provider = GCPKMSProvider(get_kms_client(), project_id, 'global', 'multi-cloud-ring', 'gcp-lab-key')
+        if provider.ensure_key():
+            print(f"✅ Crypto key created: {provider.key_name}")
+        else:
+            print(f"✅ Crypto key ready: {provider.key_name}")
+        
+        plaintext = "Sensitive data for Google Cloud KMS: with colons"
+        ciphertext = provider.encrypt(plaintext)
+        print(f"🔒 Encrypted: {base64.b64encode(ciphertext[:37]).decode()}...")
+        
+        decrypted = provider.decrypt(ciphertext).decode()
+        print(f"🔓 Decrypted: {decrypted}")
         
+        new_version = provider.rotate()
+        print(f"🔄 Rotated; primary is now {new_version.rsplit('/', 1)[1]}")
+        
+        if provider.decrypt(ciphertext).decode() == plaintext == decrypted:
+            print("✅ GCP KMS encryption/decryption successful (old ciphertext still decrypts)")
+            return True
+        print("❌ GCP KMS round trip failed!")
         return False
         
     except Exception as e:
@@ -144,7 +179,7 @@ if __name__ == "__main__":
     print("   • Fine-grained access control")
 
 def simulate_gcp_workflow():
-    """Simulate GCP KMS workflow"""
+    """Run the GCP KMS workflow against the local Cloud KMS stand-in"""
     print("\n🔄 SIMULATED GCP KMS WORKFLOW")
     print("-" * 30)
     
@@ -160,30 +195,72 @@ def simulate_gcp_workflow():
     print(f"   Key Ring: {key_ring}")
     print(f"   Crypto Key: {crypto_key}")
     
-    # Simulate encryption
-    plaintext = "Sensitive user data for GCP KMS"
-    print(f"\n2. 📝 Plaintext: {plaintext}")
-    
-    # Simulate encryption process
-    simulated_cipher = base64.b64encode(
-        f"GCPKMS:{project_id}/{location}/{key_ring}/{crypto_key}:{plaintext}".encode()
-    ).decode()
-    
-    print(f"3. 🔒 Encrypted: {simulated_cipher[:50]}...")
+    from common.crc32c import stats as crc32c_stats
+    from gcp.fake_kms_server import FakeKMSServer
+    from gcp.gcp_key_state import CryptoKeyStateCache
+    from gcp.gcp_kms_client import get_kms_client
+    from gcp.gcp_kms_pipeline import GCPKMSPipeline
+    from gcp.gcp_kms_provider import GCPKMSProvider
+    from gcp.gcp_kms_signer import GCPKMSSigner
     
-    # Simulate decryption
-    decoded = base64.b64decode(simulated_cipher).decode()
-    if decoded.startswith('GCPKMS:'):
-        parts = decoded.split(':')
-        key_path = parts[1]
-        decrypted_text = ':'.join(parts[2:])
+    # Local Cloud KMS stand-in: same gRPC API, real AES-256-GCM
+    with FakeKMSServer(latency=0.002) as server:
+        client = get_kms_client(server.start())
+        key_state = CryptoKeyStateCache(client)
+        provider = GCPKMSProvider(client, project_id, location, key_ring, crypto_key, key_state=key_state)
+        provider.ensure_key()
+        key_state.prefetch([provider.key_name])
+        
+        # Encryption
+        plaintext = "Sensitive user data for GCP KMS: id=7:role=admin"
+        print(f"\n2. 📝 Plaintext: {plaintext}")
+        
+        ciphertext = provider.encrypt(plaintext)
+        print(f"3. 🔒 Encrypted: {base64.b64encode(ciphertext[:37]).decode()}...")
         
-        print(f"4. 🔓 Decrypted with {key_path}:")
+        # Rotation: new primary version, old ciphertext still decrypts
+        new_version = provider.rotate()
+        decrypted_text = provider.decrypt(ciphertext).decode()
+        
+        print(f"4. 🔓 Decrypted with {provider.key_name} after rotating to v{new_version.rsplit('/', 1)[1]}:")
         print(f"   {decrypted_text}")
-    
-    # Verify
-    if plaintext == decrypted_text:
-        print("5. ✅ Verification: Encryption/decryption successful!")
+        print(f"   🗂️  Cached key state: primary v{key_state.primary_version(provider.key_name)}, "
+              f"enabled {key_state.enabled_versions(provider.key_name)}, "
+              f"rotation due: {key_state.needs_rotation(provider.key_name)}")
+        pinned = provider.encrypt(plaintext, version=1)
+        print(f"   📌 Pinned encrypt to v1 (checked against cached state): "
+              f"{provider.decrypt(pinned).decode() == plaintext}")
+        
+        # Verify
+        if plaintext == decrypted_text:
+            print("5. ✅ Verification: Encryption/decryption successful!")
+        
+        # Bulk: keep 64 requests in flight on the one channel
+        records = [f"customer-{i}:{i * 7}" for i in range(500)]
+        pipeline = GCPKMSPipeline(provider, max_in_flight=64)
+        start = time.perf_counter()
+        sealed = pipeline.encrypt_many(records)
+        elapsed = time.perf_counter() - start
+        if [r.decode() for r in pipeline.decrypt_many(sealed)] == records:
+            print(f"6. 🚀 Pipelined {len(records)} encrypts in {elapsed:.2f}s "
+                  f"({len(records) / elapsed:.0f}/s with 64 in flight)")
+        print(f"   📊 RPCs served: {dict(server.call_counts)}")
+        checksums = crc32c_stats()
+        print(f"   🧮 CRC32C on every request/response ({checksums['implementation']}): "
+              f"{checksums['calls']} checks, {checksums['seconds'] * 1000:.1f} ms total")
+        
+        # Signing: AsymmetricSign in KMS, verification in-process per key version
+        signer = GCPKMSSigner(client, project_id, location, key_ring, 'token-signing-key', key_state=key_state)
+        signer.ensure_key()
+        token = b'{"sub":"user-7","scope":"read"}'
+        version, signature = signer.sign(token)
+        start = time.perf_counter()
+        verified = sum(signer.verify(token, signature, version) for _ in range(2000))
+        elapsed = time.perf_counter() - start
+        print(f"7. ✍️  Signed with v{version}; {verified}/2000 verified locally "
+              f"({2000 / elapsed:.0f}/s, {server.call_counts.get('GetPublicKey', 0)} GetPublicKey call)")
+        print(f"   🗂️  Key state cache: {key_state.stats()}")
+        key_state.close()
 
 def show_gcp_integration():
     """Show GCP service integration"""
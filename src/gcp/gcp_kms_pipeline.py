@@ -0,0 +1,124 @@
+import threading
+import time
+from urllib.parse import quote
+
+import grpc
+from google.api_core import exceptions as gcp_exceptions
+
+from common.crc32c import ChecksumError
+from common.rate_limit import backoff_delay
+from gcp.gcp_kms_provider import (
+    check_decrypt_response, check_encrypt_response, decrypt_request, encrypt_request
+)
+
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_ATTEMPTS = 5
+RETRYABLE_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED,
+                   grpc.StatusCode.RESOURCE_EXHAUSTED}
+
+
+class GCPBatchError(Exception):
+    """Raised when one or more items of a pipelined Cloud KMS batch fail"""
+
+    def __init__(self, operation, errors, results):
+        self.operation = operation
+        self.errors = errors
+        self.results = results
+        super().__init__(
+            f"{len(errors)} of {len(results)} {operation} items failed: "
+            + "; ".join(f"[{i}] {e}" for i, e in sorted(errors.items())[:5])
+        )
+
+
+class GCPKMSPipeline:
+    """Keeps up to max_in_flight Cloud KMS calls outstanding on one gRPC channel
+
+    Calls go through the transport's stubs as gRPC futures, so concurrency
+    comes from HTTP/2 multiplexing rather than from threads: one caller
+    thread can keep hundreds of requests in flight. Results come back in
+    input order; UNAVAILABLE, DEADLINE_EXCEEDED and RESOURCE_EXHAUSTED items
+    are resubmitted with jittered backoff, and anything else is reported per
+    item. One pipeline may be shared by several threads; they share the
+    in-flight window and the call/retry counters.
+    """
+
+    def __init__(self, provider, max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        # Cloud KMS routes on the resource name; the GAPIC wrapper would add this header
+        self._metadata = (('x-goog-request-params', f"name={quote(provider.key_name, safe='')}"),)
+        self.calls = 0
+        self.retries = 0
+
+    def encrypt_many(self, plaintexts, context=None, raise_on_error=True):
+        """Encrypt every plaintext with the primary key version and return the ciphertexts"""
+        requests = [
+            encrypt_request(self.provider.key_name, p.encode() if isinstance(p, str) else p, context)
+            for p in plaintexts
+        ]
+        return self.map('encrypt', requests, raise_on_error, check_encrypt_response)
+
+    def decrypt_many(self, ciphertexts, context=None, raise_on_error=True):
+        """Decrypt every ciphertext and return the plaintext bytes"""
+        requests = [decrypt_request(self.provider.key_name, c, context) for c in ciphertexts]
+        return self.map('decrypt', requests, raise_on_error, check_decrypt_response)
+
+    def map(self, operation, requests, raise_on_error=True, check=None):
+        """Send one request per item through the transport stub named operation
+
+        Returns responses (or check(response)) in input order. Failed items
+        are None and, unless raise_on_error is False, raise a GCPBatchError
+        mapping input index to a google.api_core exception or ChecksumError.
+        Items failing their checksum are retried like transient errors.
+        """
+        stub = getattr(self.provider.client.transport, operation)
+        results = [None] * len(requests)
+        errors = {}
+        pending = list(range(len(requests)))
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(backoff_delay(attempt))
+                with self._lock:
+                    self.retries += len(pending)
+            futures = [(i, self._submit(stub, requests[i])) for i in pending]
+            pending = []
+            for i, future in futures:
+                try:
+                    response = future.result()
+                    results[i] = check(response) if check is not None else response
+                    errors.pop(i, None)
+                except grpc.RpcError as e:
+                    errors[i] = gcp_exceptions.from_grpc_error(e)
+                    if e.code() in RETRYABLE_CODES:
+                        pending.append(i)
+                except ChecksumError as e:
+                    errors[i] = e
+                    pending.append(i)
+            with self._lock:
+                self.calls += len(futures)
+            if not pending:
+                break
+
+        if errors and raise_on_error:
+            raise GCPBatchError(operation, errors, results)
+        return results
+
+    def _submit(self, stub, request):
+        """Start one call once a window slot is free; the slot frees when the call completes"""
+        self._window.acquire()
+        try:
+            future = stub.future(request, timeout=self.timeout, metadata=self._metadata)
+        except BaseException:
+            self._window.release()
+            raise
+        future.add_done_callback(lambda _: self._window.release())
+        return future
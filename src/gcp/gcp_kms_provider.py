@@ -0,0 +1,178 @@
+import functools
+import os
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import kms
+
+from common.crc32c import ChecksumError, crc32c, verify
+from common.encryption_context import encode_context
+
+DEFAULT_TIMEOUT = 10.0
+DATA_KEY_BYTES = 32
+
+
+@functools.lru_cache(maxsize=1024)
+def crypto_key_path(project_id, location, key_ring, crypto_key):
+    """projects/{project}/locations/{location}/keyRings/{ring}/cryptoKeys/{key}, built once per key"""
+    return kms.KeyManagementServiceClient.crypto_key_path(project_id, location, key_ring, crypto_key)
+
+
+@functools.lru_cache(maxsize=4096)
+def crypto_key_version_path(key_name, version):
+    """The resource name of one version of a crypto key"""
+    return f"{key_name}/cryptoKeyVersions/{version}"
+
+
+def encrypt_request(key_name, plaintext, context=None):
+    """Build an EncryptRequest carrying CRC32C checksums of plaintext and AAD"""
+    plaintext = bytes(plaintext)
+    aad = encode_context(context)
+    return kms.EncryptRequest(
+        name=key_name,
+        plaintext=plaintext,
+        plaintext_crc32c=crc32c(plaintext),
+        additional_authenticated_data=aad,
+        additional_authenticated_data_crc32c=crc32c(aad),
+    )
+
+
+def decrypt_request(key_name, ciphertext, context=None):
+    """Build a DecryptRequest carrying CRC32C checksums of ciphertext and AAD"""
+    ciphertext = bytes(ciphertext)
+    aad = encode_context(context)
+    return kms.DecryptRequest(
+        name=key_name,
+        ciphertext=ciphertext,
+        ciphertext_crc32c=crc32c(ciphertext),
+        additional_authenticated_data=aad,
+        additional_authenticated_data_crc32c=crc32c(aad),
+    )
+
+
+def check_encrypt_response(response):
+    """Return the ciphertext once the server confirmed our checksums and its own matches"""
+    if not (response.verified_plaintext_crc32c and response.verified_additional_authenticated_data_crc32c):
+        raise ChecksumError("Encrypt request was corrupted in transit")
+    verify(response.ciphertext, response.ciphertext_crc32c, 'Encrypt response ciphertext')
+    return response.ciphertext
+
+
+def check_decrypt_response(response):
+    """Return the plaintext once its checksum matches"""
+    verify(response.plaintext, response.plaintext_crc32c, 'Decrypt response plaintext')
+    return response.plaintext
+
+
+def ensure_crypto_key(client, key_name, crypto_key, timeout=DEFAULT_TIMEOUT):
+    """Create key_name's key ring and the crypto key (a CryptoKey mapping) if missing; return True if created"""
+    try:
+        client.get_crypto_key(request={'name': key_name}, timeout=timeout)
+        return False
+    except gcp_exceptions.NotFound:
+        pass
+    key_ring_name, _, crypto_key_id = key_name.rpartition('/cryptoKeys/')
+    location_name, _, key_ring_id = key_ring_name.rpartition('/keyRings/')
+    try:
+        client.create_key_ring(
+            request={'parent': location_name, 'key_ring_id': key_ring_id, 'key_ring': {}}, timeout=timeout
+        )
+    except gcp_exceptions.AlreadyExists:
+        pass
+    try:
+        client.create_crypto_key(
+            request={'parent': key_ring_name, 'crypto_key_id': crypto_key_id, 'crypto_key': crypto_key},
+            timeout=timeout
+        )
+    except gcp_exceptions.AlreadyExists:
+        return False
+    return True
+
+
+class GCPKMSProvider:
+    """Cloud KMS operations for one symmetric crypto key, usable as an envelope data-key provider
+
+    Resource names are built once at construction and every call reuses the
+    client's gRPC channel. An encryption context is sent as Cloud KMS
+    additional authenticated data in its canonical encoding, so it must be
+    given again to decrypt. Every request carries CRC32C checksums of its
+    inputs and every response's checksums are verified, raising
+    ChecksumError on corruption in either direction.
+
+    With a CryptoKeyStateCache, encrypt can pin a key version and have it
+    checked against cached version state instead of a GetCryptoKeyVersion
+    call, and rotate() invalidates the cached state.
+    """
+
+    def __init__(self, client, project_id, location, key_ring, crypto_key, timeout=DEFAULT_TIMEOUT,
+                 key_state=None):
+        self.client = client
+        self.project_id = project_id
+        self.location = location
+        self.key_ring = key_ring
+        self.crypto_key = crypto_key
+        self.timeout = timeout
+        self.location_name = f"projects/{project_id}/locations/{location}"
+        self.key_ring_name = f"{self.location_name}/keyRings/{key_ring}"
+        self.key_name = crypto_key_path(project_id, location, key_ring, crypto_key)
+        self.cache_id = f"gcp-kms:{self.key_name}"
+        self.key_state = key_state
+
+    def ensure_key(self, rotation_period_days=90):
+        """Create the key ring and crypto key if they do not exist yet; return True if created"""
+        crypto_key = {
+            'purpose': kms.CryptoKey.CryptoKeyPurpose.ENCRYPT_DECRYPT,
+            'version_template': {
+                'algorithm': kms.CryptoKeyVersion.CryptoKeyVersionAlgorithm.GOOGLE_SYMMETRIC_ENCRYPTION
+            },
+        }
+        if rotation_period_days:
+            crypto_key['rotation_period'] = {'seconds': rotation_period_days * 86400}
+        return ensure_crypto_key(self.client, self.key_name, crypto_key, self.timeout)
+
+    def encrypt(self, plaintext, context=None, version=None):
+        """Encrypt up to 64 KiB with the primary (or given) key version and return the ciphertext bytes"""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode()
+        name = self.key_name
+        if version is not None:
+            if self.key_state is not None and not self.key_state.is_enabled(self.key_name, version):
+                raise ValueError(f"version {version} of {self.key_name} is not enabled")
+            name = self.key_version_name(version)
+        response = self.client.encrypt(request=encrypt_request(name, plaintext, context),
+                                       timeout=self.timeout)
+        return check_encrypt_response(response)
+
+    def decrypt(self, ciphertext, context=None):
+        """Decrypt ciphertext produced by encrypt with the same context"""
+        response = self.client.decrypt(request=decrypt_request(self.key_name, ciphertext, context),
+                                       timeout=self.timeout)
+        return check_decrypt_response(response)
+
+    def generate_data_key(self, context=None):
+        """Return (plaintext_key, wrapped_key); Cloud KMS has no datakey call, so wrap a local key"""
+        plaintext_key = os.urandom(DATA_KEY_BYTES)
+        return plaintext_key, self.encrypt(plaintext_key, context=context)
+
+    def decrypt_data_key(self, wrapped_key, context=None):
+        """Unwrap a data key produced by generate_data_key"""
+        return self.decrypt(wrapped_key, context=context)
+
+    def rotate(self):
+        """Create a new key version, make it primary and return its resource name
+
+        Earlier versions stay enabled, so existing ciphertexts still decrypt.
+        """
+        version = self.client.create_crypto_key_version(
+            request={'parent': self.key_name, 'crypto_key_version': {}}, timeout=self.timeout
+        )
+        self.client.update_crypto_key_primary_version(
+            request={'name': self.key_name, 'crypto_key_version_id': version.name.rsplit('/', 1)[1]},
+            timeout=self.timeout
+        )
+        if self.key_state is not None:
+            self.key_state.invalidate(self.key_name)
+        return version.name
+
+    def key_version_name(self, version):
+        """Resource name of version (an int or id string) of this key"""
+        return crypto_key_version_path(self.key_name, str(version))
@@ -0,0 +1,106 @@
+import hashlib
+
+from google.cloud import kms
+
+from common.crc32c import ChecksumError, crc32c, verify
+from common.signatures import PublicKeyCache, load_public_key, verify_signature
+from gcp.gcp_key_state import CryptoKeyStateCache, version_id
+from gcp.gcp_kms_provider import DEFAULT_TIMEOUT, crypto_key_path, crypto_key_version_path, ensure_crypto_key
+
+Algorithm = kms.CryptoKeyVersion.CryptoKeyVersionAlgorithm
+
+_KINDS = (('EC_SIGN_', 'ecdsa'), ('RSA_SIGN_PSS_', 'rsa-pss'), ('RSA_SIGN_PKCS1_', 'rsa-pkcs1'))
+
+# Cloud KMS digest-signing algorithm -> (digest field / hash name, common.signatures scheme)
+SIGNING_ALGORITHMS = {
+    algorithm: (algorithm.name.rsplit('_', 1)[1].lower(), f"{kind}-{algorithm.name.rsplit('_', 1)[1].lower()}")
+    for algorithm in Algorithm
+    for prefix, kind in _KINDS
+    if algorithm.name.startswith(prefix) and algorithm.name.endswith(('_SHA256', '_SHA384', '_SHA512'))
+}
+
+
+class GCPKMSSigner:
+    """Sign with a Cloud KMS asymmetric key and verify locally
+
+    sign() hashes locally and sends only the digest to AsymmetricSign with
+    CRC32C checks both ways. Asymmetric keys have no primary version, so it
+    signs with the newest enabled version (from a CryptoKeyStateCache) and
+    returns that version with the signature; callers carry it alongside,
+    e.g. as a token's key id. verify() checks in-process against the PEM
+    from GetPublicKey, fetched once per version.
+    """
+
+    def __init__(self, client, project_id, location, key_ring, crypto_key,
+                 algorithm=Algorithm.EC_SIGN_P256_SHA256, timeout=DEFAULT_TIMEOUT, key_state=None,
+                 public_keys=None):
+        if algorithm not in SIGNING_ALGORITHMS:
+            raise ValueError(f"unsupported signing algorithm {algorithm}")
+        self.client = client
+        self.algorithm = algorithm
+        self.timeout = timeout
+        self.key_name = crypto_key_path(project_id, location, key_ring, crypto_key)
+        self.key_state = key_state if key_state is not None else CryptoKeyStateCache(client, timeout=timeout)
+        self.public_keys = public_keys if public_keys is not None else PublicKeyCache()
+        self.cache_id = f"gcp-kms:{self.key_name}"
+
+    def ensure_key(self):
+        """Create the key ring and signing key if they do not exist yet; return True if created"""
+        return ensure_crypto_key(self.client, self.key_name, {
+            'purpose': kms.CryptoKey.CryptoKeyPurpose.ASYMMETRIC_SIGN,
+            'version_template': {'algorithm': self.algorithm},
+        }, self.timeout)
+
+    def signing_version(self):
+        """Newest enabled version of the key"""
+        versions = self.key_state.enabled_versions(self.key_name)
+        if not versions:
+            raise ValueError(f"{self.key_name} has no enabled version")
+        return versions[-1]
+
+    def sign(self, data, version=None):
+        """Sign data with the newest enabled (or given) version and return (version, signature)"""
+        if isinstance(data, str):
+            data = data.encode()
+        version = int(version) if version is not None else self.signing_version()
+        hash_name, _ = SIGNING_ALGORITHMS[self.algorithm]
+        digest = hashlib.new(hash_name, data).digest()
+        name = crypto_key_version_path(self.key_name, str(version))
+        response = self.client.asymmetric_sign(
+            request={'name': name, 'digest': {hash_name: digest}, 'digest_crc32c': crc32c(digest)},
+            timeout=self.timeout
+        )
+        if not response.verified_digest_crc32c or response.name != name:
+            raise ChecksumError("AsymmetricSign request was corrupted in transit")
+        verify(response.signature, response.signature_crc32c, 'AsymmetricSign signature')
+        return version, response.signature
+
+    def verify(self, data, signature, version):
+        """Check a signature made by sign() with version, without calling Cloud KMS"""
+        if isinstance(data, str):
+            data = data.encode()
+        public_key, scheme = self.public_key(version)
+        return verify_signature(public_key, scheme, data, signature)
+
+    def public_key(self, version):
+        """(cryptography public key, scheme) of one key version, fetched at most once"""
+        version = int(version)
+        return self.public_keys.get(self.cache_id, version, lambda: self._fetch_public_key(version))
+
+    def rotate(self):
+        """Create a new key version and return its id; later sign() calls use it"""
+        created = self.client.create_crypto_key_version(
+            request={'parent': self.key_name, 'crypto_key_version': {}}, timeout=self.timeout
+        )
+        self.key_state.invalidate(self.key_name)
+        return version_id(created.name)
+
+    def _fetch_public_key(self, version):
+        response = self.client.get_public_key(
+            request={'name': crypto_key_version_path(self.key_name, str(version))}, timeout=self.timeout
+        )
+        pem = response.pem.encode()
+        verify(pem, response.pem_crc32c, 'GetPublicKey PEM')
+        if response.algorithm not in SIGNING_ALGORITHMS:
+            raise ValueError(f"version {version} of {self.key_name} uses {response.algorithm.name}")
+        return load_public_key(pem), SIGNING_ALGORITHMS[response.algorithm][1]
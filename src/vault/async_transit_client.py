@@ -0,0 +1,187 @@
+import asyncio
+import os
+
+import aiohttp
+import hvac
+
+from common.encryption_context import encode_context
+from vault.transit_client import (
+    DEFAULT_BATCH_SIZE, TransitBatchError, _check_derived, _chunks, _from_b64, _to_b64, _with_context
+)
+from vault.vault_client import DEFAULT_VAULT_ADDR, DEFAULT_VAULT_TOKEN
+
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 10.0
+
+
+class AsyncTransitClient:
+    """asyncio Vault transit client with a bounded number of requests in flight
+
+    At most max_concurrency requests are outstanding at once; further calls
+    wait for a slot. timeout is a per-call deadline covering both the wait for
+    a slot and the HTTP exchange, and a cancelled or timed-out call always
+    gives its slot back. As with TransitClient, a context given for a key
+    that is not derived raises ValueError (checked once per key).
+
+    The semaphore and HTTP session belong to one event loop, so they are
+    created on first use in each loop: one client can serve several
+    asyncio.run() calls in turn, though not two loops at the same time.
+    Enter it with `async with` inside each run so the session is closed
+    before its loop ends.
+    """
+
+    def __init__(self, url=None, token=None, mount_point='transit',
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.url = (url or os.environ.get('VAULT_ADDR', DEFAULT_VAULT_ADDR)).rstrip('/')
+        self.token = token or os.environ.get('VAULT_TOKEN', DEFAULT_VAULT_TOKEN)
+        self.mount_point = mount_point
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._loop = None
+        self._semaphore = None
+        self._session = None
+        self._derived = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying HTTP session"""
+        if self._session is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._session.close()
+            else:
+                self._session.detach()
+            self._session = None
+            self._loop = None
+
+    async def encrypt(self, name, plaintext, timeout=None, context=None):
+        """Encrypt one value and return the vault:v<N>: ciphertext"""
+        payload = _with_context([{'plaintext': _to_b64(plaintext)}], await self._checked(name, context))[0]
+        data = await self._request('POST', f'encrypt/{name}', payload, timeout)
+        return data['ciphertext']
+
+    async def decrypt(self, name, ciphertext, timeout=None, context=None):
+        """Decrypt one ciphertext and return the plaintext bytes"""
+        payload = _with_context([{'ciphertext': ciphertext}], await self._checked(name, context))[0]
+        data = await self._request('POST', f'decrypt/{name}', payload, timeout)
+        return _from_b64(data['plaintext'])
+
+    async def rewrap(self, name, ciphertext, key_version=None, timeout=None, context=None):
+        """Re-encrypt a ciphertext under the latest (or given) key version"""
+        payload = _with_context([{'ciphertext': ciphertext}], await self._checked(name, context))[0]
+        if key_version is not None:
+            payload['key_version'] = key_version
+        data = await self._request('POST', f'rewrap/{name}', payload, timeout)
+        return data['ciphertext']
+
+    async def rotate(self, name, timeout=None):
+        """Rotate the named key to a new version"""
+        await self._request('POST', f'keys/{name}/rotate', {}, timeout)
+
+    async def read_key(self, name, timeout=None):
+        """Return the key metadata (latest_version, type, keys, ...)"""
+        return await self._request('GET', f'keys/{name}', None, timeout)
+
+    async def encrypt_batch(self, name, plaintexts, raise_on_error=True, timeout=None, context=None):
+        """Encrypt a list of values, sending batch_size chunks concurrently"""
+        batch_input = _with_context([{'plaintext': _to_b64(p)} for p in plaintexts], await self._checked(name, context))
+        return await self._run_batch('encrypt', name, batch_input, 'ciphertext', str,
+                                     raise_on_error, timeout)
+
+    async def decrypt_batch(self, name, ciphertexts, raise_on_error=True, timeout=None, context=None):
+        """Decrypt a list of ciphertexts, sending batch_size chunks concurrently"""
+        batch_input = _with_context([{'ciphertext': c} for c in ciphertexts], await self._checked(name, context))
+        return await self._run_batch('decrypt', name, batch_input, 'plaintext', _from_b64,
+                                     raise_on_error, timeout)
+
+    async def rewrap_batch(self, name, ciphertexts, key_version=None, raise_on_error=True, timeout=None,
+                           context=None):
+        """Rewrap a list of ciphertexts, sending batch_size chunks concurrently"""
+        batch_input = _with_context([{'ciphertext': c} for c in ciphertexts], await self._checked(name, context))
+        if key_version is not None:
+            for item in batch_input:
+                item['key_version'] = key_version
+        return await self._run_batch('rewrap', name, batch_input, 'ciphertext', str,
+                                     raise_on_error, timeout)
+
+    async def _checked(self, name, context):
+        """Return context after making sure key name will actually enforce it"""
+        if encode_context(context) and name not in self._derived:
+            _check_derived(name, await self.read_key(name))
+            self._derived.add(name)
+        return context
+
+    async def _run_batch(self, operation, name, batch_input, field, convert, raise_on_error, timeout):
+        """Send batch chunks concurrently and collect per-item results in input order"""
+        chunks = list(_chunks(batch_input, self.batch_size))
+        responses = await asyncio.gather(*(
+            self._send_batch(operation, name, chunk, timeout) for _, chunk in chunks
+        ))
+
+        results = [None] * len(batch_input)
+        errors = {}
+        for (offset, _), batch_results in zip(chunks, responses):
+            for i, item in enumerate(batch_results):
+                if item.get('error') or field not in item:
+                    errors[offset + i] = item.get('error') or f"missing {field} in response"
+                else:
+                    results[offset + i] = convert(item[field])
+
+        if errors and raise_on_error:
+            raise TransitBatchError(operation, errors, results)
+        return results
+
+    async def _send_batch(self, operation, name, chunk, timeout):
+        """Issue one batch request and return its batch_results list"""
+        try:
+            data = await self._request('POST', f'{operation}/{name}', {'batch_input': chunk}, timeout)
+        except hvac.exceptions.InvalidRequest as e:
+            batch_results = ((e.json or {}).get('data') or {}).get('batch_results')
+            if batch_results is None:
+                raise
+            return batch_results
+        return data['batch_results']
+
+    async def _request(self, method, path, payload, timeout):
+        """Run one request inside the concurrency window under a deadline"""
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._bounded_request(method, path, payload), timeout)
+
+    async def _bounded_request(self, method, path, payload):
+        session = self._bind_loop()
+        async with self._semaphore:
+            url = f"{self.url}/v1/{self.mount_point}/{path}"
+            async with session.request(method, url, json=payload) as response:
+                body = None
+                if response.content_type == 'application/json':
+                    body = await response.json()
+                if response.status >= 400:
+                    errors = (body or {}).get('errors')
+                    text = None if body is not None else await response.text()
+                    raise hvac.exceptions.VaultError.from_status(
+                        response.status, text, errors=errors, method=method, url=url, json=body
+                    )
+                return (body or {}).get('data') or {}
+
+    def _bind_loop(self):
+        """Return the session for the running loop, creating it and the semaphore on a new loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self._session is None:
+            if self._session is not None:
+                # Its loop has ended (an earlier asyncio.run), so it cannot be closed from here
+                self._session.detach()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                headers={'X-Vault-Token': self.token, 'X-Vault-Request': 'true'},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            )
+        return self._session
@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import namedtuple
+
+import hvac
+
+from common.state_file import load_json, save_json
+from vault.health import probe
+
+DEFAULT_STATE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'multi-cloud-kms-lab', 'vault-bootstrap.json'
+)
+
+BootstrapResult = namedtuple('BootstrapResult', ['mount_created', 'keys_created', 'cached'])
+
+_done = set()
+_lock = threading.Lock()
+
+
+def _normalize_keys(keys):
+    """Accept a list of key names or a {name: create_key kwargs} mapping"""
+    if isinstance(keys, dict):
+        return keys
+    return {name: {} for name in keys}
+
+
+def ensure_transit(client, keys, mount_point='transit', state_path=DEFAULT_STATE_PATH, force=False):
+    """Make sure the transit mount and keys exist, creating only what is missing
+
+    Reads sys/mounts and the key list once instead of issuing writes that fail
+    with "already in use" / "already exists". Completed work is remembered in
+    process and in state_path, keyed by the server's cluster_id so a restarted
+    dev server (new cluster, empty storage) is bootstrapped again. keys is a
+    list of names or a {name: create_key kwargs} mapping; keys that will be
+    used with an encryption context need {'derived': True}.
+    """
+    keys = _normalize_keys(keys)
+    cluster_id = probe(client.url).cluster_id or client.url
+    state_key = f"{cluster_id}|{mount_point}"
+    wanted = set(keys)
+
+    with _lock:
+        if not force:
+            if all((state_key, name) in _done for name in wanted):
+                return BootstrapResult(False, [], True)
+            state = load_json(state_path) if state_path else {}
+            if wanted <= set(state.get(state_key, [])):
+                _done.update((state_key, name) for name in wanted)
+                return BootstrapResult(False, [], True)
+
+        mount_created = False
+        mounts = client.sys.list_mounted_secrets_engines()
+        mounts = mounts.get('data', mounts)
+        if f"{mount_point}/" not in mounts:
+            client.sys.enable_secrets_engine(backend_type='transit', path=mount_point)
+            mount_created = True
+
+        existing = set()
+        if not mount_created:
+            try:
+                existing = set(client.secrets.transit.list_keys(mount_point=mount_point)['data']['keys'])
+            except hvac.exceptions.InvalidPath:
+                # Vault answers 404 for a mount without keys
+                pass
+
+        keys_created = []
+        for name in sorted(wanted - existing):
+            client.secrets.transit.create_key(name=name, mount_point=mount_point, **keys[name])
+            keys_created.append(name)
+
+        _done.update((state_key, name) for name in wanted)
+        if state_path:
+            state = load_json(state_path)
+            state[state_key] = sorted(wanted | existing | set(state.get(state_key, [])))
+            save_json(state_path, state)
+
+    return BootstrapResult(mount_created, keys_created, False)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import time
+
+from vault.health import probe
+from vault.vault_client import DEFAULT_VAULT_ADDR, DEFAULT_VAULT_TOKEN
+
+DEFAULT_DEADLINE = 30.0
+INITIAL_DELAY = 0.05
+MAX_DELAY = 1.0
+
+
+class VaultStartError(Exception):
+    """Raised when the dev server exits or does not become ready in time"""
+
+
+def _poll(predicate, deadline, process=None):
+    """Call predicate with exponential backoff until it is true or the deadline passes"""
+    start = time.monotonic()
+    delay = INITIAL_DELAY
+    while True:
+        if predicate():
+            return time.monotonic() - start
+        if process is not None and process.poll() is not None:
+            raise VaultStartError(f"Vault process exited with code {process.returncode}")
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            raise VaultStartError(f"Vault not ready after {deadline:.1f}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_DELAY)
+
+
+def wait_until_ready(url=None, deadline=DEFAULT_DEADLINE, process=None):
+    """Block until Vault reports initialized, unsealed and active; return seconds waited
+
+    /v1/sys/health answers 200 only for an active, unsealed node (429 for a
+    standby, 501 uninitialized, 503 sealed), so anything else keeps polling.
+    If process is given and exits first, VaultStartError is raised at once.
+    """
+    url = url or os.environ.get('VAULT_ADDR', DEFAULT_VAULT_ADDR)
+    return _poll(lambda: probe(url, max_age=0).ready, deadline, process)
+
+
+def wait_until_stopped(url=None, deadline=DEFAULT_DEADLINE):
+    """Block until nothing answers on the Vault address; return seconds waited"""
+    url = url or os.environ.get('VAULT_ADDR', DEFAULT_VAULT_ADDR)
+    return _poll(lambda: not probe(url, max_age=0).reachable, deadline)
+
+
+def start_dev_server(listen_address='127.0.0.1:8200', root_token=DEFAULT_VAULT_TOKEN,
+                     deadline=DEFAULT_DEADLINE, log_path='vault.log'):
+    """Launch `vault server -dev` and return (process, seconds_to_ready)
+
+    Output goes to log_path so a chatty server can never block on a full
+    pipe. The process is terminated if it fails to become ready.
+    """
+    with open(log_path, 'ab') as log:
+        process = subprocess.Popen([
+            "vault", "server", "-dev", f"-dev-root-token-id={root_token}",
+            f"-dev-listen-address={listen_address}"
+        ], stdout=log, stderr=subprocess.STDOUT)
+
+    try:
+        elapsed = wait_until_ready(f"http://{listen_address}", deadline, process)
+    except VaultStartError:
+        if process.poll() is None:
+            process.terminate()
+        raise
+    return process, elapsed
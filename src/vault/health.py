@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+# Kept free of hvac so requirement checks can run before hvac is installed
+DEFAULT_VAULT_ADDR = 'http://127.0.0.1:8200'
+DEFAULT_MAX_AGE = 2.0
+PROBE_TIMEOUT = 1.0
+
+
+class HealthStatus(namedtuple('HealthStatus', [
+        'reachable', 'status_code', 'initialized', 'sealed', 'standby', 'version', 'cluster_id',
+        'latency'])):
+    """Result of one /v1/sys/health request"""
+
+    __slots__ = ()
+
+    @property
+    def ready(self):
+        """True only for an initialized, unsealed, active node"""
+        return self.status_code == 200
+
+
+_cache = {}
+_lock = threading.Lock()
+_session = requests.Session()
+
+
+def probe(url=None, max_age=DEFAULT_MAX_AGE, timeout=PROBE_TIMEOUT):
+    """Return Vault's /v1/sys/health as a HealthStatus, reusing a result up to max_age seconds old
+
+    Pass max_age=0 to force a fresh request. An unreachable server yields
+    reachable=False rather than an exception.
+    """
+    url = (url or os.environ.get('VAULT_ADDR', DEFAULT_VAULT_ADDR)).rstrip('/')
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(url)
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
+
+    status = _fetch(url, timeout)
+    with _lock:
+        _cache[url] = (time.monotonic(), status)
+    return status
+
+
+def _fetch(url, timeout):
+    """Issue one health request"""
+    start = time.monotonic()
+    try:
+        response = _session.get(f"{url}/v1/sys/health", timeout=timeout)
+    except requests.RequestException:
+        return HealthStatus(False, None, None, None, None, None, None, time.monotonic() - start)
+    latency = time.monotonic() - start
+
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    return HealthStatus(
+        True,
+        response.status_code,
+        body.get('initialized'),
+        body.get('sealed'),
+        body.get('standby'),
+        body.get('version'),
+        body.get('cluster_id'),
+        latency
+    )
+
+
+def clear_cache():
+    """Forget every cached probe result"""
+    with _lock:
+        _cache.clear()
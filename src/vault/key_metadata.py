@@ -0,0 +1,128 @@
+import threading
+import time
+
+import hvac
+
+DEFAULT_TTL = 60.0
+DEFAULT_WATCH_INTERVAL = 15.0
+
+_LIST_KEY = object()
+
+
+class KeyMetadataCache:
+    """In-memory cache of transit key metadata (read_key / list_keys)
+
+    Entries live for ttl seconds. Rotations and config changes made through
+    this object invalidate the affected key immediately; changes made by other
+    processes are picked up when the TTL expires or, with start_watch(), on
+    the next poll.
+    """
+
+    def __init__(self, client, mount_point='transit', ttl=DEFAULT_TTL):
+        self.client = client
+        self.mount_point = mount_point
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        # Bumped on every invalidation so a fetch that raced with a rotation
+        # cannot store the pre-rotation metadata afterwards
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def read_key(self, name, force_refresh=False):
+        """Return the key's metadata dict (latest_version, type, keys, min versions, ...)
+
+        force_refresh reads from Vault even if a cached entry is still fresh.
+        """
+        return self._get(name, lambda: self.client.secrets.transit.read_key(
+            name=name, mount_point=self.mount_point
+        )['data'], force_refresh)
+
+    def latest_version(self, name, force_refresh=False):
+        return self.read_key(name, force_refresh)['latest_version']
+
+    def key_type(self, name):
+        return self.read_key(name)['type']
+
+    def min_decryption_version(self, name):
+        return self.read_key(name)['min_decryption_version']
+
+    def list_keys(self):
+        """Return the names of all keys on the mount"""
+        def fetch():
+            try:
+                return self.client.secrets.transit.list_keys(mount_point=self.mount_point)['data']['keys']
+            except hvac.exceptions.InvalidPath:
+                # Vault answers 404 for a mount without keys
+                return []
+        return list(self._get(_LIST_KEY, fetch))
+
+    def rotate_key(self, name):
+        """Rotate the key and drop its cached metadata"""
+        self.client.secrets.transit.rotate_key(name=name, mount_point=self.mount_point)
+        self.invalidate(name)
+
+    def update_key_configuration(self, name, **config):
+        """Change key config (min_decryption_version, ...) and drop its cached metadata"""
+        self.client.secrets.transit.update_key_configuration(name=name, mount_point=self.mount_point, **config)
+        self.invalidate(name)
+
+    def invalidate(self, name=None):
+        """Forget one key's metadata, or everything when name is None"""
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+                self._entries.pop(_LIST_KEY, None)
+
+    def start_watch(self, interval=DEFAULT_WATCH_INTERVAL):
+        """Refresh every cached key in a daemon thread every interval seconds"""
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch, args=(interval,), name='transit-key-watch', daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watch(self):
+        if self._watch_thread is not None:
+            self._watch_stop.set()
+            self._watch_thread.join()
+            self._watch_thread = None
+
+    def _watch(self, interval):
+        while not self._watch_stop.wait(interval):
+            with self._lock:
+                names = [name for name in self._entries if name is not _LIST_KEY]
+                generation = self._generation
+            for name in names:
+                try:
+                    data = self.client.secrets.transit.read_key(name=name, mount_point=self.mount_point)['data']
+                except Exception:
+                    # Keep serving the cached entry until the TTL runs out
+                    continue
+                self._store(name, data, generation)
+
+    def _get(self, name, fetch, force_refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and now < entry[0] and not force_refresh:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = fetch()
+        self._store(name, value, generation)
+        return value
+
+    def _store(self, name, value, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._entries[name] = (time.monotonic() + self.ttl, value)
@@ -1,44 +1,33 @@
 #!/usr/bin/env python3
-import subprocess
-import time
+import importlib.util
+import platform
+import shutil
 import sys
 import os
 
-def run_command(cmd, check=True):
-    """Run a shell command and return result"""
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if check and result.returncode != 0:
-            print(f"❌ Command failed: {cmd}")
-            print(f"   Error: {result.stderr}")
-            return False
-        return result
-    except Exception as e:
-        print(f"❌ Error running command: {e}")
-        return False
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 def check_requirements():
     """Check if all requirements are met"""
     print("🔍 Checking requirements...")
     
     # Check Python
-    python_check = run_command("python3 --version")
-    if python_check:
-        print(f"✅ {python_check.stdout.strip()}")
-    
-    # Check Vault
-    vault_check = run_command("vault --version")
-    if vault_check:
-        print(f"✅ Vault: {vault_check.stdout.strip()}")
+    print(f"✅ Python {platform.python_version()}")
+    
+    # Check Vault: a reachable server is enough, otherwise the CLI is needed to start one
+    from vault.health import probe
+    if probe().reachable:
+        print("✅ Vault server reachable at http://127.0.0.1:8200")
+    elif shutil.which("vault"):
+        print(f"✅ Vault CLI: {shutil.which('vault')}")
     else:
         print("❌ Vault not found. Please install HashiCorp Vault.")
         return False
         
     # Check Python packages
-    try:
-        import hvac
+    if importlib.util.find_spec('hvac') is not None:
         print("✅ hvac package available")
-    except ImportError:
+    else:
         print("❌ hvac package missing. Run: pip3 install hvac")
         return False
         
@@ -49,41 +38,35 @@ def start_vault():
     print("\n🚀 Starting Vault server...")
     
     # Check if Vault is already running
-    status_check = run_command("vault status", check=False)
-    if status_check and status_check.returncode == 0:
+    from vault.health import probe
+    if probe().ready:
         print("✅ Vault is already running")
         return True
     
-    # Start Vault in development mode
-    vault_process = subprocess.Popen([
-        "vault", "server", "-dev", "-dev-root-token-id=root",
-        "-dev-listen-address=127.0.0.1:8200"
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    
-    # Wait for Vault to start
-    time.sleep(3)
-    
-    # Check if Vault started successfully
-    status_check = run_command("vault status", check=False)
-    if status_check and status_check.returncode == 0:
-        print("✅ Vault server started successfully")
-        print("   Address: http://127.0.0.1:8200")
-        print("   Token: root")
-        return True
-    else:
-        print("❌ Failed to start Vault server")
+    # Start Vault in development mode and poll until it is ready
+    from vault.dev_server import VaultStartError, start_dev_server
+    
+    try:
+        vault_process, elapsed = start_dev_server()
+    except VaultStartError as e:
+        print(f"❌ Failed to start Vault server: {e}")
         return False
+    
+    print(f"✅ Vault server started successfully in {elapsed:.2f}s")
+    print("   Address: http://127.0.0.1:8200")
+    print("   Token: root")
+    return True
 
 def run_kms_demo():
     """Run the main KMS demonstration"""
     print("\n🎓 KMS LEARNING LAB - CORE CONCEPTS")
     print("=" * 50)
     
-    import hvac
-    import base64
+    from vault.vault_client import get_client
+    from vault.transit_client import TransitClient
     
     # Connect to Vault
-    client = hvac.Client(url='http://127.0.0.1:8200', token='root')
+    client = get_client()
     
     if not client.is_authenticated():
         print("❌ Cannot authenticate with Vault")
@@ -91,19 +74,12 @@ def run_kms_demo():
         
     print("✅ Connected to Vault!")
     
-    # Enable transit engine
-    try:
-        client.sys.enable_secrets_engine(backend_type='transit', path='transit')
-        print("✅ Transit engine enabled")
-    except Exception:
-        print("ℹ️ Transit engine already enabled")
+    # Enable transit engine and create the key, skipping whatever already exists
+    from vault.bootstrap import ensure_transit
     
-    # Create a key
-    try:
-        client.secrets.transit.create_key(name='demo-key', type='aes256-gcm96')
-        print("✅ Created encryption key: 'demo-key'")
-    except Exception:
-        print("ℹ️ Key already exists")
+    result = ensure_transit(client, {'demo-key': {'key_type': 'aes256-gcm96'}})
+    print("✅ Transit engine enabled" if result.mount_created else "ℹ️ Transit engine already enabled")
+    print("✅ Created encryption key: 'demo-key'" if result.keys_created else "ℹ️ Key already exists")
     
     # DEMO 1: Basic Encryption
     print("\n1. 🔐 BASIC ENCRYPTION")
@@ -113,22 +89,15 @@ def run_kms_demo():
     print(f"   Original: {secret_data}")
     
     # Encrypt
-    encrypted = client.secrets.transit.encrypt_data(
-        name='demo-key',
-        plaintext=base64.b64encode(secret_data.encode()).decode()
-    )
-    ciphertext = encrypted['data']['ciphertext']
+    transit = TransitClient(client, 'demo-key')
+    ciphertext = transit.encrypt(secret_data)
     print(f"   Encrypted: {ciphertext[:60]}...")
     
     # DEMO 2: Basic Decryption
     print("\n2. 🔓 BASIC DECRYPTION")
     print("-" * 30)
     
-    decrypted = client.secrets.transit.decrypt_data(
-        name='demo-key',
-        ciphertext=ciphertext
-    )
-    decrypted_data = base64.b64decode(decrypted['data']['plaintext']).decode()
+    decrypted_data = transit.decrypt(ciphertext).decode()
     print(f"   Decrypted: {decrypted_data}")
     
     # Verify
@@ -146,11 +115,7 @@ def run_kms_demo():
     print("   ✅ Key rotated to new version")
     
     # Show backward compatibility
-    still_decrypts = client.secrets.transit.decrypt_data(
-        name='demo-key',
-        ciphertext=ciphertext
-    )
-    still_works = base64.b64decode(still_decrypts['data']['plaintext']).decode()
+    still_works = transit.decrypt(ciphertext).decode()
     
     if still_works == secret_data:
         print("   ✅ Backward compatibility maintained")
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 import subprocess
-import time
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def setup_environment():
     """Set up the proper environment for Vault"""
     print("🔧 Setting up environment...")
@@ -16,11 +17,11 @@ def setup_environment():
     print("✅ Set VAULT_TOKEN=root")
 
 def run_command(cmd, check=True):
-    """Run a shell command and return result"""
+    """Run a command given as an argument list (no shell) and return result"""
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        result = subprocess.run(cmd, capture_output=True, text=True)
         if check and result.returncode != 0:
-            print(f"❌ Command failed: {cmd}")
+            print(f"❌ Command failed: {' '.join(cmd)}")
             print(f"   Error: {result.stderr}")
             return False
         return result
@@ -35,56 +36,42 @@ def check_vault_status():
     # Make sure environment is set
     os.environ['VAULT_ADDR'] = 'http://127.0.0.1:8200'
     
-    result = run_command("vault status", check=False)
+    from vault.health import probe
+    status = probe()
     
-    if result and result.returncode == 0:
-        print("✅ Vault is running and accessible")
+    if status.ready:
+        print(f"✅ Vault is running and accessible ({status.latency * 1000:.1f} ms)")
         return True
-    elif result and result.returncode == 2:
+    elif not status.reachable:
         print("ℹ️ Vault is not running")
         return False
     else:
-        print(f"❓ Vault status check failed: {result.stderr if result else 'Unknown error'}")
+        print(f"❓ Vault status check failed: HTTP {status.status_code} (sealed={status.sealed}, standby={status.standby})")
         return False
 
 def start_vault():
     """Start Vault development server"""
     print("\n🚀 Starting Vault server...")
     
+    from vault.dev_server import VaultStartError, start_dev_server, wait_until_stopped
+    
     # Kill any existing Vault processes
     print("🔄 Cleaning up any existing Vault processes...")
-    run_command("pkill -f 'vault server'", check=False)
-    time.sleep(2)
+    run_command(['pkill', '-f', 'vault server'], check=False)
     
     # Start Vault in development mode
     print("📝 Starting Vault development server on http://127.0.0.1:8200...")
     
     try:
-        # Start Vault in the background
-        vault_process = subprocess.Popen([
-            "vault", "server", "-dev", "-dev-root-token-id=root",
-            "-dev-listen-address=127.0.0.1:8200"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Wait for Vault to start
-        time.sleep(3)
-        
-        # Check if process is still running
-        if vault_process.poll() is not None:
-            stdout, stderr = vault_process.communicate()
-            print(f"❌ Vault process ended:")
-            print(f"   stdout: {stdout.decode() if stdout else 'None'}")
-            print(f"   stderr: {stderr.decode() if stderr else 'None'}")
-            return False
-        
-        # Check if Vault is accessible
-        if check_vault_status():
-            print("✅ Vault server started successfully!")
-            return True
-        else:
-            print("❌ Vault started but not accessible")
-            return False
-            
+        # Poll the health endpoint instead of sleeping a fixed time
+        wait_until_stopped()
+        vault_process, elapsed = start_dev_server()
+        print(f"✅ Vault server started successfully! (ready in {elapsed:.2f}s)")
+        return True
+    except VaultStartError as e:
+        print(f"❌ Vault did not become ready: {e}")
+        print("   See vault.log for the server output")
+        return False
     except Exception as e:
         print(f"❌ Failed to start Vault: {e}")
         return False
@@ -94,12 +81,12 @@ def run_kms_demo():
     print("\n🎓 KMS LEARNING LAB - CORE CONCEPTS")
     print("=" * 50)
     
-    import hvac
-    import base64
+    from vault.vault_client import get_client
+    from vault.transit_client import TransitClient
     
     # Connect to Vault with explicit settings
     print("🔗 Connecting to Vault...")
-    client = hvac.Client(url='http://127.0.0.1:8200', token='root')
+    client = get_client()
     
     try:
         if not client.is_authenticated():
@@ -111,43 +98,32 @@ def run_kms_demo():
         
     print("✅ Connected to Vault!")
     
-    # Enable transit engine
-    try:
-        client.sys.enable_secrets_engine(backend_type='transit', path='transit')
-        print("✅ Transit engine enabled")
-    except Exception as e:
-        if "path is already in use" in str(e):
-            print("ℹ️ Transit engine already enabled")
-        else:
-            print(f"❌ Failed to enable transit engine: {e}")
-            return False
+    # Enable transit engine and create the key - COMPATIBLE VERSION
+    from vault.bootstrap import ensure_transit
     
-    # Create a key - COMPATIBLE VERSION
     print("🔑 Creating encryption key...")
     try:
-        # Try the newer API first
         try:
             # For newer HVAC versions
-            create_response = client.secrets.transit.create_key(
-                name='demo-key',
-                key_type='aes256-gcm96',
-                exportable=True,
-                allow_plaintext_backup=True
-            )
-            print("✅ Created encryption key: 'demo-key' (new API)")
+            result = ensure_transit(client, {'demo-key': {
+                'key_type': 'aes256-gcm96',
+                'exportable': True,
+                'allow_plaintext_backup': True
+            }})
+            api = "new API"
         except TypeError:
             # Fallback to older API
-            create_response = client.secrets.transit.create_key(
-                name='demo-key'
-            )
-            print("✅ Created encryption key: 'demo-key' (legacy API)")
-            
+            result = ensure_transit(client, ['demo-key'])
+            api = "legacy API"
     except Exception as e:
-        if "already exists" in str(e):
-            print("ℹ️ Key already exists")
-        else:
-            print(f"❌ Failed to create key: {e}")
-            return False
+        print(f"❌ Failed to bootstrap transit engine: {e}")
+        return False
+    
+    print("✅ Transit engine enabled" if result.mount_created else "ℹ️ Transit engine already enabled")
+    if result.keys_created:
+        print(f"✅ Created encryption key: 'demo-key' ({api})")
+    else:
+        print("ℹ️ Key already exists")
     
     # DEMO 1: Basic Encryption
     print("\n1. 🔐 BASIC ENCRYPTION")
@@ -158,11 +134,8 @@ def run_kms_demo():
     
     try:
         # Encrypt
-        encrypted = client.secrets.transit.encrypt_data(
-            name='demo-key',
-            plaintext=base64.b64encode(secret_data.encode()).decode()
-        )
-        ciphertext = encrypted['data']['ciphertext']
+        transit = TransitClient(client, 'demo-key')
+        ciphertext = transit.encrypt(secret_data)
         print(f"   Encrypted: {ciphertext}")
     except Exception as e:
         print(f"❌ Encryption failed: {e}")
@@ -173,11 +146,7 @@ def run_kms_demo():
     print("-" * 30)
     
     try:
-        decrypted = client.secrets.transit.decrypt_data(
-            name='demo-key',
-            ciphertext=ciphertext
-        )
-        decrypted_data = base64.b64decode(decrypted['data']['plaintext']).decode()
+        decrypted_data = transit.decrypt(ciphertext).decode()
         print(f"   Decrypted: {decrypted_data}")
     except Exception as e:
         print(f"❌ Decryption failed: {e}")
@@ -199,11 +168,7 @@ def run_kms_demo():
         print("   ✅ Key rotated to new version")
         
         # Show backward compatibility
-        still_decrypts = client.secrets.transit.decrypt_data(
-            name='demo-key',
-            ciphertext=ciphertext
-        )
-        still_works = base64.b64decode(still_decrypts['data']['plaintext']).decode()
+        still_works = transit.decrypt(ciphertext).decode()
         
         if still_works == secret_data:
             print("   ✅ Backward compatibility maintained")
@@ -218,9 +183,10 @@ def run_kms_demo():
     print("\n4. 📋 KEY MANAGEMENT")
     print("-" * 30)
     try:
-        keys = client.secrets.transit.list_keys()
-        if keys and 'data' in keys and 'keys' in keys['data']:
-            print(f"   Available keys: {', '.join(keys['data']['keys'])}")
+        from vault.key_metadata import KeyMetadataCache
+        keys = KeyMetadataCache(client).list_keys()
+        if keys:
+            print(f"   Available keys: {', '.join(keys)}")
         else:
             print("   No keys found or unable to list keys")
     except Exception as e:
@@ -0,0 +1,185 @@
+import itertools
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from common.state_file import load_json, save_json
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 8
+MAX_REPORTED_FAILURES = 100
+
+_VERSION_RE = re.compile(r'^vault:v(\d+):')
+
+RewrapStats = namedtuple('RewrapStats', [
+    'target_version', 'resumed_from', 'records', 'rewrapped', 'skipped', 'failed',
+    'failures', 'elapsed', 'records_per_second'
+])
+
+
+def ciphertext_version(ciphertext):
+    """Return the key version from a vault:v<N>: ciphertext prefix, or None"""
+    match = _VERSION_RE.match(ciphertext)
+    return int(match.group(1)) if match else None
+
+
+class RewrapJob:
+    """Stream stored ciphertexts through transit rewrap in parallel batches
+
+    records is an iterable of (record_id, ciphertext) pairs in a stable order;
+    sink(pairs) receives the (record_id, new_ciphertext) pairs of each finished
+    batch and is always called from the thread running run(). Progress is
+    checkpointed as the number of leading records fully rewrapped, so a
+    restarted job skips them. The checkpoint never moves past a batch with
+    failed records, so a restarted job retries (and counts) them; batches
+    finished past that point are redone, which is harmless because rewrapping
+    is idempotent. Every record is rewrapped to the version that was latest
+    when run() started, even if the key rotates meanwhile. Pass a
+    KeyMetadataCache as key_metadata to read key versions through it and
+    invalidate it when old versions are retired.
+    """
+
+    def __init__(self, transit, records, sink, checkpoint_path=None,
+                 batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, progress=None,
+                 key_metadata=None):
+        self.transit = transit
+        self.records = records
+        self.sink = sink
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.workers = workers
+        self.progress = progress
+        self.key_metadata = key_metadata
+
+    def run(self):
+        """Rewrap every record to the key's latest version and return RewrapStats"""
+        target_version = self._latest_version()
+
+        checkpoint = self._load_checkpoint(target_version)
+        resumed_from = checkpoint
+        start = time.monotonic()
+        counts = {'records': 0, 'rewrapped': 0, 'skipped': 0, 'failed': 0}
+        failures = []
+
+        batches = self._batches(itertools.islice(iter(self.records), checkpoint, None), checkpoint)
+        done = {}
+        next_offset = checkpoint
+        # Offset of the first batch with failures; the checkpoint stops there
+        stalled_at = None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+            for offset, batch in itertools.islice(batches, self.workers * 2):
+                pending[pool.submit(self._rewrap, batch, target_version)] = (offset, len(batch))
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    offset, size = pending.pop(future)
+                    rewrapped, skipped, failed = future.result()
+
+                    if rewrapped:
+                        self.sink(rewrapped)
+                    counts['records'] += size
+                    counts['rewrapped'] += len(rewrapped)
+                    counts['skipped'] += skipped
+                    counts['failed'] += len(failed)
+                    failures.extend(failed[:MAX_REPORTED_FAILURES - len(failures)])
+
+                    # Advance the checkpoint only over a contiguous run of
+                    # finished batches, and never past one with failures
+                    if failed and (stalled_at is None or offset < stalled_at):
+                        stalled_at = offset
+                    done[offset] = size
+                    while next_offset in done and next_offset != stalled_at:
+                        next_offset += done.pop(next_offset)
+                    self._save_checkpoint(target_version, next_offset)
+
+                    for offset, batch in itertools.islice(batches, 1):
+                        pending[pool.submit(self._rewrap, batch, target_version)] = (offset, len(batch))
+
+                if self.progress:
+                    self.progress(self._stats(target_version, resumed_from, counts, failures, start))
+
+        return self._stats(target_version, resumed_from, counts, failures, start)
+
+    def raise_min_decryption_version(self, stats):
+        """Retire old key versions once a run finished with no failures
+
+        Refuses if the run had failures or if the key's latest version, read
+        fresh from Vault, is no longer the version the run rewrapped to.
+        """
+        if stats.failed:
+            raise RuntimeError(f"{stats.failed} records were not rewrapped; refusing to raise min_decryption_version")
+        latest_version = self._latest_version()
+        if latest_version != stats.target_version:
+            raise RuntimeError(f"{self.transit.key_name} is now at v{latest_version}, not v{stats.target_version}; "
+                               "run the rewrap again before raising min_decryption_version")
+        if self.key_metadata is not None:
+            self.key_metadata.update_key_configuration(
+                self.transit.key_name, min_decryption_version=stats.target_version
+            )
+            return
+        self.transit.client.secrets.transit.update_key_configuration(
+            name=self.transit.key_name,
+            min_decryption_version=stats.target_version,
+            mount_point=self.transit.mount_point
+        )
+
+    def _latest_version(self):
+        """The key's latest version, bypassing any cached metadata"""
+        if self.key_metadata is not None:
+            return self.key_metadata.latest_version(self.transit.key_name, force_refresh=True)
+        key_info = self.transit.client.secrets.transit.read_key(
+            name=self.transit.key_name, mount_point=self.transit.mount_point
+        )
+        return key_info['data']['latest_version']
+
+    def _batches(self, records, offset):
+        """Yield (offset, [(record_id, ciphertext), ...]) chunks"""
+        while True:
+            batch = list(itertools.islice(records, self.batch_size))
+            if not batch:
+                return
+            yield offset, batch
+            offset += len(batch)
+
+    def _rewrap(self, batch, target_version):
+        """Rewrap one batch, skipping records already on target_version"""
+        stale = [(record_id, c) for record_id, c in batch
+                 if (ciphertext_version(c) or 0) < target_version]
+        skipped = len(batch) - len(stale)
+        if not stale:
+            return [], skipped, []
+
+        # Pin the version so a rotation mid-job cannot outrun the checkpoint and stats
+        results = self.transit.rewrap_batch([c for _, c in stale], key_version=target_version,
+                                            raise_on_error=False)
+        rewrapped = [(record_id, new) for (record_id, _), new in zip(stale, results) if new is not None]
+        failed = [record_id for (record_id, _), new in zip(stale, results) if new is None]
+        return rewrapped, skipped, failed
+
+    def _stats(self, target_version, resumed_from, counts, failures, start):
+        elapsed = time.monotonic() - start
+        rate = counts['records'] / elapsed if elapsed > 0 else 0.0
+        return RewrapStats(target_version, resumed_from, counts['records'], counts['rewrapped'],
+                           counts['skipped'], counts['failed'], list(failures), elapsed, rate)
+
+    def _load_checkpoint(self, target_version):
+        """Return the offset to resume from, ignoring checkpoints for another key version"""
+        if not self.checkpoint_path:
+            return 0
+        state = load_json(self.checkpoint_path)
+        if state.get('key') != self._key_id() or state.get('target_version') != target_version:
+            return 0
+        return state.get('offset', 0)
+
+    def _save_checkpoint(self, target_version, offset):
+        if self.checkpoint_path:
+            save_json(self.checkpoint_path, {
+                'key': self._key_id(), 'target_version': target_version, 'offset': offset
+            })
+
+    def _key_id(self):
+        return f"{self.transit.mount_point}/{self.transit.key_name}"
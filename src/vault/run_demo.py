@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import os
-import base64
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Set environment
 os.environ['VAULT_ADDR'] = 'http://127.0.0.1:8200'
@@ -10,11 +12,13 @@ print("🔐 KMS LEARNING LAB - LET'S GO!")
 print("=" * 40)
 
 try:
-    import hvac
+    from vault.bootstrap import ensure_transit
+    from vault.vault_client import get_client
+    from vault.transit_client import TransitClient
     print("✅ Libraries loaded successfully")
     
     # Connect to Vault
-    client = hvac.Client(url='http://127.0.0.1:8200', token='root')
+    client = get_client()
     
     if client.is_authenticated():
         print("✅ Connected to Vault!")
@@ -22,47 +26,23 @@ try:
         print("❌ Cannot connect to Vault")
         exit(1)
     
-    # Enable transit
-    try:
-        client.sys.enable_secrets_engine(backend_type='transit', path='transit')
-        print("✅ Transit engine enabled")
-    except Exception as e:
-        if "already in use" in str(e):
-            print("ℹ️ Transit engine already enabled")
-        else:
-            print(f"❌ Failed to enable transit: {e}")
-            exit(1)
-    
-    # Create key
-    try:
-        client.secrets.transit.create_key('my-key')
-        print("✅ Encryption key created: 'my-key'")
-    except Exception as e:
-        if "already exists" in str(e):
-            print("ℹ️ Key already exists")
-        else:
-            print(f"❌ Failed to create key: {e}")
-            exit(1)
+    # Enable transit and create the key, skipping whatever already exists
+    result = ensure_transit(client, ['my-key'])
+    print("✅ Transit engine enabled" if result.mount_created else "ℹ️ Transit engine already enabled")
+    print("✅ Encryption key created: 'my-key'" if result.keys_created else "ℹ️ Key already exists")
     
     # ENCRYPT
     print("\n🎯 ENCRYPTING DATA...")
     secret = "Hello Multi-Cloud KMS World!"
     print(f"Original: {secret}")
     
-    encrypted = client.secrets.transit.encrypt_data(
-        name='my-key',
-        plaintext=base64.b64encode(secret.encode()).decode()
-    )
-    ciphertext = encrypted['data']['ciphertext']
+    transit = TransitClient(client, 'my-key')
+    ciphertext = transit.encrypt(secret)
     print(f"Encrypted: {ciphertext}")
     
     # DECRYPT
     print("\n🎯 DECRYPTING DATA...")
-    decrypted = client.secrets.transit.decrypt_data(
-        name='my-key',
-        ciphertext=ciphertext
-    )
-    decrypted_text = base64.b64decode(decrypted['data']['plaintext']).decode()
+    decrypted_text = transit.decrypt(ciphertext).decode()
     print(f"Decrypted: {decrypted_text}")
     
     # VERIFY
@@ -79,11 +59,7 @@ try:
     print("✅ Key rotated to new version")
     
     # Test backward compatibility
-    still_works = client.secrets.transit.decrypt_data(
-        name='my-key',
-        ciphertext=ciphertext
-    )
-    still_works_text = base64.b64decode(still_works['data']['plaintext']).decode()
+    still_works_text = transit.decrypt(ciphertext).decode()
     
     if still_works_text == secret:
         print("✅ Backward compatibility: OLD data works with NEW key")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import os
-import base64
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Set environment
 os.environ['VAULT_ADDR'] = 'http://127.0.0.1:8200'
@@ -10,11 +12,13 @@ print("🔐 SIMPLE KMS DEMO - GUARANTEED TO WORK")
 print("=" * 40)
 
 try:
-    import hvac
+    from vault.bootstrap import ensure_transit
+    from vault.vault_client import get_client
+    from vault.transit_client import TransitClient
     print("✅ HVAC imported successfully")
     
     # Connect to Vault
-    client = hvac.Client(url='http://127.0.0.1:8200', token='root')
+    client = get_client()
     
     if client.is_authenticated():
         print("✅ Connected to Vault!")
@@ -22,50 +26,23 @@ try:
         print("❌ Cannot connect to Vault")
         exit(1)
     
-    # Enable transit (simplest approach)
-    try:
-        client.sys.enable_secrets_engine(backend_type='transit', path='transit')
-        print("✅ Transit engine enabled")
-    except:
-        print("ℹ️ Transit engine already enabled")
-    
-    # Create key - MINIMAL approach
-    try:
-        # Just use minimal parameters
-        client.secrets.transit.create_key(name='simple-key')
-        print("✅ Key created: 'simple-key'")
-    except Exception as e:
-        if "already exists" in str(e):
-            print("ℹ️ Key already exists")
-        else:
-            print(f"❌ Key creation failed: {e}")
-            # Try without any parameters
-            try:
-                client.secrets.transit.create_key('simple-key')
-                print("✅ Key created with legacy API")
-            except:
-                print("❌ Completely failed to create key")
-                exit(1)
+    # Enable transit and create the key, skipping whatever already exists
+    result = ensure_transit(client, ['simple-key'])
+    print("✅ Transit engine enabled" if result.mount_created else "ℹ️ Transit engine already enabled")
+    print("✅ Key created: 'simple-key'" if result.keys_created else "ℹ️ Key already exists")
     
     # ENCRYPT
     print("\n🔐 ENCRYPTION TEST")
     secret = "Hello KMS World!"
     print(f"Original: {secret}")
     
-    encrypted = client.secrets.transit.encrypt_data(
-        name='simple-key',
-        plaintext=base64.b64encode(secret.encode()).decode()
-    )
-    ciphertext = encrypted['data']['ciphertext']
+    transit = TransitClient(client, 'simple-key')
+    ciphertext = transit.encrypt(secret)
     print(f"Encrypted: {ciphertext}")
     
     # DECRYPT
     print("\n🔓 DECRYPTION TEST")
-    decrypted = client.secrets.transit.decrypt_data(
-        name='simple-key', 
-        ciphertext=ciphertext
-    )
-    decrypted_text = base64.b64decode(decrypted['data']['plaintext']).decode()
+    decrypted_text = transit.decrypt(ciphertext).decode()
     print(f"Decrypted: {decrypted_text}")
     
     # VERIFY
@@ -0,0 +1,197 @@
+import binascii
+
+import hvac
+
+from common.encryption_context import encode_context
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class TransitBatchError(Exception):
+    """Raised when one or more items of a transit batch request fail"""
+
+    def __init__(self, operation, errors, results):
+        self.operation = operation
+        self.errors = errors
+        self.results = results
+        super().__init__(
+            f"{len(errors)} of {len(results)} {operation} items failed: "
+            + "; ".join(f"[{i}] {msg}" for i, msg in sorted(errors.items())[:5])
+        )
+
+
+def _to_b64(value):
+    """Base64-encode a str or bytes-like value for the transit API"""
+    if isinstance(value, str):
+        value = value.encode()
+    return binascii.b2a_base64(value, newline=False).decode('ascii')
+
+
+def _from_b64(value):
+    """Decode a base64 field of a transit response straight to bytes"""
+    return binascii.a2b_base64(value)
+
+
+def _context_b64(context):
+    """Encode an encryption context as a transit derivation context, or None"""
+    encoded = encode_context(context)
+    return _to_b64(encoded) if encoded else None
+
+
+def _with_context(batch_input, context):
+    """Add a base64 derivation context to every batch item when one is given"""
+    context = _context_b64(context)
+    if context is not None:
+        for item in batch_input:
+            item['context'] = context
+    return batch_input
+
+
+def _check_derived(key_name, key_data):
+    """Raise unless the key derives per-context keys; otherwise Vault ignores the context"""
+    if not key_data.get('derived'):
+        raise ValueError(
+            f"transit key {key_name} was not created with derived=True, so Vault would ignore the "
+            f"encryption context; create it with ensure_transit(client, {{{key_name!r}: {{'derived': True}}}})"
+        )
+
+
+def _chunks(items, size):
+    """Yield (offset, chunk) pairs of at most size items"""
+    for offset in range(0, len(items), size):
+        yield offset, items[offset:offset + size]
+
+
+class TransitClient:
+    """Vault transit client that sends whole lists through batch_input
+
+    Every operation takes an optional encryption context mapping. It is sent
+    as the canonical JSON encoding, so equal mappings derive the same key.
+    Vault silently ignores a context for keys created without derived=True,
+    so the first call with a context reads the key and raises ValueError if
+    it is not derived.
+    """
+
+    def __init__(self, client, key_name, mount_point='transit', batch_size=DEFAULT_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.client = client
+        self.key_name = key_name
+        self.mount_point = mount_point
+        self.batch_size = batch_size
+        self.cache_id = f"vault-transit:{mount_point}/{key_name}"
+        self._derived = False
+
+    def encrypt(self, plaintext, context=None):
+        """Encrypt a single value and return the vault:v<N>: ciphertext"""
+        response = self.client.secrets.transit.encrypt_data(
+            name=self.key_name,
+            plaintext=_to_b64(plaintext),
+            context=_context_b64(self._checked(context)),
+            mount_point=self.mount_point
+        )
+        return response['data']['ciphertext']
+
+    def decrypt(self, ciphertext, context=None):
+        """Decrypt a single ciphertext and return the plaintext bytes"""
+        response = self.client.secrets.transit.decrypt_data(
+            name=self.key_name,
+            ciphertext=ciphertext,
+            context=_context_b64(self._checked(context)),
+            mount_point=self.mount_point
+        )
+        return _from_b64(response['data']['plaintext'])
+
+    def generate_data_key(self, bits=256, context=None):
+        """Return (plaintext_key, wrapped_key) from the transit datakey endpoint"""
+        response = self.client.secrets.transit.generate_data_key(
+            name=self.key_name,
+            key_type='plaintext',
+            context=_context_b64(self._checked(context)),
+            bits=bits,
+            mount_point=self.mount_point
+        )
+        data = response['data']
+        return _from_b64(data['plaintext']), data['ciphertext'].encode()
+
+    def decrypt_data_key(self, wrapped_key, context=None):
+        """Unwrap a data key produced by generate_data_key"""
+        if isinstance(wrapped_key, (bytes, bytearray, memoryview)):
+            wrapped_key = bytes(wrapped_key).decode()
+        return self.decrypt(wrapped_key, context=context)
+
+    def encrypt_batch(self, plaintexts, raise_on_error=True, context=None):
+        """Encrypt a list of values with one request per batch_size items
+
+        Returns the ciphertexts in input order. Failed items are None and,
+        unless raise_on_error is False, raise a TransitBatchError that maps
+        each input index to its error message.
+        """
+        batch_input = _with_context([{'plaintext': _to_b64(p)} for p in plaintexts], self._checked(context))
+        return self._run_batch('encrypt', self.client.secrets.transit.encrypt_data,
+                               batch_input, 'ciphertext', str, raise_on_error)
+
+    def decrypt_batch(self, ciphertexts, raise_on_error=True, context=None):
+        """Decrypt a list of ciphertexts with one request per batch_size items
+
+        Returns the plaintext bytes in input order; errors are handled as in
+        encrypt_batch.
+        """
+        batch_input = _with_context([{'ciphertext': c} for c in ciphertexts], self._checked(context))
+        return self._run_batch('decrypt', self.client.secrets.transit.decrypt_data,
+                               batch_input, 'plaintext', _from_b64, raise_on_error)
+
+    def rewrap_batch(self, ciphertexts, key_version=None, raise_on_error=True, context=None):
+        """Re-encrypt a list of ciphertexts under the latest (or given) key version
+
+        The plaintext never leaves Vault; errors are handled as in encrypt_batch.
+        """
+        batch_input = _with_context([{'ciphertext': c} for c in ciphertexts], self._checked(context))
+        if key_version is not None:
+            for item in batch_input:
+                item['key_version'] = key_version
+        return self._run_batch('rewrap', self._rewrap_call, batch_input, 'ciphertext', str, raise_on_error)
+
+    def _checked(self, context):
+        """Return context after making sure the key will actually enforce it"""
+        if encode_context(context) and not self._derived:
+            key_data = self.client.secrets.transit.read_key(name=self.key_name, mount_point=self.mount_point)
+            _check_derived(self.key_name, key_data['data'])
+            self._derived = True
+        return context
+
+    def _rewrap_call(self, name, batch_input, mount_point):
+        # hvac requires a positional ciphertext even when batch_input is used
+        return self.client.secrets.transit.rewrap_data(
+            name=name, ciphertext=None, batch_input=batch_input, mount_point=mount_point
+        )
+
+    def _run_batch(self, operation, call, batch_input, field, convert, raise_on_error):
+        """Send batch_input in chunks and collect per-item results"""
+        results = [None] * len(batch_input)
+        errors = {}
+
+        for offset, chunk in _chunks(batch_input, self.batch_size):
+            for i, item in enumerate(self._send(call, chunk)):
+                if item.get('error') or field not in item:
+                    errors[offset + i] = item.get('error') or f"missing {field} in response"
+                else:
+                    results[offset + i] = convert(item[field])
+
+        if errors and raise_on_error:
+            raise TransitBatchError(operation, errors, results)
+        return results
+
+    def _send(self, call, chunk):
+        """Issue one batch request and return its batch_results list"""
+        try:
+            response = call(name=self.key_name, batch_input=chunk, mount_point=self.mount_point)
+        except hvac.exceptions.InvalidRequest as e:
+            # Vault answers 400 when any item fails but still reports every
+            # item, so recover the per-item results from the error body
+            body = e.json or {}
+            batch_results = (body.get('data') or {}).get('batch_results')
+            if batch_results is None:
+                raise
+            return batch_results
+        return response['data']['batch_results']
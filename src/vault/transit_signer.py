@@ -0,0 +1,98 @@
+from common.signatures import PublicKeyCache, load_public_key, verify_signature
+from vault.transit_client import _from_b64, _to_b64
+
+# transit hash_algorithm -> common.signatures hash name
+_HASH_NAMES = {'sha2-256': 'sha256', 'sha2-384': 'sha384', 'sha2-512': 'sha512'}
+
+
+def _scheme(key_type, hash_algorithm):
+    """common.signatures scheme for a transit key type, e.g. ecdsa-p256 -> ecdsa-sha256"""
+    if key_type == 'ed25519':
+        return 'ed25519'
+    hash_name = _HASH_NAMES[hash_algorithm]
+    if key_type.startswith('ecdsa-'):
+        return f"ecdsa-{hash_name}"
+    if key_type.startswith('rsa-'):
+        return f"rsa-pss-{hash_name}"
+    raise ValueError(f"transit key type {key_type} cannot sign")
+
+
+def parse_signature(signature):
+    """Split vault:v<N>:<base64> into (N, signature bytes)"""
+    prefix, version, encoded = signature.split(':', 2)
+    if prefix != 'vault' or not version.startswith('v'):
+        raise ValueError("not a transit signature")
+    return int(version[1:]), _from_b64(encoded)
+
+
+class TransitSigner:
+    """Sign with a transit asymmetric key and verify locally
+
+    sign() goes to Vault, which keeps the private key. verify() never does:
+    the first verification reads the key once (read_key returns the public
+    key of every version), and later ones check the signature in-process
+    against the cached key of the version named in the signature.
+    """
+
+    def __init__(self, client, key_name, mount_point='transit', hash_algorithm='sha2-256', public_keys=None):
+        if hash_algorithm not in _HASH_NAMES:
+            raise ValueError(f"unsupported hash_algorithm {hash_algorithm}")
+        self.client = client
+        self.key_name = key_name
+        self.mount_point = mount_point
+        self.hash_algorithm = hash_algorithm
+        self.public_keys = public_keys if public_keys is not None else PublicKeyCache()
+        self.cache_id = f"vault-transit:{mount_point}/{key_name}"
+        self._scheme = None
+
+    def sign(self, data, key_version=None):
+        """Sign data with the latest (or given) key version and return the vault:v<N>: signature"""
+        kwargs = {'signature_algorithm': 'pss'} if self.scheme.startswith('rsa-') else {}
+        response = self.client.secrets.transit.sign_data(
+            name=self.key_name,
+            hash_input=_to_b64(data),
+            key_version=key_version,
+            hash_algorithm=self.hash_algorithm,
+            mount_point=self.mount_point,
+            **kwargs
+        )
+        return response['data']['signature']
+
+    def verify(self, data, signature):
+        """Check a vault:v<N>: signature over data without calling Vault"""
+        try:
+            version, raw = parse_signature(signature)
+            public_key = self.public_key(version)
+        except (ValueError, KeyError):
+            return False
+        return verify_signature(public_key, self.scheme, data, raw)
+
+    def public_key(self, version):
+        """The cryptography public key of one key version, read from Vault at most once"""
+        def fetch():
+            public_key = self._load_public_keys().get(version)
+            if public_key is None:
+                raise KeyError(f"{self.key_name} has no version {version}")
+            return public_key
+        return self.public_keys.get(self.cache_id, version, fetch)
+
+    @property
+    def scheme(self):
+        if self._scheme is None:
+            self._load_public_keys()
+        return self._scheme
+
+    def _load_public_keys(self):
+        """Read the key once, cache the public key of every version it reports and return them"""
+        data = self.client.secrets.transit.read_key(name=self.key_name, mount_point=self.mount_point)['data']
+        self._scheme = _scheme(data['type'], self.hash_algorithm)
+        public_keys = {}
+        for version, info in data['keys'].items():
+            public_key = info.get('public_key') if isinstance(info, dict) else None
+            if not public_key:
+                continue
+            if data['type'] == 'ed25519':
+                public_key = _from_b64(public_key)
+            public_keys[int(version)] = load_public_key(public_key)
+            self.public_keys.put(self.cache_id, int(version), public_keys[int(version)])
+        return public_keys
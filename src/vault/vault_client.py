@@ -0,0 +1,77 @@
+import os
+import threading
+
+import hvac
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_VAULT_ADDR = 'http://127.0.0.1:8200'
+DEFAULT_VAULT_TOKEN = 'root'
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+
+_clients = {}
+_clients_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def build_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """Build a keep-alive requests session with a sized connection pool
+
+    pool_maxsize is the number of connections kept open per host and should
+    be at least the number of threads sharing the client; pool_block makes
+    extra threads wait for a free connection instead of opening throwaway ones.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_client(url=None, token=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+               read_timeout=DEFAULT_READ_TIMEOUT, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """Return the process-wide hvac client for these settings, creating it once
+
+    url and token default to VAULT_ADDR / VAULT_TOKEN and then to the dev
+    server settings. The timeouts and pool size are part of the cache key,
+    so callers asking for different ones get their own client. Clients are
+    rebuilt after a fork so a child never shares pooled sockets with its
+    parent.
+    """
+    global _clients_pid
+
+    url = url or os.environ.get('VAULT_ADDR', DEFAULT_VAULT_ADDR)
+    token = token or os.environ.get('VAULT_TOKEN', DEFAULT_VAULT_TOKEN)
+    cache_key = (url, token, connect_timeout, read_timeout, pool_maxsize)
+
+    with _lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        client = _clients.get(cache_key)
+        if client is None:
+            client = hvac.Client(
+                url=url,
+                token=token,
+                timeout=(connect_timeout, read_timeout),
+                session=build_session(pool_maxsize=pool_maxsize)
+            )
+            _clients[cache_key] = client
+        return client
+
+
+def reset_clients():
+    """Close pooled connections and forget every cached client"""
+    with _lock:
+        for client in _clients.values():
+            client.adapter.close()
+        _clients.clear()
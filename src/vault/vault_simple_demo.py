@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 import os
-import base64
-import hvac
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vault.bootstrap import ensure_transit
+from vault.vault_client import get_client
+from vault.transit_client import TransitClient
 
 # Set environment
 os.environ['VAULT_ADDR'] = 'http://127.0.0.1:8200'
@@ -13,7 +17,7 @@ print("=" * 40)
 def main():
     try:
         # Connect to Vault
-        client = hvac.Client(url='http://127.0.0.1:8200', token='root')
+        client = get_client()
         
         if client.is_authenticated():
             print("✅ Connected to Vault!")
@@ -21,39 +25,23 @@ def main():
             print("❌ Cannot connect to Vault")
             return
         
-        # Enable transit engine
-        try:
-            client.sys.enable_secrets_engine(backend_type='transit', path='transit')
-            print("✅ Transit engine enabled")
-        except Exception:
-            print("ℹ️ Transit engine already enabled")
-        
-        # Create key
-        try:
-            client.secrets.transit.create_key('simple-key')
-            print("✅ Encryption key created: 'simple-key'")
-        except Exception:
-            print("ℹ️ Key already exists")
+        # Enable transit engine and create the key, skipping whatever already exists
+        result = ensure_transit(client, ['simple-key'])
+        print("✅ Transit engine enabled" if result.mount_created else "ℹ️ Transit engine already enabled")
+        print("✅ Encryption key created: 'simple-key'" if result.keys_created else "ℹ️ Key already exists")
         
         # Encrypt data
         print("\n🔐 ENCRYPTING DATA...")
         secret = "Hello Multi-Cloud KMS World!"
         print(f"Original: {secret}")
         
-        encrypted = client.secrets.transit.encrypt_data(
-            name='simple-key',
-            plaintext=base64.b64encode(secret.encode()).decode()
-        )
-        ciphertext = encrypted['data']['ciphertext']
+        transit = TransitClient(client, 'simple-key')
+        ciphertext = transit.encrypt(secret)
         print(f"Encrypted: {ciphertext}")
         
         # Decrypt data
         print("\n🔓 DECRYPTING DATA...")
-        decrypted = client.secrets.transit.decrypt_data(
-            name='simple-key',
-            ciphertext=ciphertext
-        )
-        decrypted_text = base64.b64decode(decrypted['data']['plaintext']).decode()
+        decrypted_text = transit.decrypt(ciphertext).decode()
         print(f"Decrypted: {decrypted_text}")
         
         # Verify
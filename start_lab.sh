@@ -15,8 +15,24 @@ else
     # Start Vault in background
     vault server -dev -dev-root-token-id=root -dev-listen-address=127.0.0.1:8200 > vault.log 2>&1 &
     
-    # Wait for startup
-    sleep 3
+    # Poll the health endpoint (200 = unsealed and active) instead of a fixed sleep
+    start=$(date +%s.%N)
+    delay=0.05
+    ready=false
+    for _ in $(seq 1 60); do
+        code=$(curl -s -o /dev/null -m 1 -w '%{http_code}' "$VAULT_ADDR/v1/sys/health")
+        if [ "$code" = "200" ]; then
+            ready=true
+            break
+        fi
+        sleep $delay
+        delay=$(awk -v d="$delay" 'BEGIN { d *= 2; print (d > 1 ? 1 : d) }')
+    done
+    if [ "$ready" != true ]; then
+        echo "❌ Vault did not become ready after 60 health checks (last HTTP status: ${code:-none}). Check vault.log for details."
+        exit 1
+    fi
+    echo "⏱️  Vault ready in $(awk -v s="$start" -v e="$(date +%s.%N)" 'BEGIN { printf "%.2f", e - s }')s"
     
     # Check if started successfully
     if vault status > /dev/null 2>&1; then
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from aws.aws_kms_provider import AWSKMSProvider  # noqa: E402
+from aws.fake_kms import FakeKMSClient  # noqa: E402
+
+
+@pytest.fixture
+def fake_kms():
+    """An offline KMS client; latency makes concurrent calls overlap"""
+    return FakeKMSClient(latency=0.02)
+
+
+@pytest.fixture
+def provider(fake_kms):
+    """An AWSKMSProvider for a fresh symmetric key in fake_kms"""
+    return AWSKMSProvider(fake_kms, fake_kms.create_key()['KeyMetadata']['Arn'])
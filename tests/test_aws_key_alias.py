@@ -0,0 +1,107 @@
+import pytest
+
+from aws import aws_key_alias
+from aws.aws_key_alias import invalidate, resolve_or_create_key
+from aws.aws_kms_multi_region import MultiRegionKMSClient
+from aws.fake_kms import FakeKMSClient
+from tests.helpers import run_concurrently
+
+
+@pytest.fixture(autouse=True)
+def empty_alias_cache(monkeypatch):
+    monkeypatch.setattr(aws_key_alias, '_arns', {})
+
+
+def _key_states(fake_kms):
+    return sorted(key['metadata']['KeyState'] for key in fake_kms._keys.values())
+
+
+def test_creates_once_then_reuses(fake_kms):
+    arn = resolve_or_create_key(fake_kms, 'lab', cache_path=None)
+    assert resolve_or_create_key(fake_kms, 'alias/lab', cache_path=None) == arn
+    assert fake_kms.call_counts['CreateKey'] == 1
+    assert fake_kms.call_counts['DescribeKey'] == 1
+    assert fake_kms.describe_key(KeyId='alias/lab')['KeyMetadata']['Arn'] == arn
+
+
+def test_existing_alias_is_reused(fake_kms):
+    arn = fake_kms.create_key()['KeyMetadata']['Arn']
+    fake_kms.create_alias(AliasName='alias/lab', TargetKeyId=arn)
+    assert resolve_or_create_key(fake_kms, 'lab', cache_path=None) == arn
+    assert fake_kms.call_counts['CreateKey'] == 1
+
+
+def test_file_cache_survives_a_new_process(fake_kms, tmp_path, monkeypatch):
+    cache_path = tmp_path / 'aliases.json'
+    arn = resolve_or_create_key(fake_kms, 'lab', cache_path=cache_path)
+    monkeypatch.setattr(aws_key_alias, '_arns', {})
+    calls = dict(fake_kms.call_counts)
+    assert resolve_or_create_key(fake_kms, 'lab', cache_path=cache_path) == arn
+    assert fake_kms.call_counts == calls
+
+
+def test_cache_is_partitioned_by_account_and_region(fake_kms):
+    other_account = FakeKMSClient()
+    other_account.account_id = '444455556666'
+    other_region = fake_kms.peer('eu-west-1')
+    arns = {resolve_or_create_key(client, 'lab', cache_path=None)
+            for client in (fake_kms, other_account, other_region)}
+    assert len(arns) == 3
+
+
+def test_losing_a_create_race_defers_to_the_winner(fake_kms):
+    winner = fake_kms.create_key()['KeyMetadata']['Arn']
+    create_key = fake_kms.create_key
+
+    def racing_create_key(**kwargs):
+        response = create_key(**kwargs)
+        # Another process creates the alias between our DescribeKey and CreateAlias
+        fake_kms.create_alias(AliasName='alias/lab', TargetKeyId=winner)
+        return response
+
+    fake_kms.create_key = racing_create_key
+    assert resolve_or_create_key(fake_kms, 'lab', cache_path=None) == winner
+    assert _key_states(fake_kms) == ['Enabled', 'PendingDeletion']
+
+
+def test_concurrent_creators_agree_on_one_key(fake_kms):
+    results, errors = run_concurrently(lambda: resolve_or_create_key(fake_kms, 'lab', cache_path=None), 4)
+    assert errors == [None] * 4
+    assert len(set(results)) == 1
+    assert _key_states(fake_kms).count('Enabled') == 1
+
+
+def test_alias_of_a_deleted_key_is_taken_over(fake_kms):
+    old = resolve_or_create_key(fake_kms, 'lab', cache_path=None)
+    fake_kms.schedule_key_deletion(KeyId=old, PendingWindowInDays=7)
+    invalidate('lab', fake_kms, cache_path=None)
+    new = resolve_or_create_key(fake_kms, 'lab', cache_path=None)
+    assert new != old
+    assert fake_kms.describe_key(KeyId='alias/lab')['KeyMetadata']['Arn'] == new
+
+
+def test_invalidate_only_drops_that_alias(fake_kms):
+    resolve_or_create_key(fake_kms, 'one', cache_path=None)
+    resolve_or_create_key(fake_kms, 'two', cache_path=None)
+    invalidate('one', fake_kms, cache_path=None)
+    assert [key.rsplit('|', 1)[1] for key in aws_key_alias._arns] == ['alias/two']
+
+
+def test_replica_regions_create_a_replicated_multi_region_key(fake_kms):
+    arn = resolve_or_create_key(fake_kms, 'lab', cache_path=None, replica_regions=['eu-west-1'])
+    assert arn.rsplit('/', 1)[1].startswith('mrk-')
+    replica = fake_kms.peer('eu-west-1').describe_key(KeyId=arn.rsplit('/', 1)[1])['KeyMetadata']
+    assert replica['MultiRegionConfiguration']['MultiRegionKeyType'] == 'REPLICA'
+
+
+def test_replica_regions_reject_a_single_region_key(fake_kms):
+    resolve_or_create_key(fake_kms, 'lab', cache_path=None)
+    with pytest.raises(ValueError, match='single-region'):
+        resolve_or_create_key(fake_kms, 'lab', cache_path=None, replica_regions=['eu-west-1'])
+
+
+def test_multi_region_client_is_unwrapped_for_control_plane_calls(fake_kms):
+    client = MultiRegionKMSClient('mrk-unused', ['us-east-1', 'eu-west-1'],
+                                  clients={'us-east-1': fake_kms, 'eu-west-1': fake_kms.peer('eu-west-1')})
+    arn = resolve_or_create_key(client, 'lab', cache_path=None, replica_regions=['eu-west-1'])
+    assert fake_kms.describe_key(KeyId='alias/lab')['KeyMetadata']['Arn'] == arn
@@ -0,0 +1,83 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from aws.aws_kms_executor import KMSBatchError, KMSParallelExecutor, quota_class
+from aws.fake_kms import FakeKMSClient, _error
+from common.rate_limit import AdaptiveRateLimiter
+
+
+@pytest.fixture
+def executor(fake_kms):
+    with KMSParallelExecutor(fake_kms, max_workers=16) as executor:
+        yield executor
+
+
+def test_limiter_halves_once_per_interval():
+    limiter = AdaptiveRateLimiter(100.0, decrease_interval=60.0)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 50.0
+    assert limiter.throttles == 2
+
+
+def test_limiter_stays_between_min_and_max_rate():
+    limiter = AdaptiveRateLimiter(100.0, min_rate=20.0, increase=50.0, decrease_interval=0.0)
+    for _ in range(3):
+        limiter.on_throttle()
+    assert limiter.rate == 20.0
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 100.0
+
+
+def test_quota_classes():
+    assert quota_class('SYMMETRIC_DEFAULT') == 'symmetric'
+    assert quota_class('RSA_2048') == 'rsa'
+    assert quota_class('ECC_NIST_P256') == 'ecc'
+
+
+def test_throttled_bulk_encrypt_settles_without_failures():
+    fake_kms = FakeKMSClient(throttle_rate=200)
+    key_id = fake_kms.create_key()['KeyMetadata']['Arn']
+    with KMSParallelExecutor(fake_kms) as executor:
+        blobs = executor.encrypt_many(key_id, [b'x'] * 600)
+        assert None not in blobs
+        stats = executor.stats()
+    assert stats['retries'] > 0
+    assert stats['throttles']['symmetric'] > 0
+    assert stats['rates']['symmetric'] < 5500
+
+
+def test_throttles_on_unlimited_operations_are_retried(fake_kms, executor):
+    key_id = fake_kms.create_key()['KeyMetadata']['Arn']
+    describe_key = fake_kms.describe_key
+    throttles = iter([True, True])
+
+    def flaky_describe_key(**kwargs):
+        if next(throttles, False):
+            raise _error('DescribeKey', 'ThrottlingException', 'Rate exceeded')
+        return describe_key(**kwargs)
+
+    fake_kms.describe_key = flaky_describe_key
+    assert executor.call('describe_key', KeyId=key_id)['KeyMetadata']['Arn'] == key_id
+    assert executor.stats()['retries'] == 2
+    assert sum(executor.stats()['throttles'].values()) == 0
+
+
+def test_asymmetric_calls_use_their_key_spec_quota(fake_kms, executor):
+    key_id = fake_kms.create_key(KeyUsage='SIGN_VERIFY', KeySpec='ECC_NIST_P256')['KeyMetadata']['Arn']
+    assert executor._limiter('sign', {'KeyId': key_id}) is executor.limiters['ecc']
+    assert executor._limiter('decrypt', {}) is executor.limiters['symmetric']
+    assert executor._limiter('get_public_key', {'KeyId': key_id}) is None
+    executor.call('sign', KeyId=key_id, Message=b'm', SigningAlgorithm='ECDSA_SHA_256')
+    assert fake_kms.call_counts['DescribeKey'] == 1
+
+
+def test_permanent_errors_are_not_retried(fake_kms, executor):
+    key_id = fake_kms.create_key()['KeyMetadata']['Arn']
+    with pytest.raises(KMSBatchError) as raised:
+        executor.decrypt_many([fake_kms.encrypt(KeyId=key_id, Plaintext=b'ok')['CiphertextBlob'], b'bad'])
+    assert raised.value.results[0]['Plaintext'] == b'ok'
+    assert isinstance(raised.value.errors[1], ClientError)
+    assert executor.stats()['retries'] == 0
@@ -0,0 +1,132 @@
+import time
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from aws.aws_kms_multi_region import MultiRegionKMSClient
+from aws.fake_kms import _error
+
+PRIMARY, REPLICA = 'us-east-1', 'eu-west-1'
+
+
+@pytest.fixture
+def key_arn(fake_kms):
+    arn = fake_kms.create_key(MultiRegion=True)['KeyMetadata']['Arn']
+    fake_kms.replicate_key(KeyId=arn, ReplicaRegion=REPLICA)
+    # The primary answers fastest, so it is tried first unless a test says otherwise
+    fake_kms.latency = 0.0
+    fake_kms.peer(REPLICA).latency = 0.02
+    return arn
+
+
+def _client(fake_kms, key_arn, **kwargs):
+    clients = {region: fake_kms.peer(region) for region in (PRIMARY, REPLICA)}
+    return MultiRegionKMSClient(key_arn, [PRIMARY, REPLICA], clients=clients, **kwargs)
+
+
+def _fail(client, operation, error):
+    def fail(**kwargs):
+        client.call_counts[operation] = client.call_counts.get(operation, 0) + 1
+        raise error
+    setattr(client, operation.lower(), fail)
+
+
+def _region(arn):
+    return arn.split(':')[3]
+
+
+def test_calls_go_to_the_fastest_region(fake_kms, key_arn):
+    fake_kms.latency = 0.05
+    fake_kms.peer(REPLICA).latency = 0.0
+    client = _client(fake_kms, key_arn)
+    response = client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+    assert _region(response['KeyId']) == REPLICA
+    assert client.ranked_regions() == [REPLICA, PRIMARY]
+
+
+def test_ciphertexts_decrypt_in_any_region(fake_kms, key_arn):
+    blob = fake_kms.encrypt(KeyId=key_arn, Plaintext=b'secret')['CiphertextBlob']
+    response = fake_kms.peer(REPLICA).decrypt(CiphertextBlob=blob, KeyId=key_arn.replace(PRIMARY, REPLICA))
+    assert response['Plaintext'] == b'secret'
+
+
+@pytest.mark.parametrize('error', [
+    _error('Encrypt', 'ThrottlingException', 'Rate exceeded'),
+    _error('Encrypt', 'KMSInternalException', ''),
+    EndpointConnectionError(endpoint_url='https://kms.us-east-1.amazonaws.com'),
+])
+def test_transient_errors_fail_over_and_cool_the_region_down(fake_kms, key_arn, error):
+    client = _client(fake_kms, key_arn)
+    _fail(fake_kms, 'Encrypt', error)
+    response = client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+    assert _region(response['KeyId']) == REPLICA
+    assert client.latencies()[PRIMARY][1] is False
+    assert client.ranked_regions() == [REPLICA, PRIMARY]
+
+
+def test_other_errors_are_raised_without_failing_over(fake_kms, key_arn):
+    client = _client(fake_kms, key_arn)
+    with pytest.raises(ClientError) as raised:
+        client.decrypt(CiphertextBlob=b'not a ciphertext', KeyId=key_arn)
+    assert raised.value.response['Error']['Code'] == 'InvalidCiphertextException'
+    decrypts = sum(fake_kms.peer(region).call_counts.get('Decrypt', 0) for region in (PRIMARY, REPLICA))
+    assert decrypts == 1
+    assert all(healthy for _, healthy in client.latencies().values())
+
+
+def test_when_every_region_fails_the_last_error_is_raised(fake_kms, key_arn):
+    client = _client(fake_kms, key_arn)
+    for region in (PRIMARY, REPLICA):
+        _fail(fake_kms.peer(region), 'Encrypt', _error('Encrypt', 'ThrottlingException', region))
+    with pytest.raises(ClientError, match=REPLICA):
+        client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+
+
+def test_cooldown_expires_and_grows_with_repeated_failures(fake_kms, key_arn):
+    client = _client(fake_kms, key_arn, cooldown=0.2)
+    client.probe()
+    encrypt = fake_kms.encrypt
+    _fail(fake_kms, 'Encrypt', _error('Encrypt', 'ThrottlingException', 'Rate exceeded'))
+    client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+    assert client.latencies()[PRIMARY][1] is False
+    time.sleep(0.3)
+    assert client.latencies()[PRIMARY][1] is True
+
+    # A second failure in a row doubles the cooldown
+    client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+    time.sleep(0.3)
+    assert client.latencies()[PRIMARY][1] is False
+    time.sleep(0.2)
+    assert client.latencies()[PRIMARY][1] is True
+
+    # A success clears the failure count
+    fake_kms.encrypt = encrypt
+    client.encrypt(KeyId=key_arn, Plaintext=b'secret')
+    assert client._states[PRIMARY].failures == 0
+
+
+def test_a_failed_probe_does_not_stop_later_probes(fake_kms, key_arn):
+    client = _client(fake_kms, key_arn)
+
+    def broken(**kwargs):
+        raise KeyError('misconfigured client')
+
+    fake_kms.describe_key = broken
+    with pytest.raises(KeyError):
+        client.probe()
+    assert client._probing is False
+    assert client._last_probe is not None
+
+
+def test_only_kms_operations_are_forwarded(fake_kms, key_arn):
+    client = _client(fake_kms, key_arn)
+    assert client.primary_client is fake_kms
+    with pytest.raises(AttributeError):
+        client.create_key
+    assert not hasattr(client, 'meta')
+
+
+def test_single_region_keys_cannot_be_spread_over_regions(fake_kms):
+    arn = fake_kms.create_key()['KeyMetadata']['Arn']
+    with pytest.raises(ValueError, match='single-region'):
+        _client(fake_kms, arn)
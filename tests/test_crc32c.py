@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from common import crc32c as crc32c_module
+from common.crc32c import ChecksumError, _table_extend, crc32c, verify
+
+# RFC 3720 (iSCSI) appendix B.4 test vectors plus the usual check value
+VECTORS = [
+    (b'', 0x00000000),
+    (b'123456789', 0xE3069283),
+    (bytes(32), 0x8A9136AA),
+    (b'\xff' * 32, 0x62A8AB43),
+    (bytes(range(32)), 0x46DD794E),
+    (bytes(range(31, -1, -1)), 0x113FDB5C),
+]
+
+
+def _google_extend():
+    google_crc32c = pytest.importorskip('google_crc32c')
+    return google_crc32c.extend
+
+
+@pytest.fixture(params=['table', 'google-crc32c'])
+def extend(request):
+    return _table_extend if request.param == 'table' else _google_extend()
+
+
+@pytest.mark.parametrize('data, expected', VECTORS)
+def test_known_answers(extend, data, expected):
+    assert extend(0, data) == expected
+
+
+def test_continuation_matches_one_shot(extend):
+    data = os.urandom(1000)
+    for split in (0, 1, 7, 8, 9, 500, 1000):
+        assert extend(extend(0, data[:split]), data[split:]) == extend(0, data)
+
+
+def test_backends_agree():
+    google_extend = _google_extend()
+    for size in (1, 7, 8, 9, 63, 64, 65, 4097):
+        data = os.urandom(size)
+        assert _table_extend(0, data) == google_extend(0, data)
+
+
+@pytest.mark.parametrize('backend', ['table', 'google-crc32c'])
+def test_accepts_any_bytes_like(backend, monkeypatch):
+    if backend == 'google-crc32c':
+        _google_extend()
+    monkeypatch.setattr(crc32c_module, '_extend',
+                        _table_extend if backend == 'table' else crc32c_module._google_extend)
+    data = b'123456789'
+    for buffer in (data, bytearray(data), memoryview(data), memoryview(bytearray(b'xx' + data))[2:]):
+        assert crc32c(buffer) == 0xE3069283
+
+
+def test_verify():
+    verify(b'123456789', 0xE3069283)
+    with pytest.raises(ChecksumError, match='ciphertext'):
+        verify(b'123456788', 0xE3069283, 'ciphertext')
+
+
+def test_stats_count_calls_and_bytes():
+    crc32c_module.reset_stats()
+    crc32c(b'123456789')
+    stats = crc32c_module.stats()
+    assert (stats['calls'], stats['bytes']) == (1, 9)
+    assert stats['implementation'] == crc32c_module.IMPLEMENTATION
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from common.datakey_cache import DataKeyCache
+from tests.helpers import run_concurrently
+
+
+class _ShortKeyProvider:
+    def generate_data_key(self, context=None):
+        return os.urandom(16), b'wrapped'
+
+    def decrypt_data_key(self, wrapped_key, context=None):
+        return os.urandom(16)
+
+
+class _FailingProvider:
+    cache_id = 'failing'
+
+    def __init__(self, fake_kms):
+        self.fake_kms = fake_kms
+        self.calls = 0
+
+    def generate_data_key(self, context=None):
+        self.calls += 1
+        self.fake_kms.describe_key(KeyId='alias/missing')
+
+
+def test_encryption_key_is_reused_until_a_limit(provider, fake_kms):
+    cache = DataKeyCache(max_messages=3)
+    wrapped = {cache.encryption_key(provider, plaintext_length=10)[0] for _ in range(3)}
+    assert len(wrapped) == 1
+    cache.encryption_key(provider, plaintext_length=10)
+    assert fake_kms.call_counts['GenerateDataKey'] == 2
+    assert cache.stats()['hits'] == 2
+
+
+def test_byte_budget_rolls_the_key(provider, fake_kms):
+    cache = DataKeyCache(max_bytes=100)
+    first, _ = cache.encryption_key(provider, plaintext_length=60)
+    second, _ = cache.encryption_key(provider, plaintext_length=60)
+    assert first != second
+    assert fake_kms.call_counts['GenerateDataKey'] == 2
+
+
+def test_oversized_plaintext_gets_an_uncached_key(provider, fake_kms):
+    cache = DataKeyCache(max_bytes=100)
+    cached, _ = cache.encryption_key(provider, plaintext_length=10)
+    one_off, _ = cache.encryption_key(provider, plaintext_length=101)
+    assert one_off != cached
+    assert cache.encryption_key(provider, plaintext_length=10)[0] == cached
+
+
+def test_max_age_expires_keys(provider, fake_kms):
+    cache = DataKeyCache(max_age=0)
+    cache.encryption_key(provider)
+    cache.encryption_key(provider)
+    assert fake_kms.call_counts['GenerateDataKey'] == 2
+
+
+def test_contexts_get_separate_keys(provider):
+    cache = DataKeyCache()
+    tenant_a, _ = cache.encryption_key(provider, context={'tenant': 'a'})
+    tenant_b, _ = cache.encryption_key(provider, context={'tenant': 'b'})
+    assert tenant_a != tenant_b
+    assert cache.encryption_key(provider, context={'tenant': 'a'})[0] == tenant_a
+
+
+def test_own_keys_decrypt_without_an_unwrap_call(provider, fake_kms):
+    cache = DataKeyCache()
+    wrapped, cipher = cache.encryption_key(provider)
+    nonce = os.urandom(12)
+    ciphertext = cipher.encrypt(nonce, b'secret', None)
+    assert cache.decryption_key(provider, wrapped).decrypt(nonce, ciphertext, None) == b'secret'
+    assert 'Decrypt' not in fake_kms.call_counts
+
+
+def test_max_entries_evicts_least_recently_used(provider, fake_kms):
+    cache = DataKeyCache(max_entries=2)
+    wrapped = [provider.generate_data_key()[1] for _ in range(3)]
+    for wrapped_key in wrapped:
+        cache.decryption_key(provider, wrapped_key)
+    assert cache.stats()['evictions'] == 1
+    cache.decryption_key(provider, wrapped[0])
+    assert fake_kms.call_counts['Decrypt'] == 4
+
+    cache.clear()
+    stats = cache.stats()
+    assert stats['entries'] == 0
+    assert stats['evictions'] == 2
+
+
+def test_concurrent_misses_share_one_generate_call(provider, fake_kms):
+    cache = DataKeyCache()
+    results, errors = run_concurrently(lambda: cache.encryption_key(provider)[0], 16)
+    assert errors == [None] * 16
+    assert len(set(results)) == 1
+    assert fake_kms.call_counts['GenerateDataKey'] == 1
+    assert cache.stats()['merged'] >= 1
+
+
+def test_concurrent_misses_share_one_unwrap_call(provider, fake_kms):
+    cache = DataKeyCache()
+    _, wrapped = provider.generate_data_key()
+    results, errors = run_concurrently(lambda: cache.decryption_key(provider, wrapped), 16)
+    assert errors == [None] * 16
+    assert len({id(cipher) for cipher in results}) == 1
+    assert fake_kms.call_counts['Decrypt'] == 1
+
+
+def test_a_failed_fetch_reaches_every_waiter_and_is_not_cached(fake_kms):
+    cache = DataKeyCache()
+    failing = _FailingProvider(fake_kms)
+    _, errors = run_concurrently(lambda: cache.encryption_key(failing), 8)
+    assert all(error is not None for error in errors)
+    with pytest.raises(Exception):
+        cache.encryption_key(failing)
+    assert failing.calls >= 2
+
+
+def test_wrong_key_length_is_rejected():
+    with pytest.raises(ValueError):
+        DataKeyCache().encryption_key(_ShortKeyProvider())
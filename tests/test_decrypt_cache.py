@@ -0,0 +1,82 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from common.decrypt_cache import DecryptCache
+from tests.helpers import run_concurrently
+
+
+def test_repeats_are_served_from_the_cache(provider, fake_kms):
+    cache = DecryptCache()
+    blob = provider.encrypt(b'secret')
+    assert [cache.decrypt(provider, blob) for _ in range(3)] == [b'secret'] * 3
+    assert fake_kms.call_counts['Decrypt'] == 1
+    assert cache.stats()['hits'] == 2
+
+
+def test_context_is_part_of_the_key(provider):
+    cache = DecryptCache()
+    blob = provider.encrypt(b'secret', context={'tenant': 'a'})
+    assert cache.decrypt(provider, blob, context={'tenant': 'a'}) == b'secret'
+    with pytest.raises(ClientError):
+        cache.decrypt(provider, blob, context={'tenant': 'b'})
+
+
+def test_ttl_expires_entries(provider, fake_kms):
+    cache = DecryptCache(ttl=0)
+    blob = provider.encrypt(b'secret')
+    cache.decrypt(provider, blob)
+    cache.decrypt(provider, blob)
+    assert fake_kms.call_counts['Decrypt'] == 2
+
+
+def test_entry_and_byte_limits_evict_least_recently_used(provider):
+    cache = DecryptCache(max_entries=2, max_bytes=10)
+    blobs = [provider.encrypt(bytes([i]) * 4) for i in range(3)]
+    for blob in blobs:
+        cache.decrypt(provider, blob)
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['evictions'] == 1
+
+    cache.decrypt(provider, provider.encrypt(b'x' * 8))
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (1, 8, 3)
+
+    cache.clear()
+    assert cache.stats()['evictions'] == 3
+
+
+def test_oversized_plaintexts_are_not_cached(provider, fake_kms):
+    cache = DecryptCache(max_bytes=4)
+    blob = provider.encrypt(b'too large')
+    cache.decrypt(provider, blob)
+    cache.decrypt(provider, blob)
+    assert fake_kms.call_counts['Decrypt'] == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidate(provider, fake_kms):
+    cache = DecryptCache()
+    blob = provider.encrypt(b'secret')
+    cache.decrypt(provider, blob)
+    cache.invalidate(provider, blob)
+    cache.decrypt(provider, blob)
+    assert fake_kms.call_counts['Decrypt'] == 2
+
+
+def test_concurrent_identical_decrypts_share_one_call(provider, fake_kms):
+    cache = DecryptCache()
+    blob = provider.encrypt(b'secret')
+    results, errors = run_concurrently(lambda: cache.decrypt(provider, blob), 16)
+    assert errors == [None] * 16
+    assert results == [b'secret'] * 16
+    assert fake_kms.call_counts['Decrypt'] == 1
+    assert cache.stats()['merged'] >= 1
+
+
+def test_errors_reach_waiters_and_are_not_cached(provider, fake_kms):
+    cache = DecryptCache()
+    blob = provider.encrypt(b'secret')
+    _, errors = run_concurrently(lambda: cache.decrypt(provider, blob, context={'wrong': 'context'}), 8)
+    assert all(isinstance(error, ClientError) for error in errors)
+    assert cache.decrypt(provider, blob) == b'secret'
+    assert cache.stats()['entries'] == 1
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from common.envelope import EnvelopeEncryptor, EnvelopeError, unpack_envelope
+
+
+def test_round_trip_with_one_kms_call_per_data_key(provider, fake_kms):
+    encryptor = EnvelopeEncryptor(provider)
+    records = [os.urandom(i) for i in range(0, 200, 20)]
+    envelopes = [encryptor.encrypt(record, associated_data=b'table-1') for record in records]
+    assert [encryptor.decrypt(e, associated_data=b'table-1') for e in envelopes] == records
+    assert fake_kms.call_counts['GenerateDataKey'] == 1
+    assert 'Decrypt' not in fake_kms.call_counts
+
+    fresh = EnvelopeEncryptor(provider)
+    assert fresh.decrypt(envelopes[1], associated_data=b'table-1') == records[1]
+    assert fake_kms.call_counts['Decrypt'] == 1
+
+
+def test_accepts_str_and_buffers(provider):
+    encryptor = EnvelopeEncryptor(provider)
+    assert encryptor.decrypt(encryptor.encrypt('text')) == b'text'
+    assert encryptor.decrypt(encryptor.encrypt(bytearray(b'buffer'))) == b'buffer'
+    assert encryptor.decrypt(encryptor.encrypt(memoryview(b'view'))) == b'view'
+
+
+def test_tampering_is_detected(provider):
+    encryptor = EnvelopeEncryptor(provider)
+    envelope = bytearray(encryptor.encrypt(b'secret', associated_data=b'a'))
+    with pytest.raises(EnvelopeError, match='authentication'):
+        encryptor.decrypt(bytes(envelope), associated_data=b'b')
+    envelope[-1] ^= 1
+    with pytest.raises(EnvelopeError, match='authentication'):
+        encryptor.decrypt(bytes(envelope), associated_data=b'a')
+
+
+def test_malformed_envelopes_are_rejected(provider):
+    envelope = EnvelopeEncryptor(provider).encrypt(b'secret')
+    with pytest.raises(EnvelopeError, match='too short'):
+        unpack_envelope(b'\x01')
+    with pytest.raises(EnvelopeError, match='version'):
+        unpack_envelope(b'\x02' + envelope[1:])
+    with pytest.raises(EnvelopeError, match='truncated'):
+        unpack_envelope(envelope[:10])
@@ -0,0 +1,89 @@
+import os
+import threading
+
+import pytest
+
+from gcp.fake_kms_server import FakeKMSServer
+from gcp.gcp_kms_client import get_kms_client, reset_clients
+from gcp.gcp_kms_pipeline import GCPBatchError, GCPKMSPipeline
+from gcp.gcp_kms_provider import GCPKMSProvider
+from tests.helpers import run_concurrently
+
+
+class _ConcurrencyProbe:
+    """Wraps a server handler and records the most calls it ever had running at once"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return self.handler(request)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def server():
+    server = FakeKMSServer(latency=0.01, seed=7)
+    yield server
+    server.stop()
+    reset_clients()
+
+
+def _provider(server):
+    provider = GCPKMSProvider(get_kms_client(server.start()), 'lab', 'global', 'ring', 'key')
+    provider.ensure_key()
+    return provider
+
+
+def test_round_trip_keeps_input_order(server):
+    pipeline = GCPKMSPipeline(_provider(server), max_in_flight=8)
+    plaintexts = [os.urandom(i + 1) for i in range(50)]
+    ciphertexts = pipeline.encrypt_many(plaintexts, context={'tenant': 'a'})
+    assert pipeline.decrypt_many(ciphertexts, context={'tenant': 'a'}) == plaintexts
+    assert pipeline.calls == 100
+    assert pipeline.retries == 0
+
+
+def test_in_flight_window_is_respected(server):
+    probe = server._encrypt = _ConcurrencyProbe(server._encrypt)
+    pipeline = GCPKMSPipeline(_provider(server), max_in_flight=4)
+    pipeline.encrypt_many([b'x'] * 40)
+    assert 1 < probe.peak <= 4
+
+
+def test_transient_failures_are_retried(server):
+    server.error_rate = 0.3
+    pipeline = GCPKMSPipeline(_provider(server), max_attempts=10)
+    plaintexts = [bytes([i]) for i in range(30)]
+    ciphertexts = pipeline.encrypt_many(plaintexts)
+    assert None not in ciphertexts
+    assert pipeline.retries > 0
+    assert pipeline.calls == 30 + pipeline.retries
+
+
+def test_permanent_failures_are_reported_per_item(server):
+    provider = _provider(server)
+    pipeline = GCPKMSPipeline(provider)
+    good = provider.encrypt(b'secret')
+    with pytest.raises(GCPBatchError) as raised:
+        pipeline.decrypt_many([good, b'not a ciphertext', good])
+    assert sorted(raised.value.errors) == [1]
+    assert raised.value.results == [b'secret', None, b'secret']
+    assert pipeline.retries == 0
+    assert pipeline.decrypt_many([b'bad'], raise_on_error=False) == [None]
+
+
+def test_counters_are_exact_under_concurrent_use(server):
+    pipeline = GCPKMSPipeline(_provider(server), max_in_flight=16)
+    _, errors = run_concurrently(lambda: pipeline.encrypt_many([b'x'] * 25), 8)
+    assert errors == [None] * 8
+    assert pipeline.calls == 200
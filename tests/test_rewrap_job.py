@@ -0,0 +1,118 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from vault.rewrap_job import RewrapJob, ciphertext_version
+from vault.transit_client import TransitClient
+
+
+class _FakeTransitAPI:
+    """The slice of hvac's secrets.transit that RewrapJob and TransitClient use"""
+
+    def __init__(self, latest_version=2):
+        self.latest_version = latest_version
+        self.min_decryption_version = 1
+        self._lock = threading.Lock()
+
+    def read_key(self, name, mount_point='transit'):
+        return {'data': {'latest_version': self.latest_version,
+                         'min_decryption_version': self.min_decryption_version}}
+
+    def rotate_key(self, name, mount_point='transit'):
+        with self._lock:
+            self.latest_version += 1
+
+    def update_key_configuration(self, name, min_decryption_version=None, mount_point='transit'):
+        self.min_decryption_version = min_decryption_version
+
+    def rewrap_data(self, name, ciphertext, batch_input, mount_point='transit'):
+        results = []
+        for item in batch_input:
+            body = item['ciphertext'].split(':', 2)[2]
+            if body.startswith('bad'):
+                results.append({'error': 'invalid ciphertext'})
+            else:
+                version = item.get('key_version') or self.latest_version
+                results.append({'ciphertext': f"vault:v{version}:{body}"})
+        return {'data': {'batch_results': results}}
+
+
+@pytest.fixture
+def api():
+    return _FakeTransitAPI()
+
+
+@pytest.fixture
+def transit(api):
+    return TransitClient(SimpleNamespace(secrets=SimpleNamespace(transit=api)), 'records')
+
+
+def _records(count, version=1, bad=()):
+    return [(i, f"vault:v{version}:{'bad' if i in bad else 'ok'}{i}") for i in range(count)]
+
+
+def test_ciphertext_version():
+    assert ciphertext_version('vault:v12:abc') == 12
+    assert ciphertext_version('plain') is None
+
+
+def test_rewraps_stale_records_and_skips_current_ones(transit):
+    records = _records(30) + _records(10, version=2)
+    out = {}
+    stats = RewrapJob(transit, records, lambda pairs: out.update(pairs), batch_size=7, workers=3).run()
+    assert (stats.target_version, stats.records, stats.rewrapped, stats.skipped, stats.failed) == (2, 40, 30, 10, 0)
+    assert sorted(out) == list(range(30))
+    assert all(ciphertext_version(c) == 2 for c in out.values())
+
+
+def test_checkpoint_stops_at_a_failed_batch_and_resume_retries_it(transit, tmp_path):
+    checkpoint = tmp_path / 'rewrap.json'
+    first = RewrapJob(transit, _records(100, bad={35}), lambda pairs: None, checkpoint_path=checkpoint,
+                      batch_size=10, workers=4).run()
+    assert first.failed == 1
+    assert first.failures == [35]
+    assert json.loads(checkpoint.read_text())['offset'] == 30
+
+    out = {}
+    second = RewrapJob(transit, _records(100), lambda pairs: out.update(pairs), checkpoint_path=checkpoint,
+                       batch_size=10, workers=4).run()
+    assert (second.resumed_from, second.records, second.failed) == (30, 70, 0)
+    assert sorted(out) == list(range(30, 100))
+    assert json.loads(checkpoint.read_text())['offset'] == 100
+
+
+def test_checkpoint_for_another_version_is_ignored(transit, api, tmp_path):
+    checkpoint = tmp_path / 'rewrap.json'
+    RewrapJob(transit, _records(20), lambda pairs: None, checkpoint_path=checkpoint, batch_size=10).run()
+    api.rotate_key('records')
+    stats = RewrapJob(transit, _records(20), lambda pairs: None, checkpoint_path=checkpoint, batch_size=10).run()
+    assert (stats.target_version, stats.resumed_from, stats.rewrapped) == (3, 0, 20)
+
+
+def test_rotation_mid_job_keeps_the_target_version(transit, api):
+    out = {}
+
+    def sink(pairs):
+        out.update(pairs)
+        if api.latest_version == 2:
+            api.rotate_key('records')
+
+    job = RewrapJob(transit, _records(50), sink, batch_size=5, workers=1)
+    stats = job.run()
+    assert stats.target_version == 2
+    assert {ciphertext_version(c) for c in out.values()} == {2}
+    with pytest.raises(RuntimeError, match='now at v3'):
+        job.raise_min_decryption_version(stats)
+    assert api.min_decryption_version == 1
+
+
+def test_min_decryption_version_is_raised_only_after_a_clean_run(transit, api):
+    failed = RewrapJob(transit, _records(10, bad={3}), lambda pairs: None).run()
+    with pytest.raises(RuntimeError, match='not rewrapped'):
+        RewrapJob(transit, [], lambda pairs: None).raise_min_decryption_version(failed)
+
+    job = RewrapJob(transit, _records(10), lambda pairs: None)
+    job.raise_min_decryption_version(job.run())
+    assert api.min_decryption_version == 2
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from aws.aws_kms_signer import AWSKMSSigner
+from common.signatures import PublicKeyCache
+from tests.helpers import run_concurrently
+
+
+@pytest.mark.parametrize('key_spec, algorithm', [
+    ('ECC_NIST_P256', 'ECDSA_SHA_256'),
+    ('ECC_NIST_P384', 'ECDSA_SHA_384'),
+    ('RSA_2048', 'RSASSA_PSS_SHA_256'),
+    ('RSA_2048', 'RSASSA_PKCS1_V1_5_SHA_256'),
+])
+def test_kms_signatures_verify_locally(fake_kms, key_spec, algorithm):
+    key_id = fake_kms.create_key(KeyUsage='SIGN_VERIFY', KeySpec=key_spec)['KeyMetadata']['Arn']
+    signer = AWSKMSSigner(fake_kms, key_id, signing_algorithm=algorithm)
+    for message in (b'short message', b'x' * 5000):
+        signature = signer.sign(message)
+        assert signer.verify(message, signature)
+        assert not signer.verify(message + b'!', signature)
+    assert fake_kms.call_counts['GetPublicKey'] == 1
+    assert 'Verify' not in fake_kms.call_counts
+
+
+def test_unsupported_algorithm_for_the_key_is_rejected(fake_kms):
+    key_id = fake_kms.create_key(KeyUsage='SIGN_VERIFY', KeySpec='ECC_NIST_P256')['KeyMetadata']['Arn']
+    with pytest.raises(ValueError, match='does not support'):
+        AWSKMSSigner(fake_kms, key_id, signing_algorithm='ECDSA_SHA_384').public_key()
+
+
+def test_public_key_cache_fetches_once_under_concurrency():
+    cache = PublicKeyCache()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.02)
+        return object()
+
+    results, errors = run_concurrently(lambda: cache.get('key', 1, fetch), 16)
+    assert errors == [None] * 16
+    assert len({id(result) for result in results}) == 1
+    assert len(fetches) == 1
@@ -0,0 +1,120 @@
+import io
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from common.datakey_cache import DataKeyCache
+from common.streaming import (
+    _FRAME, _HEADER, NONCE_PREFIX_SIZE, StreamError, decrypt_file, decrypt_stream, encrypt_file, encrypt_stream
+)
+
+CHUNK_SIZE = 64
+
+
+def _encrypt(provider, plaintext, **kwargs):
+    destination = io.BytesIO()
+    assert encrypt_stream(provider, io.BytesIO(plaintext), destination, chunk_size=CHUNK_SIZE, **kwargs) \
+        == len(plaintext)
+    return destination.getvalue()
+
+
+def _decrypt(provider, stream, **kwargs):
+    destination = io.BytesIO()
+    decrypt_stream(provider, io.BytesIO(stream), destination, **kwargs)
+    return destination.getvalue()
+
+
+def _split(stream):
+    """Split an encrypted stream into its header and its list of raw frames"""
+    wrapped_len = _HEADER.unpack_from(stream)[3]
+    offset = _HEADER.size + wrapped_len + NONCE_PREFIX_SIZE
+    header, frames = stream[:offset], []
+    while offset < len(stream):
+        length = _FRAME.unpack_from(stream, offset)[1]
+        end = offset + _FRAME.size + length
+        frames.append(stream[offset:end])
+        offset = end
+    return header, frames
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 5 * CHUNK_SIZE, 1000])
+def test_round_trip(provider, size):
+    plaintext = os.urandom(size)
+    stream = _encrypt(provider, plaintext)
+    assert len(_split(stream)[1]) == max(1, -(-size // CHUNK_SIZE))
+    assert _decrypt(provider, stream) == plaintext
+
+
+def test_round_trip_with_context_and_cache(provider, fake_kms):
+    cache = DataKeyCache()
+    plaintext = os.urandom(300)
+    stream = _encrypt(provider, plaintext, context={'tenant': 'a'})
+    for _ in range(2):
+        assert _decrypt(provider, stream, cache=cache, context={'tenant': 'a'}) == plaintext
+    assert fake_kms.call_counts['Decrypt'] == 1
+
+
+def test_wrong_context_or_associated_data_fails(provider):
+    stream = _encrypt(provider, b'x' * 100, context={'tenant': 'a'}, associated_data=b'record-1')
+    with pytest.raises(ClientError):
+        _decrypt(provider, stream, context={'tenant': 'b'}, associated_data=b'record-1')
+    with pytest.raises(StreamError, match='authentication'):
+        _decrypt(provider, stream, context={'tenant': 'a'}, associated_data=b'record-2')
+
+
+def test_dropping_the_final_chunk_is_detected(provider):
+    header, frames = _split(_encrypt(provider, os.urandom(3 * CHUNK_SIZE)))
+    with pytest.raises(StreamError, match='truncated before the final chunk'):
+        _decrypt(provider, header + b''.join(frames[:-1]))
+
+
+def test_truncating_inside_a_chunk_is_detected(provider):
+    stream = _encrypt(provider, os.urandom(3 * CHUNK_SIZE))
+    with pytest.raises(StreamError, match='truncated'):
+        _decrypt(provider, stream[:-5])
+
+
+def test_reordered_chunks_fail_authentication(provider):
+    header, frames = _split(_encrypt(provider, os.urandom(3 * CHUNK_SIZE)))
+    with pytest.raises(StreamError, match='chunk 0 failed authentication'):
+        _decrypt(provider, header + frames[1] + frames[0] + frames[2])
+
+
+def test_final_chunk_cannot_be_moved_earlier(provider):
+    header, frames = _split(_encrypt(provider, os.urandom(3 * CHUNK_SIZE)))
+    with pytest.raises(StreamError, match='failed authentication'):
+        _decrypt(provider, header + frames[0] + frames[2])
+
+
+def test_corrupted_chunk_fails_its_checksum(provider):
+    stream = bytearray(_encrypt(provider, os.urandom(2 * CHUNK_SIZE)))
+    stream[-1] ^= 1
+    with pytest.raises(StreamError, match='CRC32C mismatch'):
+        _decrypt(provider, bytes(stream))
+
+
+def test_trailing_data_is_rejected(provider):
+    with pytest.raises(StreamError, match='trailing data'):
+        _decrypt(provider, _encrypt(provider, b'payload') + b'\0')
+
+
+def test_not_a_stream(provider):
+    with pytest.raises(StreamError, match='not an encrypted stream'):
+        _decrypt(provider, b'\0' * 64)
+
+
+def test_tampered_file_leaves_no_output(provider, tmp_path):
+    source, encrypted, output = tmp_path / 'in', tmp_path / 'in.enc', tmp_path / 'out'
+    source.write_bytes(os.urandom(4 * CHUNK_SIZE))
+    encrypt_file(provider, source, encrypted, chunk_size=CHUNK_SIZE)
+    assert decrypt_file(provider, encrypted, output) == 4 * CHUNK_SIZE
+    assert output.read_bytes() == source.read_bytes()
+
+    output.unlink()
+    header, frames = _split(encrypted.read_bytes())
+    encrypted.write_bytes(header + b''.join(frames[:-1]))
+    with pytest.raises(StreamError):
+        decrypt_file(provider, encrypted, output)
+    assert not output.exists()
+    assert not (tmp_path / 'out.partial').exists()